@@ -1,43 +1,51 @@
 # ai_learning/feedback.py
 import logging
-import json
+import os
+import yaml
 from pathlib import Path
-from datetime import datetime
+
+from ai_learning.rule_store import LearnedRuleStore
 
 logger = logging.getLogger(__name__)
 
-PENDING_DIR = Path("ai_learning/pending_rules/")
 ACTIVE_DIR = Path("detection/rules/sigma/")
-REJECTED_DIR = Path("ai_learning/rejected_rules/")
-
-for p in [PENDING_DIR, REJECTED_DIR]:
-    p.mkdir(exist_ok=True)
 
 class AnalystFeedback:
-    def __init__(self):
+    """
+    Review queue for learned rules. Pass the RuleUpdater's store when both
+    live in one process; a separate store on the same database also sees
+    rules recorded later, since the store rereads the table on lookup.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or LearnedRuleStore()
         logger.info("[FEEDBACK] Analyst feedback system initialized.")
 
     def submit_rule_for_review(self, rule):
         """Submit an auto-generated rule for manual approval"""
-        rule_id = rule["id"]
-        filepath = PENDING_DIR / f"{rule_id}.yml"
         try:
-            with open(filepath, "w") as f:
-                json.dump(rule, f, indent=2)
-            logger.info(f"[FEEDBACK] Rule submitted for review: {filepath}")
+            rule_id, _ = self.store.record(rule)
+            self.store.flush()
+            logger.info(f"[FEEDBACK] Rule submitted for review: {rule_id}")
+            return rule_id
         except Exception as e:
             logger.error(f"[FEEDBACK] Failed to save rule: {e}")
+            return None
 
     def approve_rule(self, rule_id):
-        """Move rule from pending to active Sigma rules"""
-        src = PENDING_DIR / f"{rule_id}.yml"
-        dst = ACTIVE_DIR / f"{rule_id}.yml"
-        if not src.exists():
-            logger.error(f"[FEEDBACK] Rule not found in pending: {src}")
+        """Write a pending rule into the active Sigma rules directory"""
+        entry = self.store.get(rule_id)
+        if entry is None or entry.status != "pending":
+            logger.error(f"[FEEDBACK] Rule not found in pending: {rule_id}")
             return False
+        dst = ACTIVE_DIR / f"{rule_id}.yml"
+        tmp = ACTIVE_DIR / f".{rule_id}.yml.tmp"  # Dotfiles are ignored by the rule watcher
         try:
-            import shutil
-            shutil.move(str(src), str(dst))
+            ACTIVE_DIR.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                yaml.safe_dump(entry.rule, f, indent=2, sort_keys=False)
+            os.replace(tmp, dst)
+            self.store.set_status(rule_id, "approved")
             logger.info(f"[FEEDBACK] ✅ Rule approved and activated: {rule_id}")
             return True
         except Exception as e:
@@ -45,15 +53,13 @@ class AnalystFeedback:
             return False
 
     def reject_rule(self, rule_id):
-        """Reject rule and move to rejected folder"""
-        src = PENDING_DIR / f"{rule_id}.yml"
-        dst = REJECTED_DIR / f"{rule_id}.yml"
-        if not src.exists():
-            logger.error(f"[FEEDBACK] Rule not found: {src}")
+        """Reject rule; repeats of its selection stay rejected"""
+        entry = self.store.get(rule_id)
+        if entry is None or entry.status != "pending":
+            logger.error(f"[FEEDBACK] Rule not found: {rule_id}")
             return False
         try:
-            import shutil
-            shutil.move(str(src), str(dst))
+            self.store.set_status(rule_id, "rejected")
             logger.warning(f"[FEEDBACK] ❌ Rule rejected: {rule_id}")
             return True
         except Exception as e:
@@ -62,4 +68,4 @@ class AnalystFeedback:
 
     def list_pending_reviews(self):
         """List all rules waiting for approval"""
-        return [f.stem for f in PENDING_DIR.glob("*.yml")]
\ No newline at end of file
+        return self.store.ids("pending")
\ No newline at end of file
@@ -0,0 +1,56 @@
+# ai_learning/model_trainer.py
+import logging
+import os
+import time
+
+from collectors.backfill import order_files, parse_file, parser_pool
+
+logger = logging.getLogger(__name__)
+
+TRAIN_BATCH = 4096  # Events per feature matrix handed to the detector
+
+
+class ModelTrainer:
+    """
+    Offline anomaly-model training over historical logs. Files are parsed
+    in newline-aligned chunks on a process pool (as in backfill) and fed
+    oldest first, so the behaviour sketches see a realistic event order;
+    each chunk becomes one vectorised feature matrix. The fitted detector
+    is saved for AnomalyDetector.load_model to pick up at startup.
+    """
+
+    def __init__(self, detector, patterns_file="parser/patterns.yaml", workers=0,
+                 chunk_size=8 * 1024 * 1024, max_in_flight=None):
+        self.detector = detector
+        self.patterns_file = patterns_file
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.events = 0
+
+    def _fit_events(self, events):
+        for start in range(0, len(events), TRAIN_BATCH):
+            batch = events[start:start + TRAIN_BATCH]
+            self.detector.partial_fit(self.detector.feature_matrix(batch))
+        self.events += len(events)
+
+    def train(self, paths, model_path):
+        """Fit the detector on `paths` and save it to `model_path`. Returns the event count."""
+        paths = order_files(paths)
+        started = time.perf_counter()
+        logger.info(f"[TRAINER] Training {self.detector.mode} model on {len(paths)} file(s) "
+                    f"with {self.workers} worker(s)...")
+
+        with parser_pool(self.patterns_file, self.workers) as pool:
+            for path in paths:
+                for events in parse_file(pool, path, self.chunk_size, self.max_in_flight):
+                    self._fit_events(events)
+
+        self.detector.refit()
+        if not self.detector.is_fitted:
+            raise ValueError(f"not enough events to fit a {self.detector.mode} model ({self.events} parsed)")
+        self.detector.save_model(model_path, trained_events=self.events)
+        elapsed = time.perf_counter() - started
+        rate = self.events / elapsed if elapsed > 0 else 0.0
+        logger.info(f"[TRAINER] Done: {self.events} events in {elapsed:.1f}s ({rate:,.0f} ev/s)")
+        return self.events
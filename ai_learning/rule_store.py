@@ -0,0 +1,270 @@
+# ai_learning/rule_store.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ("pending", "approved", "rejected")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS learned_rules (
+    rule_id TEXT PRIMARY KEY,
+    selection_key TEXT NOT NULL UNIQUE,
+    rule_json TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    hits INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_learned_rules_status ON learned_rules (status);
+"""
+
+# Status is owned by the reviewer: upserts from the detection path never overwrite it.
+# `hits` carries only the hits since this store's last flush, so stores in several
+# processes recording the same rule add up instead of overwriting each other.
+_UPSERT = """
+INSERT INTO learned_rules (rule_id, selection_key, rule_json, status, hits, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(rule_id) DO UPDATE SET
+    hits = learned_rules.hits + excluded.hits,
+    last_seen = MAX(learned_rules.last_seen, excluded.last_seen)
+"""
+
+
+def selection_key(rule):
+    """Canonical form of a rule's detection block, used for deduplication."""
+    return json.dumps(rule.get("detection", {}), sort_keys=True, default=str, separators=(",", ":"))
+
+
+class LearnedRule:
+    """One deduplicated learned rule with its hit statistics."""
+
+    __slots__ = ("rule_id", "key", "rule", "status", "hits", "first_seen", "last_seen", "unflushed")
+
+    def __init__(self, rule_id, key, rule, status="pending", hits=0, first_seen=None, last_seen=None):
+        self.rule_id = rule_id
+        self.key = key
+        self.rule = rule
+        self.status = status
+        self.hits = hits
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.unflushed = 0  # Hits recorded here but not yet added to the table
+
+    def to_dict(self):
+        return {
+            "rule_id": self.rule_id,
+            "status": self.status,
+            "hits": self.hits,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "rule": self.rule,
+        }
+
+
+class LearnedRuleStore:
+    """
+    Learned Sigma rules deduplicated by selection content.
+
+    Recording a rule only touches memory: repeats of the same selection
+    bump its hit count and last-seen time. A background thread writes the
+    dirty entries to SQLite in one transaction per `flush_interval`.
+    Rules are also indexed by review status in memory. Lookups and
+    listings first pick up rules and review decisions written by other
+    stores on the same database (the detection process and an analyst
+    tool each hold one), reading only (rule_id, status) for known rules.
+    """
+
+    def __init__(self, path="ai_learning/learned_rules.db", flush_interval=2.0, id_prefix="learned"):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.id_prefix = id_prefix
+        self.rules = {}  # rule_id -> LearnedRule
+        self._by_key = {}
+        self._by_status = {status: set() for status in STATUSES}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._load()
+
+    _COLUMNS = "rule_id, selection_key, rule_json, status, hits, first_seen, last_seen"
+
+    def _load(self):
+        with self._db_lock:
+            rows = self._db.execute(f"SELECT {self._COLUMNS} FROM learned_rules").fetchall()
+        with self._lock:
+            self._merge(rows)
+        if rows:
+            logger.info(f"[LEARNING] Loaded {len(self.rules)} learned rule(s) from {self.path} "
+                        f"({len(self._by_status['pending'])} pending review)")
+
+    def _merge(self, rows):
+        """Fold table rows into memory (caller holds _lock). The table owns status; hits add our unflushed ones."""
+        for rule_id, key, rule_json, status, hits, first_seen, last_seen in rows:
+            entry = self.rules.get(rule_id)
+            if entry is not None:
+                self._restatus(entry, status)
+                entry.hits = hits + entry.unflushed
+                entry.last_seen = max(entry.last_seen, last_seen)
+                continue
+            try:
+                rule = json.loads(rule_json)
+            except ValueError as e:
+                logger.error(f"[LEARNING] Skipping unreadable learned rule {rule_id}: {e}")
+                continue
+            self._index(LearnedRule(rule_id, key, rule, status, hits, first_seen, last_seen))
+
+    def _restatus(self, entry, status):
+        if entry.status != status:
+            self._by_status[entry.status].discard(entry.rule_id)
+            entry.status = status
+            self._by_status.setdefault(status, set()).add(entry.rule_id)
+
+    def refresh(self):
+        """Pick up rules recorded and statuses changed by other stores since we last looked."""
+        with self._db_lock:
+            statuses = self._db.execute("SELECT rule_id, status FROM learned_rules").fetchall()
+        with self._lock:
+            unknown = []
+            for rule_id, status in statuses:
+                entry = self.rules.get(rule_id)
+                if entry is None:
+                    unknown.append(rule_id)
+                else:
+                    self._restatus(entry, status)
+        for start in range(0, len(unknown), 500):
+            batch = unknown[start:start + 500]
+            with self._db_lock:
+                rows = self._db.execute(
+                    f"SELECT {self._COLUMNS} FROM learned_rules WHERE rule_id IN ({','.join('?' * len(batch))})",
+                    batch).fetchall()
+            with self._lock:
+                self._merge(rows)
+
+    def _index(self, entry):
+        self.rules[entry.rule_id] = entry
+        self._by_key[entry.key] = entry
+        self._by_status.setdefault(entry.status, set()).add(entry.rule_id)
+
+    def make_id(self, key, id_prefix=None):
+        return f"{id_prefix or self.id_prefix}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+    def record(self, rule, seen_at=None, id_prefix=None):
+        """
+        Count one occurrence of a learned rule. New selections are added as
+        pending review under a content-derived ID (the rule's own `id` is
+        replaced). Returns (rule_id, is_new).
+        """
+        key = selection_key(rule)
+        now = seen_at or time.time()
+        with self._lock:
+            entry = self._by_key.get(key)
+            is_new = entry is None
+            if is_new:
+                rule_id = self.make_id(key, id_prefix)
+                rule = dict(rule, id=rule_id)
+                entry = LearnedRule(rule_id, key, rule, "pending", 0, now, now)
+                self._index(entry)
+            entry.hits += 1
+            entry.unflushed += 1
+            entry.last_seen = max(entry.last_seen, now)
+            self._dirty.add(entry.rule_id)
+        return entry.rule_id, is_new
+
+    def get(self, rule_id):
+        """A rule with its current review status, including rules recorded by other stores."""
+        with self._db_lock:
+            rows = self._db.execute(f"SELECT {self._COLUMNS} FROM learned_rules WHERE rule_id = ?",
+                                    (rule_id,)).fetchall()
+        with self._lock:
+            self._merge(rows)
+            return self.rules.get(rule_id)
+
+    def ids(self, status="pending"):
+        """IDs of rules with the given review status."""
+        self.refresh()
+        with self._lock:
+            return list(self._by_status.get(status, ()))
+
+    def count(self, status="pending"):
+        with self._lock:
+            return len(self._by_status.get(status, ()))
+
+    def set_status(self, rule_id, status):
+        """Move a rule between review states and persist the change immediately."""
+        if status not in STATUSES:
+            raise ValueError(f"Unknown review status: {status!r}")
+        with self._lock:
+            entry = self.rules.get(rule_id)
+            if entry is None:
+                return False
+            self._restatus(entry, status)
+            row = self._row(entry, 0)  # Unflushed hits stay dirty for the next flush
+        with self._db_lock:
+            with self._db:
+                self._db.execute(_UPSERT, row)
+                self._db.execute("UPDATE learned_rules SET status = ? WHERE rule_id = ?", (status, rule_id))
+        return True
+
+    @staticmethod
+    def _row(entry, hits):
+        return (entry.rule_id, entry.key, json.dumps(entry.rule, default=str), entry.status,
+                hits, entry.first_seen, entry.last_seen)
+
+    def flush(self):
+        """Write every rule touched since the last flush in a single transaction."""
+        with self._lock:
+            if not self._dirty:
+                return 0
+            rows = []
+            for rule_id in self._dirty:
+                entry = self.rules[rule_id]
+                rows.append(self._row(entry, entry.unflushed))
+                entry.unflushed = 0
+            self._dirty = set()
+        try:
+            with self._db_lock:
+                with self._db:
+                    self._db.executemany(_UPSERT, rows)
+        except sqlite3.Error as e:
+            with self._lock:
+                for row in rows:
+                    self.rules[row[0]].unflushed += row[4]
+                    self._dirty.add(row[0])
+            logger.error(f"[LEARNING] Failed to flush learned rules to {self.path}: {e}")
+            return 0
+        return len(rows)
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="learned-rule-flush", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval + 1)
+            self.thread = None
+        self.flush()
+        with self._db_lock:
+            self._db.close()
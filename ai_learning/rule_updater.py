@@ -1,22 +1,26 @@
 # ai_learning/rule_updater.py
 import logging
-import yaml
 from pathlib import Path
 from datetime import datetime
 
+from ai_learning.rule_store import LearnedRuleStore
+
 logger = logging.getLogger(__name__)
 
 class RuleUpdater:
-    def __init__(self, sigma_rules_dir="detection/rules/sigma/"):
+    def __init__(self, sigma_rules_dir="detection/rules/sigma/", store=None):
         self.sigma_rules_dir = Path(sigma_rules_dir)
         self.sigma_rules_dir.mkdir(parents=True, exist_ok=True)
+        self.store = store or LearnedRuleStore()
+        self.store.start()
         logger.info("[LEARNING] RuleUpdater initialized.")
 
     def generate_sigma_rule_from_event(self, event, name_prefix="auto"):
         """
         Automatically generate a Sigma rule from a suspicious event.
+        Identical selections are deduplicated in the learned-rule store,
+        which queues new ones for analyst review. Returns the rule ID.
         """
-        rule_id = f"{name_prefix}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
         title = f"Auto-generated: Suspicious {event.get('event_type')} from {event.get('ip')}"
         ip = event.get("ip")
         user = event.get("user")
@@ -24,7 +28,6 @@ class RuleUpdater:
         # Simple rule template
         rule = {
             "title": title,
-            "id": rule_id,
             "status": "experimental",
             "description": "Automatically generated due to anomalous behavior.",
             "author": "AI-Learning-Module",
@@ -43,18 +46,23 @@ class RuleUpdater:
             "level": "high"
         }
 
-        # Save to file
-        rule_path = self.sigma_rules_dir / f"{rule_id}.yml"
-        try:
-            with open(rule_path, "w", encoding="utf-8") as f:
-                yaml.dump(rule, f, indent=2)
-            logger.info(f"[LEARNING] Generated new Sigma rule: {rule_path}")
-        except Exception as e:
-            logger.error(f"[LEARNING] Failed to save rule: {e}")
+        # The store assigns a content-derived ID, so repeats map to one rule
+        rule_id, is_new = self.store.record(rule, id_prefix=name_prefix)
+        if is_new:
+            logger.info(f"[LEARNING] Learned new Sigma rule {rule_id}; queued for review.")
+        return rule_id
+
+    def close(self):
+        """Flush learned rules to disk."""
+        self.store.close()
 
-    def update_heuristic_model(self):
+    def update_heuristic_model(self, log_files, detector, model_path="ai_learning/models/anomaly_model.npz", **trainer_options):
         """
-        Placeholder: Retrain PyOD model with new labeled data
-        Future: Use feedback loop from analyst or Shuffle
+        Retrain the anomaly model offline on historical logs and save it to
+        `model_path`; a running detector loads it with load_model.
         """
-        logger.info("[LEARNING] Heuristic model update triggered (stub).")
\ No newline at end of file
+        from ai_learning.model_trainer import ModelTrainer
+
+        logger.info(f"[LEARNING] Heuristic model update triggered on {len(log_files)} file(s).")
+        ModelTrainer(detector, **trainer_options).train(log_files, model_path)
+        return model_path
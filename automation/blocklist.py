@@ -0,0 +1,469 @@
+# automation/blocklist.py
+import heapq
+import ipaddress
+import itertools
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class BlockEntry:
+    """A blocked network with its reason and optional expiry (epoch seconds)."""
+
+    __slots__ = ("network", "reason", "created", "expires")
+
+    def __init__(self, network, reason, created, expires=None):
+        self.network = network
+        self.reason = reason
+        self.created = created
+        self.expires = expires
+
+    def active(self, now):
+        return self.expires is None or self.expires > now
+
+    def display(self):
+        """Plain address for single hosts, CIDR notation otherwise."""
+        net = self.network
+        return str(net.network_address) if net.prefixlen == net.max_prefixlen else str(net)
+
+
+class _Node:
+    __slots__ = ("zero", "one", "entry")
+
+    def __init__(self):
+        self.zero = None
+        self.one = None
+        self.entry = None
+
+
+class PrefixTree:
+    """Binary radix tree over fixed-width addresses; walks are O(prefix length)."""
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.root = _Node()
+
+    def _bit(self, value, depth):
+        return (value >> (self.bits - 1 - depth)) & 1
+
+    def insert(self, value, length, entry):
+        node = self.root
+        for depth in range(length):
+            if self._bit(value, depth):
+                if node.one is None:
+                    node.one = _Node()
+                node = node.one
+            else:
+                if node.zero is None:
+                    node.zero = _Node()
+                node = node.zero
+        node.entry = entry
+
+    def remove(self, value, length):
+        """Detach the entry stored exactly at value/length, pruning empty branches."""
+        path = []
+        node = self.root
+        for depth in range(length):
+            bit = self._bit(value, depth)
+            path.append((node, bit))
+            node = node.one if bit else node.zero
+            if node is None:
+                return None
+        entry, node.entry = node.entry, None
+        while path and node.entry is None and node.zero is None and node.one is None:
+            parent, bit = path.pop()
+            if bit:
+                parent.one = None
+            else:
+                parent.zero = None
+            node = parent
+        return entry
+
+    def covering(self, value, length, now):
+        """Broadest active entry covering value/length, or None."""
+        node = self.root
+        shift = self.bits - 1
+        for _ in range(length):
+            entry = node.entry
+            if entry is not None and (entry.expires is None or entry.expires > now):
+                return entry
+            node = node.one if (value >> shift) & 1 else node.zero
+            if node is None:
+                return None
+            shift -= 1
+        entry = node.entry
+        if entry is not None and (entry.expires is None or entry.expires > now):
+            return entry
+        return None
+
+    def entries_under(self, value, length):
+        """All entries at or below value/length."""
+        node = self.root
+        for depth in range(length):
+            node = node.one if self._bit(value, depth) else node.zero
+            if node is None:
+                return []
+        found, stack = [], [node]
+        while stack:
+            node = stack.pop()
+            if node.entry is not None:
+                found.append(node.entry)
+            stack.extend(child for child in (node.zero, node.one) if child is not None)
+        return found
+
+
+def address_key(ip):
+    """(version, integer) for an IPv4/IPv6 address string, or None."""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, TypeError):
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+    except (OSError, TypeError):
+        return None
+
+
+class NftablesFormat:
+    """nft -f syntax for inet sets `blocklist_v4` / `blocklist_v6`."""
+
+    def __init__(self, table="security_mvp"):
+        self.table = table
+
+    def _element(self, entry, now):
+        text = entry.display()
+        if entry.expires is not None:
+            text += f" timeout {max(1, int(entry.expires - now))}s"
+        return text
+
+    def header(self):
+        lines = [f"add table inet {self.table}"]
+        for version, kind in ((4, "ipv4_addr"), (6, "ipv6_addr")):
+            lines.append(f"add set inet {self.table} blocklist_v{version} "
+                         f"{{ type {kind}; flags interval, timeout; }}")
+            lines.append(f"flush set inet {self.table} blocklist_v{version}")
+        return lines
+
+    def add(self, entry, now):
+        return (f"add element inet {self.table} blocklist_v{entry.network.version} "
+                f"{{ {self._element(entry, now)} }}")
+
+    def delete(self, entry):
+        return f"delete element inet {self.table} blocklist_v{entry.network.version} {{ {entry.display()} }}"
+
+
+class IpsetFormat:
+    """ipset restore syntax for hash:net sets `blocklist_v4` / `blocklist_v6`."""
+
+    def header(self):
+        return [
+            "create blocklist_v4 hash:net family inet timeout 0 -exist",
+            "create blocklist_v6 hash:net family inet6 timeout 0 -exist",
+            "flush blocklist_v4",
+            "flush blocklist_v6",
+        ]
+
+    def add(self, entry, now):
+        timeout = 0 if entry.expires is None else max(1, int(entry.expires - now))
+        return f"add blocklist_v{entry.network.version} {entry.network} timeout {timeout} -exist"
+
+    def delete(self, entry):
+        return f"del blocklist_v{entry.network.version} {entry.network} -exist"
+
+
+EXPORT_FORMATS = {"nftables": NftablesFormat, "ipset": IpsetFormat}
+
+
+class Blocklist:
+    """
+    In-memory containment state backed by per-family prefix trees.
+
+    `contains` walks at most one bit per prefix length. Blocking a host
+    already covered by a broader block is a no-op, and once
+    `aggregate_threshold` hosts of the same /24 (IPv4) or /64 (IPv6) are
+    blocked they are replaced by the covering prefix. Changes are
+    appended to the journal (`ts | BLOCKED | ip | reason`) and to an
+    incremental firewall delta by a background flusher with one fsync per
+    `flush_interval`; the full export and a compacted journal are
+    rewritten only every `compact_after` changes. Expired entries are
+    purged by the flusher (the firewall times its own elements out).
+    """
+
+    def __init__(self, journal_path="logs/blocked_ips.txt", export_path="logs/blocklist.nft",
+                 export_format="nftables", default_ttl=None, aggregate_threshold=16,
+                 aggregate_prefix_v4=24, aggregate_prefix_v6=64, flush_interval=1.0, compact_after=10000):
+        self.journal_path = journal_path
+        self.export_path = export_path
+        self.exporter = EXPORT_FORMATS[export_format]() if export_path else None
+        self.default_ttl = default_ttl
+        self.aggregate_threshold = aggregate_threshold
+        self.aggregate_prefix = {4: aggregate_prefix_v4, 6: aggregate_prefix_v6}
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.trees = {4: PrefixTree(32), 6: PrefixTree(128)}
+        self.entries = {}  # network -> BlockEntry
+        self._group_counts = {}  # aggregate network -> hosts blocked inside it
+        self._expiry = []  # heap of (expires, seq, network)
+        self._seq = itertools.count()
+        self._journal_pending = []
+        self._export_pending = []
+        self._changes_since_compact = 0
+        self.listeners = []  # callables(action, entry, now), invoked under the lock; must not block
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self._load()
+
+    def _add(self, entry):
+        net = entry.network
+        self.trees[net.version].insert(int(net.network_address), net.prefixlen, entry)
+        self.entries[net] = entry
+        if entry.expires is not None:
+            heapq.heappush(self._expiry, (entry.expires, next(self._seq), net))
+        group = self._group_of(net)
+        if group is not None:
+            self._group_counts[group] = self._group_counts.get(group, 0) + 1
+
+    def _remove(self, net):
+        entry = self.entries.pop(net, None)
+        if entry is None:
+            return None
+        self.trees[net.version].remove(int(net.network_address), net.prefixlen)
+        group = self._group_of(net)
+        if group is not None:
+            remaining = self._group_counts.get(group, 1) - 1
+            if remaining > 0:
+                self._group_counts[group] = remaining
+            else:
+                self._group_counts.pop(group, None)
+        return entry
+
+    def _group_of(self, net):
+        prefix = self.aggregate_prefix[net.version]
+        if not self.aggregate_threshold or net.prefixlen <= prefix:
+            return None
+        return net.supernet(new_prefix=prefix)
+
+    def _record(self, action, entry, now):
+        reason = entry.reason.replace("|", "/").replace("\n", " ")
+        stamp = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        expires = "never" if entry.expires is None else str(int(entry.expires))
+        self._journal_pending.append(f"{stamp} | {action} | {entry.display()} | {reason} | expires={expires}\n")
+        if self.exporter is not None and action != "EXPIRED":
+            self._export_pending.append(
+                self.exporter.add(entry, now) if action == "BLOCKED" else self.exporter.delete(entry))
+        self._changes_since_compact += 1
+        for listener in self.listeners:
+            listener(action, entry, now)
+
+    @staticmethod
+    def _parse(value):
+        return ipaddress.ip_network(str(value).strip(), strict=False)
+
+    def block(self, target, reason, ttl=None, now=None):
+        """
+        Block an IP or CIDR. Returns False if it is invalid or already
+        covered by an active block.
+        """
+        try:
+            net = self._parse(target)
+        except ValueError:
+            logger.debug("[BLOCK] Not an IP/CIDR: %s", target)
+            return False
+        now = now or time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = BlockEntry(net, reason, now, now + ttl if ttl else None)
+        with self._lock:
+            tree = self.trees[net.version]
+            if tree.covering(int(net.network_address), net.prefixlen, now) is not None:
+                return False
+            # A broader block supersedes narrower ones underneath it
+            for child in tree.entries_under(int(net.network_address), net.prefixlen):
+                self._remove(child.network)
+                self._record("RELEASED", child, now)
+            self._add(entry)
+            self._record("BLOCKED", entry, now)
+            self._maybe_aggregate(net, now)
+        return True
+
+    def _maybe_aggregate(self, net, now):
+        group = self._group_of(net)
+        if group is None or self._group_counts.get(group, 0) < self.aggregate_threshold:
+            return
+        members = self.trees[net.version].entries_under(int(group.network_address), group.prefixlen)
+        expires = None if any(m.expires is None for m in members) else max(m.expires for m in members)
+        for member in members:
+            self._remove(member.network)
+            self._record("RELEASED", member, now)
+        entry = BlockEntry(group, f"aggregated {len(members)} blocked hosts", now, expires)
+        self._add(entry)
+        self._record("BLOCKED", entry, now)
+        logger.warning(f"[BLOCK] Aggregated {len(members)} blocked hosts into {group}")
+
+    def unblock(self, target, now=None):
+        try:
+            net = self._parse(target)
+        except ValueError:
+            return False
+        with self._lock:
+            entry = self._remove(net)
+            if entry is None:
+                return False
+            self._record("RELEASED", entry, now or time.time())
+        return True
+
+    def contains(self, ip, now=None):
+        """True if an active block covers this address."""
+        return self.lookup(ip, now) is not None
+
+    def lookup(self, ip, now=None):
+        """The active BlockEntry covering this address, or None."""
+        key = address_key(ip)
+        if key is None:
+            return None
+        tree = self.trees[key[0]]
+        return tree.covering(key[1], tree.bits, now or time.time())
+
+    def purge_expired(self, now=None):
+        now = now or time.time()
+        purged = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires, _, net = heapq.heappop(self._expiry)
+                entry = self.entries.get(net)
+                if entry is not None and entry.expires == expires:
+                    self._remove(net)
+                    self._record("EXPIRED", entry, now)
+                    purged += 1
+        return purged
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _load(self):
+        """Rebuild state by replaying the journal (also reads the legacy `ip blocked - reason` lines)."""
+        if not os.path.exists(self.journal_path):
+            return
+        now = time.time()
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = [p.strip() for p in line.split("|")]
+                try:
+                    created = now
+                    if len(parts) >= 4:
+                        action, net, reason = parts[1], self._parse(parts[2]), parts[3]
+                        created = datetime.strptime(parts[0], "%Y-%m-%d %H:%M:%S").timestamp()
+                        expires = None
+                        if len(parts) >= 5 and parts[4].startswith("expires=") and parts[4] != "expires=never":
+                            expires = float(parts[4][len("expires="):])
+                    elif line.split():
+                        action, net, reason, expires = "BLOCKED", self._parse(line.split()[0]), line.strip(), None
+                    else:
+                        continue
+                except ValueError:
+                    continue
+                if action == "BLOCKED":
+                    self._remove(net)
+                    self._add(BlockEntry(net, reason, created, expires))
+                else:
+                    self._remove(net)
+        self.purge_expired(now)
+        self._journal_pending = []
+        self._export_pending = []
+        logger.info(f"[BLOCK] Loaded {len(self.entries)} active block(s) from {self.journal_path}")
+        # Start from a compact journal and a full export
+        self._changes_since_compact = self.compact_after
+
+    @staticmethod
+    def _write_atomic(path, lines):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _append(path, lines):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _snapshot(self, now):
+        journal, export = [], []
+        if self.exporter is not None:
+            export = [line + "\n" for line in self.exporter.header()]
+        for entry in self.entries.values():
+            if not entry.active(now):
+                continue
+            reason = entry.reason.replace("|", "/").replace("\n", " ")
+            expires = "never" if entry.expires is None else str(int(entry.expires))
+            stamp = datetime.fromtimestamp(entry.created).strftime("%Y-%m-%d %H:%M:%S")
+            journal.append(f"{stamp} | BLOCKED | {entry.display()} | {reason} | expires={expires}\n")
+            if self.exporter is not None:
+                export.append(self.exporter.add(entry, now) + "\n")
+        return journal, export
+
+    def flush(self):
+        """Persist pending journal lines and firewall deltas; compact when due."""
+        now = time.time()
+        self.purge_expired(now)
+        with self._lock:
+            journal = self._journal_pending
+            export = self._export_pending
+            self._journal_pending, self._export_pending = [], []
+            compact = self._changes_since_compact >= self.compact_after
+            if compact:
+                snapshot = self._snapshot(now)
+                self._changes_since_compact = 0
+        if not compact and not journal and not export:
+            return
+        with self._io_lock:
+            try:
+                if compact:
+                    journal_lines, export_lines = snapshot
+                    self._write_atomic(self.journal_path, journal_lines)
+                    if self.exporter is not None:
+                        self._write_atomic(self.export_path, export_lines)
+                        self._write_atomic(f"{self.export_path}.delta", [])
+                else:
+                    if journal:
+                        self._append(self.journal_path, journal)
+                    if export and self.exporter is not None:
+                        self._append(f"{self.export_path}.delta", [line + "\n" for line in export])
+            except OSError as e:
+                with self._lock:
+                    self._journal_pending[:0] = journal
+                    self._export_pending[:0] = export
+                    if compact:
+                        self._changes_since_compact = self.compact_after
+                logger.error(f"[BLOCK] Failed to persist blocklist: {e}")
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="blocklist-flush", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval + 1)
+            self.thread = None
+        self.flush()
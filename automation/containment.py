@@ -1,9 +1,60 @@
 # automation/containment.py
+import atexit
 import logging
+import threading
+
+from automation.blocklist import Blocklist
+from storage.event_store import get_event_store
 
 logger = logging.getLogger(__name__)
 
-def block_ip(ip, reason):
-    with open("logs/blocked_ips.txt", "a") as f:
-        f.write(f"{ip} blocked - {reason}\n")
-    logger.critical(f"[BLOCK] IP {ip} blocked: {reason}")
\ No newline at end of file
+BLOCKED_FILE = "logs/blocked_ips.txt"
+
+_blocklist = None
+_lock = threading.Lock()
+
+def get_blocklist():
+    """Process-wide blocklist configured from `automation.containment` in config.yaml."""
+    global _blocklist
+    with _lock:
+        if _blocklist is None:
+            try:
+                from config import load_config
+                settings = load_config().get("automation", {}).get("containment", {}) or {}
+            except Exception as e:
+                logger.warning(f"[BLOCK] Using defaults; could not read config: {e}")
+                settings = {}
+            _blocklist = Blocklist(
+                journal_path=settings.get("journal_file", BLOCKED_FILE),
+                export_path=settings.get("export_file", "logs/blocklist.nft"),
+                export_format=settings.get("export_format", "nftables"),
+                default_ttl=settings.get("default_ttl"),
+                aggregate_threshold=settings.get("aggregate_threshold", 16),
+                flush_interval=settings.get("flush_interval", 1.0),
+                compact_after=settings.get("compact_after", 10000),
+            )
+            _attach_event_store(_blocklist)
+            _blocklist.start()
+            atexit.register(_blocklist.close)
+        return _blocklist
+
+def _attach_event_store(blocklist):
+    """Mirror block actions into the event store, starting from the journal's current state."""
+    store = get_event_store()
+    if store is None:
+        return
+    store.sync_blocked([(entry.display(), entry.created, entry.reason, entry.expires)
+                        for entry in blocklist.entries.values()])
+    blocklist.listeners.append(
+        lambda action, entry, now: store.record_block(action, entry.display(), entry.reason, entry.expires, now))
+
+def block_ip(ip, reason, ttl=None):
+    """Block an IP or CIDR; returns False if it was already covered or is not an address."""
+    if not get_blocklist().block(ip, reason, ttl=ttl):
+        logger.debug(f"[BLOCK] IP {ip} already blocked or invalid; skipping.")
+        return False
+    logger.critical(f"[BLOCK] IP {ip} blocked: {reason}")
+    return True
+
+def is_blocked(ip):
+    return get_blocklist().contains(ip)
\ No newline at end of file
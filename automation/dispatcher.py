@@ -0,0 +1,372 @@
+# automation/dispatcher.py
+import atexit
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from monitoring.metrics import REGISTRY, counter, histogram
+
+logger = logging.getLogger(__name__)
+
+REQUEST_SECONDS = histogram("dispatch_request_seconds", "Outbound SOAR/threat-intel request latency", ("target",))
+OUTCOMES = counter("dispatch_deliveries_total",
+                   "Delivery attempts by outcome (sent, rejected, error, spooled)", ("target", "outcome"))
+
+SPOOL_FILE = "logs/dispatch_spool.jsonl"
+
+# Client errors that will not succeed on retry; everything else is retried
+PERMANENT_STATUSES = frozenset(range(400, 500)) - {408, 425, 429}
+
+
+class Target:
+    """An outbound HTTP endpoint and its delivery health."""
+
+    __slots__ = ("name", "url", "headers", "verify", "timeout", "ok_statuses",
+                 "batch_size", "batch_interval", "build_batch", "failures", "down_until")
+
+    def __init__(self, name, url, headers=None, verify=True, timeout=5.0,
+                 ok_statuses=(200, 201, 202, 204), batch_size=0, batch_interval=5.0, build_batch=None):
+        self.name = name
+        self.url = url
+        self.headers = headers or {}
+        self.verify = verify
+        self.timeout = timeout
+        self.ok_statuses = frozenset(ok_statuses)
+        self.batch_size = batch_size if build_batch else 0
+        self.batch_interval = batch_interval
+        self.build_batch = build_batch
+        self.failures = 0
+        self.down_until = 0.0
+
+
+class Delivery:
+    """One request body bound for a target."""
+
+    __slots__ = ("target", "payload", "attempts", "created")
+
+    def __init__(self, target, payload, attempts=0, created=None):
+        self.target = target
+        self.payload = payload
+        self.attempts = attempts
+        self.created = created or time.time()
+
+
+class Dispatcher:
+    """
+    Asynchronous outbound delivery for SOAR/threat-intel calls.
+
+    `submit` never blocks: deliveries go onto a bounded queue served by
+    `workers` threads, each holding a keep-alive requests.Session. Failed
+    sends are retried with capped exponential backoff and full jitter.
+    After `open_after` consecutive failures a target is considered down
+    for `backoff_max` seconds and its deliveries go straight to a JSONL
+    spool on disk, as do deliveries that exhaust their retries or find the
+    queue full. The spool is replayed periodically and on start.
+    Targets with `batch_size` accumulate payloads and send them as one
+    request built by `build_batch(items)`.
+    """
+
+    def __init__(self, workers=4, queue_size=1000, max_retries=5, backoff_base=0.5,
+                 backoff_max=30.0, open_after=5, spool_path=SPOOL_FILE, spool_replay_interval=30.0):
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.open_after = open_after
+        self.spool_path = spool_path
+        self.spool_replay_interval = spool_replay_interval
+        self.targets = {}
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "spooled": 0, "replayed": 0}
+        self._retries = []  # heap of (due, seq, Delivery)
+        self._seq = itertools.count()
+        self._batches = {}  # target name -> (first_added, [payloads])
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self.running = False
+
+    def register(self, name, url, **options):
+        """Add a target (idempotent: an existing target of that name is returned)."""
+        with self._lock:
+            target = self.targets.get(name)
+            if target is None:
+                target = Target(name, url, **options)
+                self.targets[name] = target
+        return target
+
+    def submit(self, target_name, payload):
+        """Queue a payload for delivery. Returns False only if the target is unknown."""
+        target = self.targets.get(target_name)
+        if target is None:
+            logger.error(f"[DISPATCH] Unknown target: {target_name}")
+            return False
+        if target.batch_size:
+            ready = None
+            with self._lock:
+                started, items = self._batches.setdefault(target_name, (time.monotonic(), []))
+                items.append(payload)
+                if len(items) >= target.batch_size:
+                    ready = self._batches.pop(target_name)[1]
+            if ready:
+                self._enqueue(Delivery(target_name, target.build_batch(ready)))
+            return True
+        self._enqueue(Delivery(target_name, payload))
+        return True
+
+    def _enqueue(self, delivery):
+        target = self.targets[delivery.target]
+        if not self.running or target.down_until > time.monotonic():
+            self._spool([delivery])
+            return
+        try:
+            self.queue.put_nowait(delivery)
+        except queue.Full:
+            self._spool([delivery])
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.targets) or 1, pool_maxsize=2, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _send(self, session, delivery):
+        target = self.targets[delivery.target]
+        started = time.perf_counter()
+        try:
+            resp = session.post(target.url, json=delivery.payload, headers=target.headers,
+                                timeout=target.timeout, verify=target.verify)
+        except requests.RequestException as e:
+            REQUEST_SECONDS.labels(target.name).observe(time.perf_counter() - started)
+            self._failed(delivery, target, str(e))
+            return
+        REQUEST_SECONDS.labels(target.name).observe(time.perf_counter() - started)
+        if resp.status_code in target.ok_statuses:
+            OUTCOMES.labels(target.name, "sent").inc()
+            with self._lock:
+                target.failures = 0
+                target.down_until = 0.0
+                self.stats["sent"] += 1
+            logger.debug("[DISPATCH] %s delivered (attempt %d)", target.name, delivery.attempts + 1)
+        elif resp.status_code in PERMANENT_STATUSES:
+            OUTCOMES.labels(target.name, "rejected").inc()
+            with self._lock:
+                self.stats["failed"] += 1
+            logger.error(f"[DISPATCH] {target.name} rejected delivery ({resp.status_code}): {resp.text[:200]}")
+        else:
+            self._failed(delivery, target, f"HTTP {resp.status_code}")
+
+    def _failed(self, delivery, target, reason):
+        OUTCOMES.labels(target.name, "error").inc()
+        delivery.attempts += 1
+        now = time.monotonic()
+        with self._lock:
+            target.failures += 1
+            failures = target.failures
+            tripped = failures >= self.open_after and target.down_until <= now
+            if tripped:
+                target.down_until = now + self.backoff_max
+        if tripped:
+            logger.error(f"[DISPATCH] {target.name} unreachable after {failures} failures ({reason}); "
+                         f"spooling for {self.backoff_max:.0f}s")
+        if delivery.attempts > self.max_retries or not self.running:
+            self._spool([delivery])
+            return
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** delivery.attempts))
+        with self._lock:
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), delivery))
+            self.stats["retried"] += 1
+        self._wakeup.set()
+
+    def _spool(self, deliveries):
+        if not deliveries:
+            return
+        lines = "".join(json.dumps({"target": d.target, "payload": d.payload, "attempts": d.attempts,
+                                    "created": d.created}, default=str) + "\n" for d in deliveries)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            with self._spool_lock:
+                with open(self.spool_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except OSError as e:
+            logger.error(f"[DISPATCH] Failed to spool {len(deliveries)} delivery(ies): {e}")
+            return
+        with self._lock:
+            self.stats["spooled"] += len(deliveries)
+        for delivery in deliveries:
+            OUTCOMES.labels(delivery.target, "spooled").inc()
+
+    def replay_spool(self):
+        """Re-queue spooled deliveries whose target is not marked down."""
+        replay_path = f"{self.spool_path}.replay"
+        with self._spool_lock:
+            if not os.path.exists(self.spool_path):
+                return 0
+            os.replace(self.spool_path, replay_path)
+        count = 0
+        unregistered = []
+        with open(replay_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                # Attempts restart: the outage that spooled it is presumed over
+                delivery = Delivery(entry["target"], entry["payload"], 0, entry.get("created"))
+                if delivery.target not in self.targets:
+                    unregistered.append(delivery)  # Its client has not registered yet
+                    continue
+                self._enqueue(delivery)
+                count += 1
+        os.remove(replay_path)
+        self._spool(unregistered)
+        with self._lock:
+            self.stats["replayed"] += count
+        if count:
+            logger.info(f"[DISPATCH] Replayed {count} spooled delivery(ies)")
+        return count
+
+    def _worker(self):
+        session = self._new_session()
+        try:
+            while True:
+                delivery = self.queue.get()
+                if delivery is None:
+                    break
+                try:
+                    self._send(session, delivery)
+                except Exception as e:
+                    logger.error(f"[DISPATCH] Delivery to {delivery.target} failed: {e}")
+        finally:
+            session.close()
+
+    def _due_batches(self, now, force=False):
+        ready = []
+        with self._lock:
+            for name, (started, items) in list(self._batches.items()):
+                if force or now - started >= self.targets[name].batch_interval:
+                    del self._batches[name]
+                    ready.append((name, items))
+        return [Delivery(name, self.targets[name].build_batch(items)) for name, items in ready]
+
+    def _scheduler(self):
+        last_replay = time.monotonic()
+        while self.running:
+            self._wakeup.wait(0.5)
+            self._wakeup.clear()
+            now = time.monotonic()
+            due = []
+            with self._lock:
+                while self._retries and self._retries[0][0] <= now:
+                    due.append(heapq.heappop(self._retries)[2])
+            for delivery in due + self._due_batches(now):
+                self._enqueue(delivery)
+            if now - last_replay >= self.spool_replay_interval:
+                last_replay = now
+                try:
+                    self.replay_spool()
+                except OSError as e:
+                    logger.error(f"[DISPATCH] Spool replay failed: {e}")
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"dispatch-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        scheduler = threading.Thread(target=self._scheduler, name="dispatch-scheduler", daemon=True)
+        scheduler.start()
+        self._threads.append(scheduler)
+        self.replay_spool()
+        REGISTRY.register(self.collect_metrics)
+        logger.info(f"[DISPATCH] Started with {self.workers} worker(s), queue={self.queue.maxsize}")
+
+    def collect_metrics(self):
+        with self._lock:
+            retries = len(self._retries)
+            batched = sum(len(items) for _, items in self._batches.values())
+        return [
+            ("dispatch_queue_depth", "gauge", "Deliveries waiting for a dispatch worker", [({}, self.queue.qsize())]),
+            ("dispatch_retry_pending", "gauge", "Deliveries waiting out a retry backoff", [({}, retries)]),
+            ("dispatch_batch_pending", "gauge", "Payloads accumulating into batched requests", [({}, batched)]),
+        ]
+
+    def stop(self, timeout=10.0):
+        """Stop workers; anything not yet delivered is spooled for the next start."""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+        REGISTRY.unregister(self.collect_metrics)
+        self._wakeup.set()
+        pending = self._due_batches(time.monotonic(), force=True)
+        while True:
+            try:
+                delivery = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if delivery is not None:
+                pending.append(delivery)
+        for _ in range(self.workers):
+            self.queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        with self._lock:
+            pending.extend(entry[2] for entry in self._retries)
+            self._retries = []
+        self._spool(pending)
+        logger.info(f"[DISPATCH] Stopped: sent={self.stats['sent']} failed={self.stats['failed']} "
+                    f"retried={self.stats['retried']} spooled={self.stats['spooled']}")
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher(target=None, configure=None):
+    """
+    Process-wide dispatcher configured from `automation.dispatcher` in config.yaml.
+    If `target` is not registered yet, `configure(dispatcher)` registers it
+    and the dispatcher is started; both run under the module lock, so
+    concurrent first calls set a target up only once.
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            try:
+                from config import load_config
+                settings = load_config().get("automation", {}).get("dispatcher", {}) or {}
+            except Exception as e:
+                logger.warning(f"[DISPATCH] Using defaults; could not read config: {e}")
+                settings = {}
+            _dispatcher = Dispatcher(
+                workers=settings.get("workers", 4),
+                queue_size=settings.get("queue_size", 1000),
+                max_retries=settings.get("max_retries", 5),
+                backoff_base=settings.get("backoff_base", 0.5),
+                backoff_max=settings.get("backoff_max", 30.0),
+                open_after=settings.get("open_after", 5),
+                spool_path=settings.get("spool_file", SPOOL_FILE),
+                spool_replay_interval=settings.get("spool_replay_interval", 30.0),
+            )
+            atexit.register(_dispatcher.stop)
+        if target is not None and target not in _dispatcher.targets:
+            configure(_dispatcher)
+            _dispatcher.start()
+        return _dispatcher
@@ -1,8 +1,9 @@
 # automation/exporter.py
 import logging
-import requests
 from datetime import datetime
 
+from automation.dispatcher import get_dispatcher
+
 logger = logging.getLogger(__name__)
 
 # Configure your MISP instance
@@ -10,45 +11,61 @@ MISP_URL = "https://your-misp-instance.com"
 MISP_API_KEY = "YOUR_API_KEY"
 MISP_VERIFY_CERT = False  # Set to True in production
 
-def export_to_misp(ip: str, event_type: str, description: str = "Auto-detected by Security MVP"):
-    """Export a malicious IP to MISP as an event"""
-    headers = {
-        "Authorization": MISP_API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+def _settings():
+    try:
+        from config import load_config
+        return load_config().get("automation", {}).get("misp", {}) or {}
+    except Exception:
+        return {}
 
-    data = {
+def build_misp_event(attributes):
+    """Wrap a batch of queued attributes into a single MISP event."""
+    event_types = sorted({a.pop("_event_type", "unknown") for a in attributes})
+    return {
         "Event": {
-            "info": f"Security MVP Alert: {event_type}",
+            "info": f"Security MVP Alert: {', '.join(event_types)}",
             "distribution": 1,  # Org-only
             "threat_level_id": 2,  # Medium
             "analysis": 2,  # TLP: Amber
             "date": datetime.utcnow().strftime("%Y-%m-%d"),
-            "Attribute": [
-                {
-                    "type": "ip-dst",
-                    "category": "Network activity",
-                    "value": ip,
-                    "to_ids": True,
-                    "comment": description
-                }
-            ]
+            "Attribute": attributes
         }
     }
 
-    try:
-        resp = requests.post(
-            f"{MISP_URL}/events",
-            json=data,
-            headers=headers,
-            verify=MISP_VERIFY_CERT
-        )
-        if resp.status_code in [200, 201]:
-            logger.info(f"[EXPORT] Successfully sent IP {ip} to MISP")
-            return True
-        else:
-            logger.error(f"[EXPORT] MISP API error {resp.status_code}: {resp.text}")
-    except Exception as e:
-        logger.error(f"[EXPORT] Failed to connect to MISP: {e}")
+def _register(dispatcher):
+    settings = _settings()
+    dispatcher.register(
+        "misp",
+        f"{settings.get('url', MISP_URL).rstrip('/')}/events",
+        headers={
+            "Authorization": settings.get("api_key", MISP_API_KEY),
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        },
+        verify=settings.get("verify_cert", MISP_VERIFY_CERT),
+        timeout=settings.get("timeout", 10),
+        batch_size=settings.get("batch_size", 100),
+        batch_interval=settings.get("batch_interval", 10),
+        build_batch=build_misp_event,
+    )
+
+def _dispatcher():
+    return get_dispatcher("misp", _register)
+
+def export_to_misp(ip: str, event_type: str, description: str = "Auto-detected by Security MVP"):
+    """
+    Queue a malicious IP for MISP. Attributes are batched into one event
+    per `batch_size` IPs or `batch_interval` seconds, whichever comes first.
+    """
+    attribute = {
+        "type": "ip-dst",
+        "category": "Network activity",
+        "value": ip,
+        "to_ids": True,
+        "comment": description,
+        "_event_type": event_type
+    }
+    if _dispatcher().submit("misp", attribute):
+        logger.info(f"[EXPORT] Queued IP {ip} for MISP")
+        return True
     return False
\ No newline at end of file
@@ -0,0 +1,74 @@
+# automation/incident_journal.py
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class IncidentJournal:
+    """
+    Durable record of the incidents responses were run for.
+
+    Every incident open or update is appended as one JSON line and fsynced
+    before its side effects (block, SOAR playbook, rule learning) run, so
+    the lines the collector replays after a restart fall into incidents
+    that are already open and are suppressed instead of re-posting
+    playbooks. Opens and updates happen at most once per incident per
+    update interval, so the sync stays off the per-alert path. The file is
+    rewritten from the live incidents on load and every `compact_after`
+    appends.
+    """
+
+    def __init__(self, path="logs/incidents.jsonl", compact_after=10000):
+        self.path = path
+        self.compact_after = compact_after
+        self._appended = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Latest record per (source, rule, key), oldest activity first."""
+        records = {}
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    key = (record["source"], record["rule_id"], json.dumps(record["key"]))
+                except (ValueError, KeyError, TypeError):
+                    continue  # Torn last line after a crash
+                records.pop(key, None)
+                records[key] = record
+        return sorted(records.values(), key=lambda record: record["last_seen"])
+
+    def append(self, source, incident):
+        line = json.dumps(dict(incident.to_record(), source=source), default=str) + "\n"
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._appended += 1
+            except OSError as e:
+                logger.error(f"[INCIDENT] Failed to journal {incident.id}: {e}")
+            return self._appended >= self.compact_after
+
+    def compact(self, snapshot):
+        """Replace the journal with `snapshot`: [(source, incident record)]."""
+        lines = [json.dumps(dict(record, source=source), default=str) + "\n" for source, record in snapshot]
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.writelines(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self._appended = 0
+            except OSError as e:
+                logger.error(f"[INCIDENT] Failed to compact {self.path}: {e}")
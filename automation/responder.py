@@ -0,0 +1,266 @@
+# automation/responder.py
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from automation.containment import block_ip
+from automation.shuffle_client import trigger_shuffle_playbook
+
+logger = logging.getLogger(__name__)
+
+
+class Incident:
+    """Alerts of one rule sharing the same grouping key, with rolling counts."""
+
+    __slots__ = ("id", "rule_id", "key", "severity", "title", "first_seen", "last_seen",
+                 "count", "notified_at")
+
+    def __init__(self, rule_id, key, severity, title, now):
+        self.id = uuid.uuid4().hex[:12]
+        self.rule_id = rule_id
+        self.key = key
+        self.severity = severity
+        self.title = title
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 0
+        self.notified_at = now
+
+    def to_dict(self):
+        return {
+            "incident_id": self.id,
+            "rule_id": self.rule_id,
+            "key": dict(self.key),
+            "severity": self.severity,
+            "title": self.title,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "count": self.count,
+        }
+
+    def to_record(self):
+        """Journal form; the key keeps its field order."""
+        return {
+            "id": self.id,
+            "rule_id": self.rule_id,
+            "key": [list(pair) for pair in self.key],
+            "severity": self.severity,
+            "title": self.title,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "count": self.count,
+            "notified_at": self.notified_at,
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        incident = cls(record["rule_id"], tuple(tuple(pair) for pair in record["key"]),
+                       record["severity"], record["title"], record["first_seen"])
+        incident.id = record["id"]
+        incident.last_seen = record["last_seen"]
+        incident.count = record["count"]
+        incident.notified_at = record["notified_at"]
+        return incident
+
+
+class IncidentCorrelator:
+    """
+    Group alerts into incidents by rule plus key fields (`group_by`, or a
+    per-rule override). An incident stays open while alerts keep arriving
+    within `suppression_window` seconds of the previous one; alerts in an
+    open incident are suppressed except for one update per
+    `update_interval`. Incidents live in an LRU ordered by last activity,
+    so expired ones are evicted from the front in amortized O(1) and at
+    most `max_incidents` are held.
+    """
+
+    OPEN, UPDATE = "open", "update"
+
+    def __init__(self, group_by=("ip",), suppression_window=300, update_interval=60,
+                 max_incidents=10000, rule_group_by=None):
+        self.group_by = tuple(group_by)
+        self.suppression_window = suppression_window
+        self.update_interval = update_interval
+        self.max_incidents = max_incidents
+        self.rule_group_by = {k: tuple(v) for k, v in (rule_group_by or {}).items()}
+        self.incidents = OrderedDict()
+        self.suppressed = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        incidents = self.incidents
+        while incidents:
+            incident = next(iter(incidents.values()))
+            if now - incident.last_seen < self.suppression_window:
+                break
+            incidents.popitem(last=False)
+            self.evicted += 1
+
+    def observe(self, alert, event, now):
+        """Fold an alert into its incident. Returns (incident, OPEN | UPDATE | None)."""
+        rule_id = alert["rule_id"]
+        # Configured per-rule keys win, then the alert source's own (e.g. YARA groups by file)
+        fields = self.rule_group_by.get(rule_id) or alert.get("group_by") or self.group_by
+        key = tuple((field, event.get(field)) for field in fields)
+        with self._lock:
+            self._expire(now)
+            incident = self.incidents.get((rule_id, key))
+            if incident is None:
+                incident = Incident(rule_id, key, alert["severity"], alert["rule_title"], now)
+                self.incidents[(rule_id, key)] = incident
+                if len(self.incidents) > self.max_incidents:
+                    self.incidents.popitem(last=False)
+                    self.evicted += 1
+                action = self.OPEN
+            else:
+                self.incidents.move_to_end((rule_id, key))
+                if now - incident.notified_at >= self.update_interval:
+                    action = self.UPDATE
+                else:
+                    action = None
+                    self.suppressed += 1
+            incident.count += 1
+            incident.last_seen = max(incident.last_seen, now)
+            if action is not None:
+                incident.notified_at = now
+            return incident, action
+
+    def restore(self, records):
+        """Reopen journaled incidents, given oldest activity first; expiry then runs on this correlator's clock."""
+        with self._lock:
+            for record in records:
+                incident = Incident.from_record(record)
+                key = (incident.rule_id, incident.key)
+                self.incidents.pop(key, None)
+                self.incidents[key] = incident
+                if len(self.incidents) > self.max_incidents:
+                    self.incidents.popitem(last=False)
+
+    def snapshot(self):
+        with self._lock:
+            return [incident.to_record() for incident in self.incidents.values()]
+
+    def clone(self):
+        """An empty correlator with the same settings."""
+        return IncidentCorrelator(self.group_by, self.suppression_window, self.update_interval,
+                                  self.max_incidents, self.rule_group_by)
+
+    def __len__(self):
+        return len(self.incidents)
+
+
+class Responder:
+    """
+    Runs response side effects once per incident instead of once per alert:
+    containment, the SOAR playbook and rule learning on open, and a SOAR
+    update with the rolling count at most once per update interval.
+
+    Incident expiry needs one clock per correlator. Sigma alerts run on
+    event time (so backfills correlate as the logs did); other sources,
+    such as YARA file and content scans, run on arrival time. Each source
+    gets its own correlator, so a wall-clock alert can never expire
+    incidents opened on lagging log time, or the other way round.
+
+    With a `journal`, every open and update is persisted before its side
+    effects run and the correlators are rebuilt from it on start, so lines
+    replayed after a restart do not repeat playbooks or learned rules.
+    """
+
+    EVENT_TIME_SOURCES = frozenset({"sigma"})
+
+    def __init__(self, correlator=None, block_levels=("high", "critical"), rule_updater=None, journal=None):
+        self.correlator = correlator or IncidentCorrelator()
+        self.block_levels = frozenset(block_levels)
+        self.rule_updater = rule_updater
+        self.journal = journal
+        self._correlators = {"sigma": self.correlator}
+        self._lock = threading.Lock()
+        if journal is not None:
+            self._restore()
+
+    def _restore(self):
+        try:
+            records = self.journal.load()
+        except OSError as e:
+            logger.error(f"[INCIDENT] Failed to read {self.journal.path}: {e}")
+            return
+        by_source = {}
+        for record in records:
+            by_source.setdefault(record["source"], []).append(record)
+        for source, source_records in by_source.items():
+            self.correlator_for(source).restore(source_records)
+        self._compact()
+        if records:
+            logger.info(f"[INCIDENT] Restored {len(records)} incident(s) from {self.journal.path}")
+
+    def _compact(self):
+        with self._lock:
+            correlators = list(self._correlators.items())
+        self.journal.compact([(source, record) for source, correlator in correlators
+                              for record in correlator.snapshot()])
+
+    def correlator_for(self, source):
+        correlator = self._correlators.get(source)
+        if correlator is None:
+            with self._lock:
+                correlator = self._correlators.setdefault(source, self.correlator.clone())
+        return correlator
+
+    def handle(self, alert, event):
+        """Correlate an alert and respond if it opens or updates an incident. Returns the incident."""
+        source = alert.get("source", "sigma")
+        if source in self.EVENT_TIME_SOURCES:
+            now = event.get("ts") or time.time()
+        else:
+            now = time.time()
+        incident, action = self.correlator_for(source).observe(alert, event, now)
+        alert["incident_id"] = incident.id
+        if action is None:
+            logger.debug("[INCIDENT] %s suppressed (%d alerts)", incident.id, incident.count)
+            return incident
+
+        # Persisted before acting, so a replay after a crash finds the incident already open
+        if self.journal is not None and self.journal.append(source, incident):
+            self._compact()
+
+        ip = event.get("ip", "unknown")
+        user = event.get("user", "unknown")
+        subject = f"File: {event['file']}" if event.get("file") else f"IP: {ip} | User: {user}"
+        level = alert["severity"]
+        try:
+            if action == IncidentCorrelator.OPEN:
+                logger.warning(f"[ALERT] {level.upper()} - {alert['rule_title']} | {subject} "
+                               f"| Incident: {incident.id}")
+
+                # Auto-contain threat
+                if level in self.block_levels and event.get("ip"):
+                    block_ip(ip, alert["rule_title"])
+
+                # Trigger SOAR playbook
+                trigger_shuffle_playbook(
+                    alert_type=f"{source}_alert",
+                    ip=ip,
+                    details=f"{alert['rule_title']}: {event.get('raw', 'No raw log')}"
+                )
+
+                # Feed into learning module (learned rules are Sigma selections over log fields)
+                if self.rule_updater is not None and source == "sigma":
+                    self.rule_updater.generate_sigma_rule_from_event(event, name_prefix="learned")
+            else:
+                logger.warning(f"[INCIDENT] {incident.id} ongoing: {alert['rule_title']} | {subject} "
+                               f"| {incident.count} alerts since {int(incident.first_seen)}")
+                trigger_shuffle_playbook(
+                    alert_type="incident_update",
+                    ip=ip,
+                    details=f"{alert['rule_title']}: {incident.count} alerts in incident {incident.id}"
+                )
+        except Exception as e:
+            logger.error(f"[INCIDENT] Error responding to {incident.id}: {e}")
+        return incident
+
+    def close(self):
+        if self.rule_updater is not None:
+            self.rule_updater.close()
@@ -1,22 +1,36 @@
 # automation/shuffle_client.py
 import logging
-import requests
+
+from automation.dispatcher import get_dispatcher
 
 logger = logging.getLogger(__name__)
 SHUFFLE_WEBHOOK_URL = "http://localhost:3000/api/v1/hooks/execute/YOUR_WEBHOOK_ID_HERE"
 
+def _settings():
+    try:
+        from config import load_config
+        return load_config().get("automation", {}).get("shuffle", {}) or {}
+    except Exception:
+        return {}
+
+def _register(dispatcher):
+    settings = _settings()
+    dispatcher.register(
+        "shuffle",
+        settings.get("webhook_url", SHUFFLE_WEBHOOK_URL),
+        timeout=settings.get("timeout", 5),
+    )
+
+def _dispatcher():
+    return get_dispatcher("shuffle", _register)
+
 def trigger_shuffle_playbook(alert_type, ip, details=None):
+    """Queue a Shuffle webhook call; delivery, retries and spooling happen off the caller's thread."""
     payload = {
         "source": "security-mvp",
         "alert_type": alert_type,
         "malicious_ip": ip,
         "details": details
     }
-    try:
-        resp = requests.post(SHUFFLE_WEBHOOK_URL, json=payload, timeout=5)
-        if resp.status_code == 200:
-            logger.info(f"[SOAR] Shuffle playbook triggered for IP: {ip}")
-        else:
-            logger.error(f"[SOAR] Shuffle returned {resp.status_code}: {resp.text}")
-    except Exception as e:
-        logger.error(f"[SOAR] Failed to reach Shuffle: {e}")
\ No newline at end of file
+    if _dispatcher().submit("shuffle", payload):
+        logger.info(f"[SOAR] Shuffle playbook queued for IP: {ip}")
\ No newline at end of file
@@ -0,0 +1,126 @@
+# benchmarks/bench_dispatcher.py
+"""
+Exercise the outbound Dispatcher against a local stub HTTP server and
+report caller-side submit cost and delivery throughput.
+
+    python benchmarks/bench_dispatcher.py [--alerts 2000] [--latency-ms 20] [--fail-rate 0.1]
+
+Scenarios: a healthy endpoint (with optional latency and a share of 503
+responses that must be retried), an unreachable endpoint (deliveries must
+end up in the spool without slowing submit), and MISP-style batching.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from automation.dispatcher import Dispatcher
+from automation.exporter import build_misp_event
+
+
+class StubServer:
+    """Threaded HTTP stub counting accepted JSON bodies."""
+
+    def __init__(self, latency=0.0, fail_rate=0.0):
+        self.received = 0
+        self.items = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if latency:
+                    time.sleep(latency)
+                status = 503 if random.random() < fail_rate else 200
+                if status == 200:
+                    payload = json.loads(body)
+                    with stub.lock:
+                        stub.received += 1
+                        stub.items += len(payload.get("Event", {}).get("Attribute", [None]))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def spool_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+
+def run(name, url, alerts, workdir, wait=30.0, **target_options):
+    spool = os.path.join(workdir, f"{name}.jsonl")
+    dispatcher = Dispatcher(workers=4, queue_size=alerts, backoff_base=0.05, backoff_max=1.0,
+                            spool_path=spool, spool_replay_interval=3600)
+    dispatcher.register(name, url, timeout=2, **target_options)
+    dispatcher.start()
+
+    started = time.perf_counter()
+    for i in range(alerts):
+        dispatcher.submit(name, {"alert_type": "sigma_alert", "malicious_ip": f"10.0.{i // 256 % 256}.{i % 256}"})
+    submit_elapsed = time.perf_counter() - started
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        s = dispatcher.stats
+        if dispatcher.queue.empty() and not dispatcher._retries and not dispatcher._batches \
+                and s["sent"] + s["failed"] + s["spooled"] >= (1 if target_options.get("batch_size") else alerts):
+            break
+        time.sleep(0.05)
+    total_elapsed = time.perf_counter() - started
+    dispatcher.stop()
+    return submit_elapsed, total_elapsed, dict(dispatcher.stats), spool_lines(spool)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--alerts", type=int, default=2000)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--fail-rate", type=float, default=0.1)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("automation.dispatcher").setLevel(logging.CRITICAL)
+
+    stub = StubServer(latency=args.latency_ms / 1000.0, fail_rate=args.fail_rate)
+    workdir = tempfile.mkdtemp(prefix="bench_dispatch_")
+    print(f"{'scenario':<12} {'submit us/alert':>16} {'delivered/s':>12}  stats")
+    try:
+        scenarios = [
+            ("healthy", stub.url, {}),
+            ("unreachable", "http://127.0.0.1:9/hook", {}),
+            ("misp_batch", stub.url, {"batch_size": 100, "batch_interval": 0.2, "build_batch": build_misp_event}),
+        ]
+        for name, url, options in scenarios:
+            before = stub.items
+            submit_elapsed, total_elapsed, stats, spooled = run(name, url, args.alerts, workdir, **options)
+            delivered = stub.items - before
+            print(f"{name:<12} {submit_elapsed / args.alerts * 1e6:>16.1f} {delivered / total_elapsed:>12,.0f}  "
+                  f"{stats} spool_lines={spooled}")
+    finally:
+        stub.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_parser.py
+"""
+Measure LogParser throughput (lines/sec) as the number of vendor patterns
+grows, with and without the keyword prefilter.
+
+    python benchmarks/bench_parser.py [--lines 20000] [--counts 4,50,200,500]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser.log_parser import LogParser
+
+BASE_PATTERNS = "parser/patterns.yaml"
+
+
+def build_patterns(count):
+    with open(BASE_PATTERNS, "r", encoding="utf-8") as f:
+        base = yaml.safe_load(f)["patterns"]
+    specific = [p for p in base if not p.get("fallback")]
+    fallback = [p for p in base if p.get("fallback")]
+    vendor = []
+    for i in range(max(0, count - len(base))):
+        vendor.append({
+            "name": f"vendor_{i}",
+            "regex": rf"(?P<timestamp>\S+\s+\S+)\s+(?P<host>\S+)\s+VENDOR{i}:\s+Blocked connection from (?P<ip>\S+) port (?P<port>\d+)",
+            "event_type": f"vendor_{i}_block",
+            "severity": "info",
+        })
+    return specific + vendor + fallback
+
+
+def build_lines(n, vendor_count):
+    rnd = random.Random(42)
+    lines = []
+    for _ in range(n):
+        kind = rnd.random()
+        if kind < 0.3:
+            lines.append(f"2025-08-09 11:13:31 web1 AUTH: Failed login for admin from 10.0.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}")
+        elif kind < 0.5:
+            lines.append("2025-08-09 11:13:32 web1 AUTH: Login successful for user=bob")
+        elif kind < 0.8 and vendor_count:
+            v = rnd.randrange(vendor_count)
+            lines.append(f"2025-08-09 11:13:33 fw1 VENDOR{v}: Blocked connection from 10.1.1.{rnd.randint(0, 255)} port 443")
+        else:
+            lines.append("2025-08-09 11:13:34 app2 kernel: eth0 link up")
+    return lines
+
+
+def measure(parser, lines):
+    start = time.perf_counter()
+    for line in lines:
+        parser.parse(line)
+    return len(lines) / (time.perf_counter() - start)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--lines", type=int, default=20000)
+    ap.add_argument("--counts", default="4,50,200,500")
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{'patterns':>9} {'linear l/s':>12} {'prefilter l/s':>14} {'speedup':>8}")
+    for count in [int(c) for c in args.counts.split(",")]:
+        patterns = build_patterns(count)
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False, encoding="utf-8") as tmp:
+            yaml.safe_dump({"patterns": patterns}, tmp)
+        try:
+            lines = build_lines(args.lines, len(patterns) - 4)
+            linear = measure(LogParser(tmp.name, prefilter=False), lines)
+            prefiltered = measure(LogParser(tmp.name, prefilter=True), lines)
+        finally:
+            os.unlink(tmp.name)
+        print(f"{len(patterns):>9} {linear:>12,.0f} {prefiltered:>14,.0f} {prefiltered / linear:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
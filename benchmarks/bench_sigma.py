@@ -0,0 +1,89 @@
+# benchmarks/bench_sigma.py
+"""
+Measure SigmaEngine.check_event throughput (events/sec) with 10, 1k and
+100k rules, using the dispatch index versus evaluating every rule.
+
+    python benchmarks/bench_sigma.py [--events 20000] [--counts 10,1000,100000]
+
+Rules mimic what the learning loop produces (ip + event_type selections).
+Responses are disabled so no IPs are blocked and nothing is posted.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detection.sigma_engine import SigmaEngine
+from parser.event import Event
+
+BASE_TS = 1754700000
+
+
+def build_rules(count):
+    rules = []
+    for i in range(count):
+        rules.append({
+            "title": f"Learned rule {i}",
+            "id": f"learned_{i}",
+            "description": "benchmark rule",
+            "level": "high",
+            "detection": {
+                "selection": {"ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", "event_type": "failed_login"},
+                "condition": "selection",
+            },
+        })
+    return rules
+
+
+def build_events(n):
+    rnd = random.Random(7)
+    events = []
+    for i in range(n):
+        ip = f"172.16.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}"
+        line = f"2025-08-09 11:13:31 web1 AUTH: Failed login for admin from {ip}"
+        event = Event(line, "failed_login", "high", {"host": "web1", "user": "admin", "ip": ip})
+        event.ts = BASE_TS + i
+        events.append(event)
+    return events
+
+
+def measure(engine, events, budget_seconds):
+    start = time.perf_counter()
+    done = 0
+    for event in events:
+        engine.check_event(event)
+        done += 1
+        if done % 100 == 0 and time.perf_counter() - start > budget_seconds:
+            break
+    return done / (time.perf_counter() - start)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--events", type=int, default=20000)
+    ap.add_argument("--counts", default="10,1000,100000")
+    ap.add_argument("--budget", type=float, default=5.0, help="Max seconds per measurement")
+    args = ap.parse_args()
+    logging.disable(logging.WARNING)
+
+    events = build_events(args.events)
+    with tempfile.TemporaryDirectory() as empty_rules_dir:
+        print(f"{'rules':>8} {'linear ev/s':>12} {'indexed ev/s':>13} {'speedup':>8}")
+        for count in [int(c) for c in args.counts.split(",")]:
+            rules = build_rules(count)
+            results = []
+            for use_index in (False, True):
+                engine = SigmaEngine(rules_dir=empty_rules_dir, response_enabled=False, use_index=use_index)
+                engine.set_rules(rules)
+                results.append(measure(engine, events, args.budget))
+            linear, indexed = results
+            print(f"{count:>8} {linear:>12,.0f} {indexed:>13,.0f} {indexed / linear:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# collectors/checkpoint.py
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def _key(dev, ino):
+    return f"{dev}:{ino}"
+
+
+class CheckpointStore:
+    """
+    Durable read offsets keyed by (device, inode).
+
+    Commits only update memory; a background thread writes the whole map to
+    a temp file, fsyncs it and renames it over the previous checkpoint at
+    most once per `flush_interval`, so many commits share one disk sync.
+    """
+
+    def __init__(self, path="logs/.collector_checkpoints.json", flush_interval=1.0,
+                 max_age_days=7):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_age = max_age_days * 86400
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.running = False
+        self.thread = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"[CHECKPOINT] Failed to read {self.path}: {e}")
+            return
+        cutoff = time.time() - self.max_age
+        self.entries = {k: v for k, v in data.get("files", {}).items() if v.get("updated", 0) >= cutoff}
+        logger.info(f"[CHECKPOINT] Loaded {len(self.entries)} file offset(s) from {self.path}")
+
+    def get(self, dev, ino):
+        """Return the committed offset for a file identity, or None."""
+        with self._lock:
+            entry = self.entries.get(_key(dev, ino))
+        return entry["offset"] if entry else None
+
+    def commit(self, dev, ino, path, offset):
+        with self._lock:
+            self.entries[_key(dev, ino)] = {"path": path, "offset": offset, "updated": time.time()}
+            self._dirty = True
+
+    def flush(self):
+        """Write the checkpoint atomically if anything changed since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {"version": 1, "files": dict(self.entries)}
+            self._dirty = False
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            if hasattr(os, "O_DIRECTORY"):
+                dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+        except OSError as e:
+            with self._lock:
+                self._dirty = True
+            logger.error(f"[CHECKPOINT] Failed to write {self.path}: {e}")
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="checkpoint-flush", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+
+class Chunk:
+    """A run of lines read from one file, ending at `offset`."""
+
+    __slots__ = ("dev", "ino", "path", "offset", "remaining")
+
+    def __init__(self, dev, ino, path, offset, remaining):
+        self.dev = dev
+        self.ino = ino
+        self.path = path
+        self.offset = offset
+        self.remaining = remaining
+
+
+class OffsetTracker:
+    """
+    Turns out-of-order per-line completions into contiguous per-file commits.
+    A chunk's end offset is committed only once it and every earlier chunk
+    from the same file have been fully processed downstream.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def register(self, dev, ino, path, offset, count):
+        chunk = Chunk(dev, ino, path, offset, count)
+        with self._lock:
+            self._pending.setdefault((dev, ino), deque()).append(chunk)
+        if count == 0:
+            self.done(chunk, 0)
+        return chunk
+
+    def done(self, chunk, n=1):
+        with self._lock:
+            chunk.remaining -= n
+            if chunk.remaining > 0:
+                return
+            queue = self._pending.get((chunk.dev, chunk.ino))
+            committed = None
+            while queue and queue[0].remaining <= 0:
+                committed = queue.popleft()
+            if queue is not None and not queue:
+                del self._pending[(chunk.dev, chunk.ino)]
+        if committed is not None:
+            self.store.commit(committed.dev, committed.ino, committed.path, committed.offset)
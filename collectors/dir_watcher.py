@@ -0,0 +1,241 @@
+# collectors/dir_watcher.py
+import logging
+import os
+import threading
+import time
+
+from collectors.inotify import (
+    Inotify, inotify_available,
+    IN_CLOSE_WRITE, IN_CREATE, IN_MOVED_FROM, IN_MOVED_TO, IN_DELETE,
+    IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW, IN_IGNORED, IN_ONLYDIR, IN_ISDIR,
+)
+
+logger = logging.getLogger(__name__)
+
+# Only completed writes and renames: a file is never reported half-written
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+# Recursive watches also need to see new subdirectories appear
+RECURSIVE_WATCH_MASK = WATCH_MASK | IN_CREATE
+
+
+def file_signature(st):
+    """Cheap change fingerprint for a stat result."""
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def scan_directory(directory, suffixes, recursive=False):
+    """
+    Return {path: signature} for matching files, using stat only. Suffixes
+    match case-insensitively and empty `suffixes` matches every file;
+    dotfiles and dot-directories are skipped.
+    """
+    suffixes = tuple(suffix.lower() for suffix in suffixes or ())
+    found = {}
+    pending = [directory]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        with entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith("."):
+                    continue
+                try:
+                    if recursive and entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif (not suffixes or name.lower().endswith(suffixes)) and entry.is_file():
+                        found[os.path.abspath(entry.path)] = file_signature(entry.stat())
+                except FileNotFoundError:
+                    continue
+    return found
+
+
+def walk_directories(root):
+    """`root` and every non-hidden directory below it (symlinks not followed)."""
+    found = []
+    pending = [os.path.abspath(root)]
+    while pending:
+        directory = pending.pop()
+        found.append(directory)
+        try:
+            with os.scandir(directory) as entries:
+                pending.extend(entry.path for entry in entries
+                               if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    return found
+
+
+class DirectoryWatcher:
+    """
+    Watch one directory for files with the given suffixes and report
+    changes in debounced batches as `callback(changed, removed)`, two sets
+    of absolute paths. Uses inotify when available (with a periodic stat
+    rescan as a safety net), otherwise stat polling. Files are compared by
+    (inode, size, mtime), so unchanged files are never re-read. With
+    recursive=True every subdirectory gets its own watch and new ones are
+    picked up as they appear.
+    """
+
+    def __init__(self, directory, callback, suffixes=(".yml", ".yaml"), mode="auto",
+                 debounce=0.5, poll_interval=2.0, rescan_interval=60.0, name="dir-watcher",
+                 recursive=False):
+        self.directory = os.path.abspath(directory)
+        self.callback = callback
+        self.suffixes = tuple(suffix.lower() for suffix in suffixes or ())
+        self.recursive = recursive
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.name = name
+        self.known = {}
+        self.running = False
+        self.thread = None
+        self._wds = {}  # Watch descriptor -> directory
+
+        if mode == "auto":
+            mode = "inotify" if inotify_available() else "poll"
+        self.mode = mode
+        self._inotify = None
+        if self.mode == "inotify":
+            try:
+                self._inotify = Inotify()
+            except OSError as e:
+                logger.warning(f"[WATCHER] inotify unavailable ({e}); falling back to polling.")
+                self.mode = "poll"
+
+    def _arm(self, root=None):
+        """Add watches for the directory (and, if recursive, everything under `root`) not yet watched."""
+        if self._inotify is None:
+            return
+        if self.recursive:
+            directories, mask = walk_directories(root or self.directory), RECURSIVE_WATCH_MASK
+        else:
+            directories, mask = [self.directory], WATCH_MASK
+        watched = set(self._wds.values())
+        for directory in directories:
+            if directory in watched:
+                continue
+            try:
+                self._wds[self._inotify.add_watch(directory, mask)] = directory
+            except OSError as e:
+                logger.debug(f"[WATCHER] Cannot watch {directory} yet: {e}")
+
+    def _wanted(self, name):
+        return not name.startswith(".") and (not self.suffixes or name.lower().endswith(self.suffixes))
+
+    def _diff(self, paths=None):
+        """Compare current signatures with the last seen ones (all files, or just `paths`)."""
+        if paths is None:
+            current = scan_directory(self.directory, self.suffixes, self.recursive)
+            paths = set(current) | set(self.known)
+        else:
+            current = {}
+            for path in paths:
+                try:
+                    current[path] = file_signature(os.stat(path))
+                except FileNotFoundError:
+                    pass
+
+        changed, removed = set(), set()
+        for path in paths:
+            signature = current.get(path)
+            if signature is None:
+                if self.known.pop(path, None) is not None:
+                    removed.add(path)
+            elif self.known.get(path) != signature:
+                self.known[path] = signature
+                changed.add(path)
+        return changed, removed
+
+    def _dispatch(self, changed, removed):
+        if not changed and not removed:
+            return
+        try:
+            self.callback(changed, removed)
+        except Exception as e:
+            logger.error(f"[WATCHER] Change handler failed for {self.directory}: {e}")
+
+    def _collect_inotify(self, timeout, dirty):
+        """Add touched paths to `dirty`; return True if a full rescan is needed."""
+        rescan = False
+        for wd, mask, _cookie, name in self._inotify.read_events(timeout):
+            if mask & IN_Q_OVERFLOW:
+                logger.warning(f"[WATCHER] inotify queue overflow; rescanning {self.directory}.")
+                rescan = True
+            elif mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                # A watched directory went away; re-arm on the next rescan
+                rescan = self._wds.pop(wd, None) == self.directory or rescan
+            elif wd in self._wds and name and not name.startswith("."):
+                path = os.path.join(self._wds[wd], name)
+                if not mask & IN_ISDIR:
+                    if self._wanted(name):
+                        dirty.add(path)
+                elif self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    # New subtree: watch it and pick up files already written into it
+                    self._arm(path)
+                    dirty.update(scan_directory(path, self.suffixes, recursive=True))
+                elif self.recursive:
+                    prefix = path + os.sep
+                    dirty.update(known for known in self.known if known.startswith(prefix))
+        return rescan
+
+    def _run(self):
+        dirty = set()
+        last_event = 0.0
+        last_rescan = time.monotonic()
+        while self.running:
+            try:
+                now = time.monotonic()
+                rescan = False
+                if self._inotify is not None:
+                    timeout = self.debounce if dirty else self.poll_interval
+                    before = len(dirty)
+                    rescan = self._collect_inotify(timeout, dirty)
+                    now = time.monotonic()
+                    if len(dirty) != before:
+                        last_event = now
+                    interval = self.rescan_interval
+                else:
+                    time.sleep(self.poll_interval)
+                    now = time.monotonic()
+                    interval = self.poll_interval
+
+                if rescan or now - last_rescan >= interval:
+                    self._arm()
+                    dirty.clear()
+                    self._dispatch(*self._diff())
+                    last_rescan = now
+                elif dirty and now - last_event >= self.debounce:
+                    paths, dirty = dirty, set()
+                    self._dispatch(*self._diff(paths))
+            except Exception as e:
+                logger.error(f"[WATCHER] Error watching {self.directory}: {e}")
+                time.sleep(self.poll_interval)
+
+    def start(self, known=None):
+        """
+        Begin watching. `known` is the {path: signature} the caller has
+        already loaded; by default the current directory contents, so only
+        later changes are reported.
+        """
+        self.known = dict(known) if known is not None else scan_directory(self.directory, self.suffixes,
+                                                                          self.recursive)
+        self._arm()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        logger.info(f"[WATCHER] Watching {self.directory} in {self.mode} mode.")
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=self.poll_interval + 1)
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
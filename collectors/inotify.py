@@ -0,0 +1,121 @@
+# collectors/inotify.py
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Event masks from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        name = ctypes.util.find_library("c")
+        if not name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(name, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def inotify_available():
+    """Return True if the kernel inotify API can be used on this platform."""
+    if not hasattr(select, "poll"):
+        return False
+    try:
+        libc = _load_libc()
+        return hasattr(libc, "inotify_init1")
+    except (OSError, AttributeError):
+        return False
+
+
+class Inotify:
+    """Minimal ctypes wrapper around the Linux inotify API."""
+
+    def __init__(self):
+        libc = _load_libc()
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._poller = select.poll()
+        self._poller.register(self.fd, select.POLLIN)
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        """Watch a path and return its watch descriptor."""
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def rm_watch(self, wd):
+        if _libc.inotify_rm_watch(self.fd, wd) < 0:
+            err = ctypes.get_errno()
+            if err != errno.EINVAL:
+                logger.debug(f"[INOTIFY] rm_watch({wd}) failed: {os.strerror(err)}")
+
+    def read_events(self, timeout=None):
+        """
+        Wait up to `timeout` seconds and return a list of
+        (wd, mask, cookie, name) tuples. Returns [] on timeout.
+        """
+        ms = -1 if timeout is None else max(0, int(timeout * 1000))
+        if not self._poller.poll(ms):
+            return []
+
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            except InterruptedError:
+                continue
+            if not data:
+                break
+            pos = 0
+            while pos < len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, pos)
+                pos += _EVENT_HEADER.size
+                name = data[pos:pos + length].rstrip(b"\0")
+                pos += length
+                events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
@@ -2,11 +2,22 @@
 import logging
 import os
 import time
-import threading
 from pathlib import Path
 
+from automation.containment import get_blocklist
+from collectors.checkpoint import CheckpointStore, OffsetTracker
+from collectors.pipeline import Pipeline, Stage
+from collectors.tailer import FileTailer
+from monitoring.metrics import REGISTRY, counter, histogram
+from storage.event_store import get_event_store
+
 logger = logging.getLogger(__name__)
 
+LINES_READ = counter("collector_lines_read_total", "Lines read from each tailed file", ("file",))
+DETECT_SECONDS = histogram("detect_step_seconds", "Time per micro-batch in each detection step", ("step",))
+SIGMA_SECONDS = DETECT_SECONDS.labels("sigma")
+ANOMALY_SECONDS = DETECT_SECONDS.labels("anomaly")
+
 class LogCollector:
     def __init__(self, parser, sigma_engine, anomaly_detector, yara_scanner=None):
         self.parser = parser
@@ -16,9 +27,29 @@ class LogCollector:
         self.config = parser.config
         self.log_paths = self.config['collector']['log_paths']
         self.interval = self.config['collector']['watch_interval']
+        self.tail_mode = self.config['collector'].get('tail_mode', 'auto')
+        self.read_chunk_bytes = self.config['collector'].get('read_chunk_bytes', 64 * 1024)
+        self.poll_interval = self.config['collector'].get('poll_interval', 1.0)
+        self.pipeline_config = self.config.get('pipeline', {})
+        self.log_parsed_events = self.config.get('logging', {}).get('log_parsed_events', True)
+        self.checkpoint_file = self.config['collector'].get('checkpoint_file', 'logs/.collector_checkpoints.json')
+        self.checkpoint_interval = self.config['collector'].get('checkpoint_interval', 1.0)
+        # Events from already-contained sources: pass | sample | drop
+        self.blocked_policy = self.config['collector'].get('blocked_sources', 'sample')
+        self.blocked_sample_rate = max(1, int(self.config['collector'].get('blocked_sample_rate', 100)))
+        self.blocklist = get_blocklist() if self.blocked_policy != 'pass' else None
+        self.blocked_seen = 0
+        # In-memory YARA content checks over raw lines, one match call per parse micro-batch
+        yara_config = self.config.get('detection', {}).get('yara', {})
+        self.scan_log_lines = yara_scanner is not None and yara_config.get('scan_log_lines', True)
+        self.blocked_skipped = 0
+        # Sampled events for the dashboard; alerts are recorded by the detection engines
+        self.event_store = get_event_store()
         self.running = False
-        self.thread = None
-        self.offsets = {}
+        self.tailer = None
+        self.pipeline = None
+        self.checkpoints = None
+        self.offset_tracker = None
 
     def _ensure_log_files(self):
         """Create mock log files if they don't exist."""
@@ -30,33 +61,99 @@ class LogCollector:
                     f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} localhost System started.\n")
                 logger.info(f"[COLLECTOR] Created mock log file: {path}")
 
-    def _tail_file(self, filepath):
-        """Simulate tail -f behavior with parsing and detection."""
-        if filepath not in self.offsets:
-            self.offsets[filepath] = 0
-
-        while self.running:
-            try:
-                if os.path.exists(filepath):
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        f.seek(self.offsets[filepath])
-                        lines = f.readlines()
-                        self.offsets[filepath] = f.tell()
-
-                        for line in lines:
-                            line = line.strip()
-                            if line:
-                                structured_log = self.parser.parse(line)
-                                if structured_log:
-                                    logger.info(f"[PARSED] {structured_log}")
-                                    # Send to detection engines
-                                    self.sigma_engine.check_event(structured_log)
-                                    self.anomaly_detector.add_event(structured_log)
-                                    self.anomaly_detector.detect(structured_log)
-                time.sleep(1)
-            except Exception as e:
-                logger.error(f"[COLLECTOR] Error reading {filepath}: {e}")
-                time.sleep(self.interval)
+    def _build_pipeline(self):
+        """Wire parse -> detect stages with bounded queues between them."""
+        cfg = self.pipeline_config
+        stage_cfg = cfg.get('stages', {})
+
+        def make_stage(name, handler):
+            opts = stage_cfg.get(name, {})
+            return Stage(
+                name,
+                handler,
+                workers=opts.get('workers', 1),
+                queue_size=opts.get('queue_size', cfg.get('queue_size', 10000)),
+                batch_size=opts.get('batch_size', cfg.get('batch_size', 200)),
+                batch_timeout_ms=opts.get('batch_timeout_ms', cfg.get('batch_timeout_ms', 50)),
+                drop_policy=opts.get('drop_policy', cfg.get('drop_policy', 'block')),
+                on_drop=self._ack_item,
+            )
+
+        return Pipeline(
+            [make_stage('parse', self._parse_batch), make_stage('detect', self._detect_batch)],
+            report_interval=cfg.get('report_interval', 30),
+        )
+
+    def _on_lines(self, filepath, lines, position):
+        """Tailer callback: hand new lines to the pipeline, tagged with their chunk."""
+        dev, ino, offset = position
+        LINES_READ.labels(filepath).inc(len(lines))
+        chunk = self.offset_tracker.register(dev, ino, filepath, offset, len(lines))
+        self.pipeline.submit([(chunk, line) for line in lines])
+
+    def _ack_item(self, item):
+        """Mark a dropped or failed item as done so its file offset can advance."""
+        self.offset_tracker.done(item[0])
+
+    def _ack_batch(self, items):
+        counts = {}
+        for chunk, _ in items:
+            counts[chunk] = counts.get(chunk, 0) + 1
+        for chunk, n in counts.items():
+            self.offset_tracker.done(chunk, n)
+
+    def _parse_batch(self, items):
+        """Parse stage: raw lines -> structured events."""
+        events = []
+        unparsed = []
+        log_events = self.log_parsed_events and logger.isEnabledFor(logging.INFO)
+        blocklist = self.blocklist
+        parsed = [self.parser.parse(line) for _, line in items]
+        if self.scan_log_lines:
+            self._scan_lines(items, parsed)
+        for (chunk, line), structured_log in zip(items, parsed):
+            if structured_log and blocklist is not None and structured_log.ip \
+                    and blocklist.contains(structured_log.ip) and self._skip_blocked():
+                unparsed.append((chunk, line))  # Acked without running detection
+                continue
+            if structured_log:
+                if log_events:
+                    logger.info("[PARSED] %s", structured_log)
+                events.append((chunk, structured_log))
+            else:
+                unparsed.append((chunk, line))
+        if unparsed:
+            self._ack_batch(unparsed)
+        return events
+
+    def _scan_lines(self, items, parsed):
+        hits = self.yara_scanner.scan_lines([line for _, line in items])
+        for index, matches in hits.items():
+            self.yara_scanner.raise_line_alerts(items[index][1], parsed[index], matches)
+
+    def _skip_blocked(self):
+        """Drop, or keep one in `blocked_sample_rate`, of events from blocked sources."""
+        self.blocked_seen += 1
+        if self.blocked_policy == 'sample' and (self.blocked_seen - 1) % self.blocked_sample_rate == 0:
+            return False
+        self.blocked_skipped += 1
+        return True
+
+    def _detect_batch(self, items):
+        """Detect stage: run Sigma and anomaly detection over a micro-batch."""
+        events = [structured_log for _, structured_log in items]
+        started = time.perf_counter()
+        for structured_log in events:
+            self.sigma_engine.check_event(structured_log)
+        sigma_done = time.perf_counter()
+        SIGMA_SECONDS.observe(sigma_done - started)
+        # Anomaly scoring runs once over the whole micro-batch
+        self.anomaly_detector.process_batch(events)
+        ANOMALY_SECONDS.observe(time.perf_counter() - sigma_done)
+        if self.event_store is not None:
+            self.event_store.record_events(events)
+        # Offsets are committed only once the batch has cleared detection
+        self._ack_batch(items)
 
     def start(self):
         """Start monitoring log files."""
@@ -64,14 +161,47 @@ class LogCollector:
         self._ensure_log_files()
         self.running = True
 
+        self.checkpoints = CheckpointStore(self.checkpoint_file, flush_interval=self.checkpoint_interval)
+        self.checkpoints.start()
+        self.offset_tracker = OffsetTracker(self.checkpoints)
+
+        self.pipeline = self._build_pipeline()
+        self.pipeline.start()
+        REGISTRY.register(self.collect_metrics)
+
+        self.tailer = FileTailer(
+            self.log_paths,
+            self._on_lines,
+            mode=self.tail_mode,
+            chunk_size=self.read_chunk_bytes,
+            poll_interval=self.poll_interval,
+            rescan_interval=self.interval * 15,
+            resume=self.checkpoints.get,
+        )
         for path in self.log_paths:
-            thread = threading.Thread(target=self._tail_file, args=(path,), daemon=True)
-            thread.start()
             logger.info(f"[COLLECTOR] Monitoring log file: {path}")
+        self.tailer.start()
 
         logger.info(f"[COLLECTOR] Actively monitoring {len(self.log_paths)} log file(s).")
 
+    def collect_metrics(self):
+        families = self.parser.collect_metrics()
+        if self.pipeline is not None:
+            families.extend(self.pipeline.collect_metrics())
+        families.append(("collector_blocked_events_skipped_total", "counter",
+                         "Events from blocked sources dropped before detection", [({}, self.blocked_skipped)]))
+        return families
+
     def stop(self):
         """Stop the log collector."""
         self.running = False
+        REGISTRY.unregister(self.collect_metrics)
+        if self.tailer:
+            self.tailer.stop()
+        if self.pipeline:
+            self.pipeline.stop()
+        if self.checkpoints:
+            self.checkpoints.close()
+        if self.blocked_skipped:
+            logger.info(f"[COLLECTOR] Skipped {self.blocked_skipped} of {self.blocked_seen} event(s) from blocked sources.")
         logger.info("[COLLECTOR] Log collector stopped.")
\ No newline at end of file
@@ -0,0 +1,221 @@
+# collectors/pipeline.py
+import logging
+import queue
+import threading
+import time
+
+from monitoring.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+BATCH_SECONDS = histogram("pipeline_batch_seconds", "Time a stage spends handling one micro-batch", ("stage",))
+
+DROP_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+
+class Stage:
+    """
+    One pipeline stage: a bounded queue drained by worker threads in
+    micro-batches of up to `batch_size` items or `batch_timeout_ms`,
+    whichever comes first. `handler(batch)` may return a list of items
+    that are forwarded to the next stage. `on_drop(item)` is called for
+    every item discarded by the drop policy.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=10000, batch_size=200,
+                 batch_timeout_ms=50, drop_policy="block", on_drop=None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{drop_policy}' for stage {name}")
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.queue_size = queue_size
+        self.batch_size = max(1, int(batch_size))
+        self.batch_timeout = batch_timeout_ms / 1000.0
+        self.drop_policy = drop_policy
+        self.on_drop = on_drop
+        self.next_stage = None
+        self.running = False
+        self.threads = []
+        self._stats_lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._batch_seconds = BATCH_SECONDS.labels(name)
+
+    def put(self, item):
+        """Enqueue one item, applying the stage's backpressure/drop policy."""
+        if self.drop_policy == "block":
+            self.queue.put(item)
+            return True
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        if self.drop_policy == "drop_oldest":
+            try:
+                self._drop(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except queue.Full:
+                pass
+        self._drop(item)
+        return False
+
+    def _drop(self, item):
+        with self._stats_lock:
+            self.dropped += 1
+        if self.on_drop is not None:
+            try:
+                self.on_drop(item)
+            except Exception as e:
+                logger.error(f"[PIPELINE] Stage '{self.name}' drop callback failed: {e}")
+
+    def put_many(self, items):
+        for item in items:
+            self.put(item)
+
+    def _next_batch(self):
+        try:
+            first = self.queue.get(timeout=0.5)
+        except queue.Empty:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self.queue.get_nowait())
+                else:
+                    batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while self.running or not self.queue.empty():
+            batch = self._next_batch()
+            if batch is None:
+                continue
+            started = time.perf_counter()
+            try:
+                output = self.handler(batch)
+            except Exception as e:
+                output = None
+                with self._stats_lock:
+                    self.errors += 1
+                logger.error(f"[PIPELINE] Stage '{self.name}' failed on a batch of {len(batch)}: {e}")
+                for item in batch:
+                    self._drop(item)  # Guarded: a failing callback must not kill the worker
+            elapsed = time.perf_counter() - started
+            self._batch_seconds.observe(elapsed)
+            with self._stats_lock:
+                self.processed += len(batch)
+                self.batches += 1
+                self.busy_seconds += elapsed
+            if output and self.next_stage is not None:
+                self.next_stage.put_many(output)
+
+    def start(self):
+        self.running = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"stage-{self.name}-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def stop(self, timeout=5.0):
+        self.running = False
+        for t in self.threads:
+            t.join(timeout=timeout)
+        self.threads = []
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "errors": self.errors,
+                "busy_seconds": self.busy_seconds,
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue_size,
+                "workers": self.workers,
+            }
+
+
+class Pipeline:
+    """Chain of stages with periodic throughput and queue-depth reporting."""
+
+    def __init__(self, stages, report_interval=30):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.next_stage = downstream
+        self.report_interval = report_interval
+        self.running = False
+        self._reporter = None
+        self._last = {}
+
+    @property
+    def head(self):
+        return self.stages[0]
+
+    def submit(self, items):
+        self.head.put_many(items)
+
+    def start(self):
+        self.running = True
+        for stage in self.stages:
+            stage.start()
+        if self.report_interval:
+            self._reporter = threading.Thread(target=self._report_loop, name="pipeline-report", daemon=True)
+            self._reporter.start()
+
+    def stop(self):
+        """Stop stages front to back so in-flight batches drain downstream."""
+        self.running = False
+        for stage in self.stages:
+            stage.stop()
+        self.report()
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def collect_metrics(self):
+        stats = self.stats()
+        families = (
+            ("pipeline_items_processed_total", "counter", "Items handled by each stage", "processed"),
+            ("pipeline_items_dropped_total", "counter", "Items discarded by a stage's drop policy", "dropped"),
+            ("pipeline_batch_errors_total", "counter", "Micro-batches whose handler raised", "errors"),
+            ("pipeline_queue_depth", "gauge", "Items waiting in each stage's queue", "queue_depth"),
+            ("pipeline_queue_capacity", "gauge", "Size of each stage's bounded queue", "queue_size"),
+        )
+        return [(name, kind, help_text, [({"stage": stage}, s[key]) for stage, s in stats.items()])
+                for name, kind, help_text, key in families]
+
+    def report(self):
+        now = time.monotonic()
+        for name, s in self.stats().items():
+            last_time, last_processed = self._last.get(name, (now, 0))
+            elapsed = now - last_time
+            rate = (s["processed"] - last_processed) / elapsed if elapsed > 0 else 0.0
+            self._last[name] = (now, s["processed"])
+            logger.info(
+                f"[PIPELINE] {name}: {rate:.1f} ev/s | processed={s['processed']} "
+                f"dropped={s['dropped']} errors={s['errors']} "
+                f"queue={s['queue_depth']}/{s['queue_size']} workers={s['workers']}"
+            )
+
+    def _report_loop(self):
+        self.report()
+        while self.running:
+            time.sleep(self.report_interval)
+            if self.running:
+                self.report()
@@ -0,0 +1,279 @@
+# collectors/tailer.py
+import logging
+import os
+import threading
+import time
+
+from collectors.inotify import (
+    Inotify, inotify_available,
+    IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO,
+    IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF, IN_Q_OVERFLOW,
+    IN_IGNORED, IN_ONLYDIR,
+)
+
+logger = logging.getLogger(__name__)
+
+DIR_WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+
+class TailedFile:
+    """Read state for one followed path: open descriptor, inode and offset."""
+
+    __slots__ = ("path", "fd", "dev", "ino", "offset", "partial")
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.dev = None
+        self.ino = None
+        self.offset = 0
+        self.partial = b""
+
+    def close(self):
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+
+
+class FileTailer:
+    """
+    Follow many log files from a single reactor thread.
+
+    Uses inotify on the parent directories when available, falling back to
+    stat polling. File descriptors stay open between reads; rotation (inode
+    change) and truncation (size below offset) are detected on every wakeup.
+    `handler(path, lines, position)` is called with each batch of complete
+    lines, where position is (dev, inode, offset just past the last line).
+    `resume(dev, inode)` may return a saved offset to continue from.
+    """
+
+    def __init__(self, paths, handler, mode="auto", chunk_size=64 * 1024,
+                 max_bytes_per_pass=1024 * 1024, poll_interval=1.0,
+                 rescan_interval=30.0, max_line_bytes=64 * 1024,
+                 start_at_end=False, resume=None):
+        self.handler = handler
+        self.resume = resume
+        self.chunk_size = chunk_size
+        self.max_bytes_per_pass = max_bytes_per_pass
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.max_line_bytes = max_line_bytes
+        self.start_at_end = start_at_end
+        self.files = {}
+        self._by_dir = {}
+        self._wd_to_dir = {}
+        self._ready = set()
+        self._lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+        if mode == "auto":
+            mode = "inotify" if inotify_available() else "poll"
+        self.mode = mode
+        self._inotify = None
+        if self.mode == "inotify":
+            try:
+                self._inotify = Inotify()
+            except OSError as e:
+                logger.warning(f"[TAILER] inotify unavailable ({e}); falling back to polling.")
+                self.mode = "poll"
+
+        for path in paths:
+            self.add_path(path)
+
+    def add_path(self, path):
+        """Start following a path. Safe to call while the reactor is running."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if path in self.files:
+                return
+            tf = TailedFile(path)
+            self.files[path] = tf
+            directory, name = os.path.split(path)
+            names = self._by_dir.setdefault(directory, {})
+            names[name] = tf
+            if self._inotify is not None and len(names) == 1:
+                self._watch_dir(directory)
+            self._ready.add(tf)
+
+    def _watch_dir(self, directory):
+        try:
+            wd = self._inotify.add_watch(directory, DIR_WATCH_MASK)
+            self._wd_to_dir[wd] = directory
+        except OSError as e:
+            logger.error(f"[TAILER] Cannot watch {directory}: {e}")
+
+    def _open(self, tf, from_start):
+        try:
+            fd = os.open(tf.path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        except FileNotFoundError:
+            return False
+        st = os.fstat(fd)
+        tf.close()
+        tf.fd = fd
+        tf.dev, tf.ino = st.st_dev, st.st_ino
+        tf.offset = 0 if from_start else st.st_size
+        tf.partial = b""
+        if self.resume is not None:
+            saved = self.resume(tf.dev, tf.ino)
+            if saved is not None and saved <= st.st_size:
+                tf.offset = saved
+                logger.info(f"[TAILER] Resuming {tf.path} at offset {saved}")
+        return True
+
+    def _drain(self, tf):
+        """
+        Read up to max_bytes_per_pass from the open descriptor.
+        Returns True if more data may be pending.
+        """
+        if tf.fd is None:
+            return False
+        budget = self.max_bytes_per_pass
+        lines = []
+        more = False
+        while budget > 0:
+            data = os.pread(tf.fd, min(self.chunk_size, budget), tf.offset)
+            if not data:
+                break
+            tf.offset += len(data)
+            budget -= len(data)
+            buf = tf.partial + data
+            parts = buf.split(b"\n")
+            tf.partial = parts.pop()
+            if len(tf.partial) > self.max_line_bytes:
+                parts.append(tf.partial)
+                tf.partial = b""
+            for raw in parts:
+                line = raw.decode("utf-8", errors="replace").strip()
+                if line:
+                    lines.append(line)
+        else:
+            more = True
+
+        if lines:
+            try:
+                self.handler(tf.path, lines, (tf.dev, tf.ino, tf.offset - len(tf.partial)))
+            except Exception as e:
+                logger.error(f"[TAILER] Handler failed for {tf.path}: {e}")
+        return more
+
+    def _service(self, tf):
+        """Bring one file up to date, handling rotation and truncation."""
+        more = self._drain(tf)
+        if more:
+            return True
+
+        try:
+            st = os.stat(tf.path)
+        except FileNotFoundError:
+            # Rotated away and not yet recreated: keep the old descriptor
+            # so trailing writes to the renamed file are still picked up.
+            return False
+
+        if tf.fd is None:
+            self._open(tf, from_start=not self.start_at_end or tf.ino is not None)
+        elif (st.st_dev, st.st_ino) != (tf.dev, tf.ino):
+            logger.info(f"[TAILER] Rotation detected: {tf.path}")
+            if tf.partial:
+                self._emit_partial(tf)
+            self._open(tf, from_start=True)
+        elif st.st_size < tf.offset:
+            logger.info(f"[TAILER] Truncation detected: {tf.path}")
+            tf.offset = 0
+            tf.partial = b""
+        else:
+            return False
+        return self._drain(tf)
+
+    def _emit_partial(self, tf):
+        line = tf.partial.decode("utf-8", errors="replace").strip()
+        tf.partial = b""
+        if line:
+            try:
+                self.handler(tf.path, [line], (tf.dev, tf.ino, tf.offset))
+            except Exception as e:
+                logger.error(f"[TAILER] Handler failed for {tf.path}: {e}")
+
+    def _collect_inotify(self, timeout):
+        woken = set()
+        for wd, mask, _cookie, name in self._inotify.read_events(timeout):
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("[TAILER] inotify queue overflow; rescanning all files.")
+                woken.update(self.files.values())
+                continue
+            directory = self._wd_to_dir.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                # Directory itself went away; re-arm on the next rescan
+                self._wd_to_dir.pop(wd, None)
+                woken.update(self._by_dir.get(directory, {}).values())
+                continue
+            tf = self._by_dir.get(directory, {}).get(name)
+            if tf is not None:
+                woken.add(tf)
+        if woken:
+            with self._lock:
+                self._ready.update(woken)
+
+    def _rearm_watches(self):
+        watched = set(self._wd_to_dir.values())
+        for directory in self._by_dir:
+            if directory not in watched and os.path.isdir(directory):
+                self._watch_dir(directory)
+
+    def _run(self):
+        last_rescan = time.monotonic()
+        while self.running:
+            try:
+                with self._lock:
+                    pending = bool(self._ready)
+                timeout = 0 if pending else self.poll_interval
+
+                if self._inotify is not None:
+                    self._collect_inotify(timeout)
+                elif not pending:
+                    time.sleep(timeout)
+
+                now = time.monotonic()
+                interval = self.poll_interval if self._inotify is None else self.rescan_interval
+                with self._lock:
+                    if now - last_rescan >= interval:
+                        if self._inotify is not None:
+                            self._rearm_watches()
+                        self._ready.update(self.files.values())
+                        last_rescan = now
+                    ready, self._ready = self._ready, set()
+
+                for tf in ready:
+                    try:
+                        if self._service(tf):
+                            with self._lock:
+                                self._ready.add(tf)
+                    except OSError as e:
+                        logger.error(f"[TAILER] Error reading {tf.path}: {e}")
+            except Exception as e:
+                logger.error(f"[TAILER] Reactor error: {e}")
+                time.sleep(self.poll_interval)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="log-tailer", daemon=True)
+        self.thread.start()
+        logger.info(f"[TAILER] Following {len(self.files)} file(s) in {self.mode} mode.")
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=self.poll_interval + 1)
+        for tf in self.files.values():
+            tf.close()
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
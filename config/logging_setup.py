@@ -0,0 +1,130 @@
+# config/logging_setup.py
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+
+def _category(msg):
+    """Return the leading '[TAG]' of a log message, or None."""
+    if isinstance(msg, str) and msg.startswith("["):
+        end = msg.find("]")
+        if end > 0:
+            return msg[:end + 1]
+    return None
+
+
+class CategoryRateLimiter(logging.Filter):
+    """
+    Cap how many records per second each message category (the leading
+    '[TAG]') may emit. Suppressed records are counted and the count is
+    appended to the next record that gets through for that category.
+    The decision is cached on the record, so one limiter attached to
+    several handlers counts each record once.
+    """
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = dict(limits or {})
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        decision = getattr(record, "_rate_limit_passed", None)
+        if decision is None:
+            decision = record._rate_limit_passed = self._admit(record)
+        return decision
+
+    def _admit(self, record):
+        category = _category(record.msg)
+        limit = self.limits.get(category)
+        if limit is None:
+            return True
+        second = int(time.monotonic())
+        with self._lock:
+            window, count, suppressed = self._windows.get(category, (second, 0, 0))
+            if window != second:
+                window, count = second, 0
+            if count >= limit:
+                self._windows[category] = (window, count, suppressed + 1)
+                return False
+            self._windows[category] = (window, count + 1, 0)
+        if suppressed:
+            record.msg = f"{record.msg} (+{suppressed} suppressed {category} messages)"
+        return True
+
+    def pending(self):
+        """Suppressed counts not yet reported, per category."""
+        with self._lock:
+            return {c: s for c, (_, _, s) in self._windows.items() if s}
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Non-blocking queue handler that hands the record over unformatted, so
+    message formatting happens on the listener thread rather than the
+    caller's. Records are dropped (and counted) if the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(log_config):
+    """
+    Configure root logging from the `logging` section of config.yaml.
+
+    With `async: true` (the default), callers only enqueue records; a
+    listener thread formats and writes them to the file and console
+    handlers. Per-category rate limits apply before enqueueing.
+    Returns the QueueListener (or None in synchronous mode).
+    """
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler(log_config['file'], encoding='utf-8'),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    rate_limiter = CategoryRateLimiter(log_config.get('rate_limits', {}))
+    root = logging.getLogger()
+    root.setLevel(log_config.get('level', 'INFO'))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if not log_config.get('async', True):
+        for handler in handlers:
+            handler.addFilter(rate_limiter)
+            root.addHandler(handler)
+        return None
+
+    log_queue = queue.Queue(maxsize=log_config.get('queue_size', 10000))
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(rate_limiter)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    def _shutdown():
+        for category, count in rate_limiter.pending().items():
+            logging.getLogger(__name__).info(f"[LOGGING] {count} {category} message(s) suppressed by rate limit")
+        if queue_handler.dropped:
+            logging.getLogger(__name__).warning(f"[LOGGING] {queue_handler.dropped} record(s) dropped: queue full")
+        listener.stop()
+
+    atexit.register(_shutdown)
+    return listener
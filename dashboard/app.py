@@ -1,57 +1,203 @@
 # dashboard/app.py
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request, stream_with_context
+import json
 import os
-import re
-from datetime import datetime
+import sys
+import threading
+from datetime import datetime, timezone
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from monitoring.metrics import CONTENT_TYPE, REGISTRY  # noqa: E402
+from storage.alert_bus import FILTER_FIELDS, AlertBus, StoreFeed, alert_filter  # noqa: E402
+from storage.event_store import EventStore, FILTERS, STORE_FILE  # noqa: E402
 
 app = Flask(__name__)
 
-LOG_FILE = "../logs/app.log"
-BLOCKED_FILE = "../logs/blocked_ips.txt"
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+_store = None
+_bus = None
+_lock = threading.Lock()
+
+def settings(section):
+    try:
+        with open(os.path.join(ROOT, "config", "config.yaml"), "r") as f:
+            return (yaml.safe_load(f) or {}).get(section, {}) or {}
+    except OSError:
+        return {}
+
+def get_store():
+    """Read side of the event store the detection process writes (WAL allows concurrent readers)."""
+    global _store
+    with _lock:
+        if _store is None:
+            _store = EventStore(os.path.join(ROOT, settings("storage").get("path", STORE_FILE)))
+        return _store
+
+def get_bus():
+    """
+    Bus behind /api/alerts/stream: the engines' own bus when served from
+    run.py, otherwise one fed from the event store.
+    """
+    global _bus
+    store = get_store() if _bus is None else None
+    with _lock:
+        if _bus is None:
+            stream = settings("dashboard").get("stream", {}) or {}
+            bus = AlertBus(ring_size=stream.get("ring_size", 10000),
+                           max_subscribers=stream.get("max_subscribers", 500))
+            bus.start()
+            StoreFeed(store, bus, poll_interval=stream.get("store_poll_interval", 0.5)).start()
+            REGISTRY.register(bus.collect_metrics)
+            _bus = bus
+        return _bus
+
+def iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ") if ts else None
 
-def read_log_lines(filepath, limit=100):
-    if not os.path.exists(filepath):
-        return []
-    with open(filepath, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    return [line.strip() for line in lines[-limit:]]
+def page(table):
+    """
+    One newest-first page of `table`, filtered by the query string:
+    ?limit=&cursor=&since=&until= (epoch seconds) plus equality filters on
+    the table's indexed columns. The cursor for the next page is returned
+    in the X-Next-Cursor header.
+    """
+    args = request.args
+    limit = min(max(args.get("limit", DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+    filters = {column: args[column] for column in FILTERS[table] if column in args}
+    if "target" in FILTERS[table] and "ip" in args:
+        filters.setdefault("target", args["ip"])
+    return get_store().query(table, limit=limit, cursor=args.get("cursor", type=int),
+                             since=args.get("since", type=float), until=args.get("until", type=float), **filters)
+
+def respond(rows, next_cursor):
+    response = jsonify(rows)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response
 
 @app.route('/api/logs')
 def get_logs():
-    logs = []
-    pattern = r'(\S+\s+\S+)\s+(\S+)\s+(AUTH|SECURITY):\s+(.*)'
-    for line in read_log_lines(LOG_FILE):
-        match = re.match(pattern, line)
-        if match:
-            timestamp, host, component, message = match.groups()
-            logs.append({
-                "time": timestamp,
-                "host": host,
-                "component": component,
-                "message": message
-            })
-    return jsonify(logs)
+    rows, next_cursor = page("events")
+    return respond([{
+        "id": row["id"],
+        "time": iso(row["ts"]),
+        "host": row["host"],
+        "component": row["event_type"],
+        "message": row["raw"],
+        "ip": row["ip"],
+        "user": row["user"],
+        "severity": row["severity"],
+    } for row in rows], next_cursor)
+
+def alert_view(row, alert_id):
+    subject = row["raw"] if row["source"] == "yara" and not row["ip"] else f"IP: {row['ip'] or 'unknown'}"
+    return {
+        "id": alert_id,
+        "text": f"[ALERT] {row['severity'].upper()} - {row['title']} | {subject}",
+        "time": iso(row["event_ts"] or row["ts"]),
+        "detected_at": iso(row["ts"]),
+        "source": row["source"],
+        "rule_id": row["rule_id"],
+        "title": row["title"],
+        "severity": row["severity"],
+        "ip": row["ip"],
+        "user": row["user"],
+        "incident_id": row["incident_id"],
+        "raw": row["raw"],
+    }
 
 @app.route('/api/alerts')
 def get_alerts():
-    alerts = []
-    for line in read_log_lines("../logs/mvp.log"):
-        if "[ALERT]" in line or "[ANOMALY]" in line:
-            alerts.append({"text": line, "time": datetime.now().isoformat()})
-    return jsonify(alerts[-20:])
+    rows, next_cursor = page("alerts")
+    return respond([alert_view(row, row["id"]) for row in rows], next_cursor)
+
+@app.route('/api/alerts/stream')
+def stream_alerts():
+    """
+    Live alerts as server-sent events (or newline-delimited JSON with
+    ?format=ndjson). Filters: min_severity plus comma-separated source,
+    rule_id, severity, ip, user, incident_id. Reconnecting clients resume
+    after Last-Event-ID (or ?last_id=); a `dropped` event reports alerts
+    that had already left the server's buffer.
+    """
+    args = request.args
+    try:
+        predicate = alert_filter(args.get("min_severity"),
+                                 **{field: args[field] for field in FILTER_FIELDS if field in args})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    last_id = request.headers.get("Last-Event-ID", args.get("last_id"))
+    try:
+        subscription = get_bus().subscribe(int(last_id) if last_id else None, predicate)
+    except ValueError:
+        return jsonify({"error": f"invalid last_id {last_id!r}"}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+    ndjson = args.get("format") == "ndjson"
+    heartbeat = float((settings("dashboard").get("stream", {}) or {}).get("heartbeat", 15))
+
+    def events():
+        try:
+            if not ndjson:
+                yield "retry: 3000\n\n"
+            while True:
+                entries, missed = subscription.read(timeout=heartbeat)
+                chunks = []
+                if missed:
+                    payload = json.dumps({"missed": missed, "resume_from": subscription.cursor})
+                    chunks.append(payload + "\n" if ndjson else f"event: dropped\ndata: {payload}\n\n")
+                for seq, record in entries:
+                    payload = json.dumps(alert_view(record, seq))
+                    chunks.append(payload + "\n" if ndjson else f"id: {seq}\nevent: alert\ndata: {payload}\n\n")
+                yield "".join(chunks) or ("\n" if ndjson else ": keepalive\n\n")
+        finally:
+            subscription.close()
+
+    mimetype = "application/x-ndjson" if ndjson else "text/event-stream"
+    return Response(stream_with_context(events()), mimetype=mimetype,
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route('/api/blocked_ips')
 def get_blocked_ips():
-    ips = []
-    for line in read_log_lines(BLOCKED_FILE):
-        if "BLOCKED" in line:
-            parts = line.split("|")
-            ips.append({
-                "timestamp": parts[0].strip(),
-                "ip": parts[2].strip(),
-                "reason": parts[3].strip()
-            })
-    return jsonify(ips)
+    """Currently blocked IPs/CIDRs, or every block action with ?history=1."""
+    if request.args.get("history", type=int):
+        rows, next_cursor = page("blocks")
+        return respond([{
+            "id": row["id"],
+            "timestamp": iso(row["ts"]),
+            "action": row["action"],
+            "ip": row["target"],
+            "reason": row["reason"],
+            "expires": iso(row["expires"]),
+        } for row in rows], next_cursor)
+    rows, next_cursor = page("blocked")
+    return respond([{
+        "id": row["rowid"],
+        "timestamp": iso(row["ts"]),
+        "ip": row["target"],
+        "reason": row["reason"],
+        "expires": iso(row["expires"]),
+    } for row in rows], next_cursor)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics of this process (the detection pipeline when served from run.py)."""
+    return Response(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+def serve(bus, host="127.0.0.1", port=5000):
+    """Serve the API from a background thread of the detection process, streaming from `bus` directly."""
+    from werkzeug.serving import make_server
+    global _bus
+    _bus = bus
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="dashboard-api", daemon=True).start()
+    return server
 
 if __name__ == '__main__':
-    app.run(port=5000)
\ No newline at end of file
+    app.run(port=5000, threaded=True)
@@ -1,20 +1,78 @@
 # detection/anomaly_detector.py
+import hashlib
+import json
 import logging
+import os
+import threading
+import time
 import numpy as np
-import pandas as pd
 from pyod.models.knn import KNN
 from datetime import datetime
 
+from detection.features import BEHAVIOUR_FEATURES, BehaviourFeatures
+from detection.streaming import HalfSpaceTrees, Reservoir
+from monitoring.metrics import counter, histogram
+from storage.event_store import record_alert
+
 logger = logging.getLogger(__name__)
 
+SCORE_SECONDS = histogram("anomaly_score_seconds", "Feature extraction and scoring time per micro-batch")
+RETRAIN_SECONDS = histogram("anomaly_retrain_seconds", "Time to fit a replacement KNN model")
+EVENTS_SCORED = counter("anomaly_events_scored_total", "Events scored by the anomaly detector")
+ANOMALIES = counter("anomaly_alerts_total", "Events flagged as behavioural outliers")
+
+# Value range of each feature column, used to scale streaming models.
+# Behaviour columns are log1p counts; 10k events per entity per window saturates.
+STATIC_FEATURES = ("hour", "is_failed_login", "severity_score", "is_external_ip")
+FEATURE_NAMES = STATIC_FEATURES + BEHAVIOUR_FEATURES
+FEATURE_MINS = (0, 0, 0, 0) + (0,) * len(BEHAVIOUR_FEATURES)
+FEATURE_MAXS = (23, 1, 2, 1) + (float(np.log1p(10000)),) * len(BEHAVIOUR_FEATURES)
+SEVERITY_SCORES = {"info": 0, "high": 1, "critical": 2}
+
+MODEL_VERSION = 3  # Bump when the saved model layout changes
+
+
+def feature_schema_fingerprint():
+    """Short hash of the feature columns and ranges a saved model was trained on."""
+    schema = json.dumps([FEATURE_NAMES, FEATURE_MINS, FEATURE_MAXS])
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
 class AnomalyDetector:
-    def __init__(self, contamination=0.1, n_neighbors=5):
+    """
+    Behavioural outlier detection over per-event features.
+
+    mode="streaming" scores with half-space trees that learn in O(1) per
+    event and need no refits. mode="knn" scores with a PyOD KNN that a
+    background thread refits on a reservoir sample every `retrain_every`
+    events and swaps in atomically. Either way, `process_batch` scores a
+    whole micro-batch as one NumPy matrix. Static per-event features are
+    joined with per-IP/per-user rates from a sketch-backed BehaviourFeatures
+    store (see detection/features.py).
+    """
+
+    def __init__(self, contamination=0.1, n_neighbors=5, mode="streaming", window=256, n_trees=25,
+                 depth=10, reservoir_size=5000, retrain_every=2000, min_train_size=50, behaviour=None,
+                 record_alerts="live"):
         self.contamination = contamination
-        self.model = KNN(contamination=contamination, n_neighbors=n_neighbors)
-        self.is_fitted = False
-        self.scaler = None
-        self.feature_buffer = []  # Store recent events for batch detection
-        logger.info("[ANOMALY] Initialized KNN-based anomaly detector.")
+        self.n_neighbors = n_neighbors
+        self.mode = mode
+        self.retrain_every = retrain_every
+        self.min_train_size = min_train_size
+        self.behaviour = behaviour or BehaviourFeatures()
+        self.record_alerts = record_alerts  # live | replay (stored, tagged, not streamed) | off
+        self.hst = HalfSpaceTrees(FEATURE_MINS, FEATURE_MAXS, n_trees=n_trees, depth=depth, window=window)
+        self.reservoir = Reservoir(reservoir_size, len(FEATURE_NAMES))
+        self.model = None  # Fitted KNN; replaced wholesale by the trainer thread
+        self.threshold = None  # Streaming score above which an event is anomalous
+        self._window_rows = []
+        self._since_retrain = 0
+        self._training = False
+        self._lock = threading.Lock()  # Guards the streaming model and reservoir across detect workers
+        logger.info(f"[ANOMALY] Initialized {mode} anomaly detector.")
+
+    @property
+    def is_fitted(self):
+        return self.model is not None if self.mode == "knn" else self.threshold is not None
 
     def extract_features(self, event):
         """
@@ -22,57 +80,265 @@ class AnomalyDetector:
         Example features: time_of_day, login_attempts, IP frequency, etc.
         """
         try:
-            # Simulate numeric features from event
-            timestamp = datetime.fromisoformat(event.get("timestamp", datetime.utcnow().isoformat()).replace("Z", ""))
-            hour = timestamp.hour
+            # Simulate numeric features from event (ts is epoch seconds, parsed once)
+            ts = event.get("ts") or time.time()
+            hour = int(ts // 3600) % 24
             is_failed_login = 1 if event.get("event_type") == "failed_login" else 0
             is_external_ip = 1 if event.get("ip", "").startswith("192.168.") else 0  # Simplified
-            severity_score = {"info": 0, "high": 1, "critical": 2}.get(event.get("severity", "info"), 0)
+            severity_score = SEVERITY_SCORES.get(event.get("severity", "info"), 0)
 
             return [hour, is_failed_login, severity_score, is_external_ip]
         except Exception as e:
-            logger.debug(f"[ANOMALY] Feature extraction failed: {e}")
+            logger.debug("[ANOMALY] Feature extraction failed: %s", e)
             return [0, 0, 0, 0]
 
-    def add_event(self, event):
-        """Add a new structured log event for real-time anomaly checking"""
-        features = self.extract_features(event)
-        self.feature_buffer.append(features)
-
-        # Retrain every 10 events
-        if len(self.feature_buffer) >= 10 and not self.is_fitted:
-            self.train()
-        elif len(self.feature_buffer) >= 20:
-            # Keep buffer size under control
-            self.feature_buffer = self.feature_buffer[-10:]
-            self.train()
-
-    def train(self):
-        """Train KNN model on recent behavior"""
-        X = np.array(self.feature_buffer)
+    def feature_matrix(self, events, update=True):
+        """Static and behaviour features for a batch; update=False reads the sketches without counting."""
+        n = len(events)
+        now = time.time()
+        ts = np.fromiter((event.get("ts") or now for event in events), dtype=float, count=n)
+        static = np.column_stack((
+            (ts // 3600) % 24,
+            np.fromiter((event.get("event_type") == "failed_login" for event in events), dtype=float, count=n),
+            np.fromiter((SEVERITY_SCORES.get(event.get("severity", "info"), 0) for event in events),
+                        dtype=float, count=n),
+            np.fromiter((str(event.get("ip") or "").startswith("192.168.") for event in events),
+                        dtype=float, count=n),  # Simplified
+        )) if n else np.zeros((0, len(STATIC_FEATURES)))
+        return np.hstack((static, self.behaviour.extract(events, update=update)))
+
+    def process_batch(self, events):
+        """Score a micro-batch, then learn from it. Returns the anomaly alerts."""
+        if not events:
+            return []
+        started = time.perf_counter()
+        X = self.feature_matrix(events)
+        with self._lock:
+            if self.mode == "knn":
+                flags, scores = self._score_knn(X)
+                self._learn_reservoir(X)
+            else:
+                flags, scores = self._score_streaming(X)
+        SCORE_SECONDS.observe(time.perf_counter() - started)
+        EVENTS_SCORED.inc(len(events))
+        flagged = np.flatnonzero(flags)
+        if len(flagged):
+            ANOMALIES.inc(len(flagged))
+        return [self._alert(events[i], scores[i]) for i in flagged]
+
+    def _score_streaming(self, X):
+        windows_before = self.hst.windows_completed
+        ready = self.hst.ready
+        scores = self.hst.score_learn(X)
+        self._window_rows.append(X)
+        if self.hst.windows_completed != windows_before:
+            # Recalibrate: score the window that just became the reference against itself
+            window_rows = np.concatenate(self._window_rows)
+            self.threshold = float(np.quantile(self.hst.score(window_rows), 1 - self.contamination))
+            self._window_rows = []
+            if windows_before == 0:
+                logger.info("[ANOMALY] Streaming model ready after first window.")
+        if not ready or self.threshold is None:
+            return np.zeros(len(X), dtype=bool), scores
+        return scores > self.threshold, scores
+
+    def _score_knn(self, X):
+        model = self.model
+        if model is None:
+            return np.zeros(len(X), dtype=bool), np.zeros(len(X))
+        scores = model.decision_function(X)
+        return scores > model.threshold_, scores
+
+    def _learn_reservoir(self, X):
+        self.reservoir.add(X)
+        self._since_retrain += len(X)
+        due = self._since_retrain >= self.retrain_every or (self.model is None and len(self.reservoir) >= self.min_train_size)
+        if due and not self._training:
+            self._training = True
+            self._since_retrain = 0
+            sample = self.reservoir.sample()
+            threading.Thread(target=self._train, args=(sample,), name="anomaly-retrain", daemon=True).start()
+
+    def partial_fit(self, X):
+        """Learn from a historical feature matrix without scoring (offline training)."""
+        with self._lock:
+            if self.mode == "knn":
+                self.reservoir.add(X)
+            else:
+                self._score_streaming(X)
+
+    def refit(self):
+        """Fit the KNN on the current reservoir sample now, in this thread."""
+        if self.mode == "knn" and len(self.reservoir) >= self.min_train_size:
+            self._training = True
+            self._train(self.reservoir.sample())
+            self._since_retrain = 0
+
+    def _fit_knn(self, sample):
+        """KNN fitted on `sample`, which it keeps as `train_sample_` so it can be saved as plain arrays."""
+        model = KNN(contamination=self.contamination, n_neighbors=min(self.n_neighbors, len(sample) - 1))
+        model.fit(sample)
+        model.train_sample_ = sample
+        return model
+
+    def _restore_knn(self, sample, decision_scores, threshold):
+        """
+        A fitted KNN rebuilt from saved arrays without calling fit(): only
+        the neighbour index over `sample` is built, which is far cheaper
+        than fit's all-pairs scoring pass over the training set.
+        """
+        model = KNN(contamination=self.contamination, n_neighbors=min(self.n_neighbors, len(sample) - 1))
+        model._set_n_classes(None)
+        model.neigh_.fit(sample)
+        model.tree_ = model.neigh_._tree if model.neigh_._tree is not None else model.neigh_
+        model.decision_scores_ = decision_scores
+        model.threshold_ = threshold
+        model.labels_ = (decision_scores > threshold).astype(int)
+        model._mu = float(np.mean(decision_scores))
+        model._sigma = float(np.std(decision_scores))
+        model.train_sample_ = sample
+        return model
+
+    def _train(self, sample):
+        """Fit a fresh KNN off the ingestion path and swap it in."""
         try:
-            self.model.fit(X)
-            self.is_fitted = True
-            logger.info("[ANOMALY] Model trained on recent log patterns.")
+            started = time.perf_counter()
+            model = self._fit_knn(sample)
+            RETRAIN_SECONDS.observe(time.perf_counter() - started)
+            self.model = model
+            logger.info(f"[ANOMALY] Model retrained on {len(sample)} sampled events.")
         except Exception as e:
             logger.error(f"[ANOMALY] Training failed: {e}")
+        finally:
+            self._training = False
 
-    def detect(self, event):
-        """Check if a single event is anomalous"""
-        if not self.is_fitted:
-            return None
-
-        features = np.array([self.extract_features(event)])
-        pred = self.model.predict(features)[0]
-        score = self.model.decision_function(features)[0]
-
-        if pred == 1:
-            alert = {
-                "anomaly_type": "behavioral_outlier",
-                "confidence_score": float(score),
-                "event": event,
-                "timestamp": datetime.utcnow().isoformat() + "Z"
+    def save_model(self, path, trained_events=0):
+        """
+        Write the fitted model to `path` (.npz) with the format version and
+        feature-schema fingerprint, atomically via a temp file. Only plain
+        arrays are stored (a KNN as its training sample, training scores and
+        threshold), so loading never unpickles anything or refits.
+        """
+        with self._lock:
+            meta = {
+                "version": MODEL_VERSION,
+                "schema": feature_schema_fingerprint(),
+                "features": list(FEATURE_NAMES),
+                "mode": self.mode,
+                "contamination": self.contamination,
+                "trained_events": trained_events,
+                "created": datetime.utcnow().isoformat() + "Z",
             }
-            logger.warning(f"[ANOMALY] Detected: {alert}")
-            return alert
-        return None
\ No newline at end of file
+            arrays = {"meta": np.array(json.dumps(meta))}
+            if self.mode == "knn":
+                if self.model is None:
+                    raise ValueError("KNN model is not fitted")
+                arrays["knn_sample"] = self.model.train_sample_
+                arrays["knn_scores"] = self.model.decision_scores_
+                arrays["knn_threshold"] = np.array(self.model.threshold_)
+                arrays["reservoir"] = self.reservoir.sample()
+                arrays["reservoir_seen"] = np.array(self.reservoir.seen)
+            else:
+                if self.threshold is None:
+                    raise ValueError("streaming model has not completed a window")
+                hst = self.hst
+                arrays.update(split_feature=hst.split_feature, split_value=hst.split_value,
+                              reference=hst.reference, latest=hst.latest,
+                              counters=np.array([hst.window, hst.seen_in_window, hst.windows_completed]),
+                              size_limit=np.array(hst.size_limit), threshold=np.array(self.threshold))
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, path)
+        logger.info(f"[ANOMALY] Saved {self.mode} model to {path} ({trained_events} training events).")
+
+    def load_model(self, path):
+        """
+        Restore a model written by save_model so scoring starts immediately.
+        Returns False (keeping the cold model) if the file is missing,
+        unreadable, from another version or mode, or built for a different
+        feature schema.
+        """
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("version") != MODEL_VERSION or meta.get("schema") != feature_schema_fingerprint():
+                    logger.warning(f"[ANOMALY] Ignoring {path}: built for model v{meta.get('version')} / "
+                                   f"schema {meta.get('schema')}, need v{MODEL_VERSION} / {feature_schema_fingerprint()}.")
+                    return False
+                if meta.get("mode") != self.mode:
+                    logger.warning(f"[ANOMALY] Ignoring {path}: {meta.get('mode')} model, detector runs {self.mode}.")
+                    return False
+                arrays = {name: data[name] for name in data.files if name != "meta"}
+            model = None
+            if self.mode == "knn":
+                model = self._restore_knn(arrays["knn_sample"], arrays["knn_scores"],
+                                          float(arrays["knn_threshold"]))
+        except Exception as e:
+            logger.error(f"[ANOMALY] Could not load model {path}: {e}")
+            return False
+
+        with self._lock:
+            if self.mode == "knn":
+                self.model = model
+                sample = arrays["reservoir"]
+                self.reservoir.add(sample[:self.reservoir.capacity])
+                self.reservoir.seen = max(self.reservoir.seen, int(arrays["reservoir_seen"]))
+            else:
+                split_feature = arrays["split_feature"]
+                n_trees, n_nodes = split_feature.shape
+                window, seen_in_window, windows_completed = (int(v) for v in arrays["counters"])
+                hst = self.hst
+                if hst.split_feature.shape != split_feature.shape or hst.window != window:
+                    # Saved with other sizing; the loaded arrays win over the configured ones
+                    hst = HalfSpaceTrees(FEATURE_MINS, FEATURE_MAXS, n_trees=n_trees,
+                                         depth=int(np.log2(n_nodes + 1)) - 1, window=window)
+                hst.size_limit = float(arrays["size_limit"])
+                hst.split_feature = split_feature
+                hst.split_value = arrays["split_value"]
+                hst.reference = arrays["reference"]
+                hst.latest = arrays["latest"]
+                hst.seen_in_window = seen_in_window
+                hst.windows_completed = windows_completed
+                self.hst = hst
+                self.threshold = float(arrays["threshold"])
+                self._window_rows = []
+        logger.info(f"[ANOMALY] Loaded {self.mode} model from {path} "
+                    f"({meta.get('trained_events', 0)} training events, {meta.get('created')}).")
+        return True
+
+    def _alert(self, event, score):
+        alert = {
+            "anomaly_type": "behavioral_outlier",
+            "confidence_score": float(score),
+            "event": event,
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }
+        logger.warning("[ANOMALY] Detected: %s", alert)
+        record_alert(alert, event, self.record_alerts)
+        return alert
+
+    def add_event(self, event):
+        """Learn from a single event without scoring it"""
+        X = self.feature_matrix([event])
+        with self._lock:
+            if self.mode == "knn":
+                self._learn_reservoir(X)
+            else:
+                self._score_streaming(X)
+
+    def detect(self, event):
+        """Check if a single event is anomalous (prefer process_batch for throughput)"""
+        X = self.feature_matrix([event], update=False)
+        with self._lock:
+            if self.mode == "knn":
+                flags, scores = self._score_knn(X)
+            else:
+                if self.threshold is None:
+                    return None
+                scores = self.hst.score(X)
+                flags = scores > self.threshold
+        return self._alert(event, scores[0]) if flags[0] else None
\ No newline at end of file
@@ -0,0 +1,72 @@
+# detection/features.py
+import threading
+import time
+
+import numpy as np
+
+from detection.sketches import WindowedCountMin, WindowedHyperLogLog, hash_keys
+
+# Per-entity rates over the sketch window, in the order extract() returns them
+BEHAVIOUR_FEATURES = (
+    "ip_events",            # events from this IP
+    "ip_failed_logins",     # failed logins from this IP
+    "user_failed_logins",   # failed logins against this user
+    "ip_distinct_users",    # distinct users this IP touched
+    "user_distinct_ips",    # distinct IPs this user was seen from
+)
+
+
+class BehaviourFeatures:
+    """
+    Per-IP and per-user behaviour over a sliding window, kept in
+    count-min and HyperLogLog sketches so memory stays fixed however many
+    entities are seen. Counts are log1p-scaled so a handful of events and
+    a flood both land in a usable feature range.
+    """
+
+    def __init__(self, window=300, buckets=5, width=2048, depth=4, hll_slots=4096, hll_registers=64):
+        self.window = window
+        self.ip_events = WindowedCountMin(width, depth, window, buckets)
+        self.ip_failed = WindowedCountMin(width, depth, window, buckets)
+        self.user_failed = WindowedCountMin(width, depth, window, buckets)
+        self.ip_users = WindowedHyperLogLog(hll_slots, hll_registers, window=window, buckets=buckets)
+        self.user_ips = WindowedHyperLogLog(hll_slots, hll_registers, window=window, buckets=buckets)
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(s.table.nbytes for s in (self.ip_events, self.ip_failed, self.user_failed,
+                                            self.ip_users, self.user_ips))
+
+    def extract(self, events, update=True):
+        """
+        Behaviour matrix (len(events) x len(BEHAVIOUR_FEATURES)). With
+        update=True the batch is counted first, so each row includes the
+        event itself and everything before it in the window.
+        """
+        n = len(events)
+        if n == 0:
+            return np.zeros((0, len(BEHAVIOUR_FEATURES)))
+        now = time.time()
+        ts = np.fromiter((event.get("ts") or now for event in events), dtype=float, count=n)
+        ips = hash_keys([event.get("ip") for event in events])
+        users = hash_keys([event.get("user") for event in events])
+        failed = np.fromiter((event.get("event_type") == "failed_login" for event in events), dtype=bool, count=n)
+        has_ip, has_user = ips != 0, users != 0
+        both = has_ip & has_user
+
+        with self._lock:
+            if update:
+                self.ip_events.add(ips, ts, mask=has_ip)
+                self.ip_failed.add(ips, ts, mask=failed & has_ip)
+                self.user_failed.add(users, ts, mask=failed & has_user)
+                self.ip_users.add(ips, users, ts, mask=both)
+                self.user_ips.add(users, ips, ts, mask=both)
+            columns = (
+                np.where(has_ip, self.ip_events.query(ips), 0),
+                np.where(has_ip, self.ip_failed.query(ips), 0),
+                np.where(has_user, self.user_failed.query(users), 0),
+                np.where(has_ip, self.ip_users.query(ips), 0),
+                np.where(has_user, self.user_ips.query(users), 0),
+            )
+        return np.log1p(np.column_stack(columns))
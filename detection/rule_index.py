@@ -0,0 +1,60 @@
+# detection/rule_index.py
+import logging
+
+logger = logging.getLogger(__name__)
+
+# When a selection pins several fields, index on the most selective one
+INDEX_FIELD_PREFERENCE = ("ip", "user", "host", "event_type", "severity")
+
+
+def choose_index_field(constraints):
+    for field in INDEX_FIELD_PREFERENCE:
+        if field in constraints:
+            return field
+    return next(iter(constraints), None)
+
+
+class RuleIndex:
+    """
+    Dispatch index over compiled Sigma rules keyed on one equality field
+    every match of the rule must satisfy, so an event is only evaluated
+    against rules whose pinned value(s) it carries (plus any rules that
+    cannot be indexed). Candidates keep load order so the first matching
+    rule still wins.
+    """
+
+    def __init__(self, rules):
+        self.size = len(rules)
+        self._position = {}
+        self._tables = {}
+        self._unindexed = []
+        for position, rule in enumerate(rules):
+            self._position[id(rule)] = position
+            field = choose_index_field(rule.constraints)
+            if field is None:
+                self._unindexed.append(rule)
+            else:
+                table = self._tables.setdefault(field, {})
+                for value in rule.constraints[field]:
+                    table.setdefault(value, []).append(rule)
+        indexed = self.size - len(self._unindexed)
+        logger.info(f"[SIGMA] Rule index: {indexed} indexed on {sorted(self._tables)}, "
+                    f"{len(self._unindexed)} unindexed.")
+
+    def candidates(self, event):
+        """Rules that could match `event`, in load order."""
+        groups = [self._unindexed] if self._unindexed else []
+        for field, table in self._tables.items():
+            value = event.get(field)
+            if value is not None:
+                hits = table.get(value if isinstance(value, str) else str(value))
+                if hits:
+                    groups.append(hits)
+        if not groups:
+            return []
+        if len(groups) == 1:
+            return groups[0]
+        position = self._position
+        merged = [rule for group in groups for rule in group]
+        merged.sort(key=lambda rule: position[id(rule)])
+        return merged
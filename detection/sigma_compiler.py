@@ -0,0 +1,381 @@
+# detection/sigma_compiler.py
+"""
+Compile Sigma rules into Python closures.
+
+Supported:
+  - named search identifiers (maps = AND of fields, lists of maps = OR,
+    lists of strings = keyword search over the raw line)
+  - conditions with and / or / not, parentheses, `1 of x*`, `all of x*`,
+    `1 of them`, `all of them`
+  - field modifiers: contains, startswith, endswith, re, cidr, all
+  - aggregation: `<condition> | count() by <field> <op> <n>`, windowed by
+    `timeframe` (or the legacy `frequency.time_window`)
+
+Plain values compare exactly, as before. Modifier and keyword matches are
+case-insensitive, as in Sigma. Value lists for a string modifier are folded
+into one regex, and lists with the same values (in any order) across rules
+share the compiled object through a bounded LRU, so alternations of rules
+edited away on hot reload are eventually released.
+"""
+import fnmatch
+import ipaddress
+import re
+from functools import lru_cache
+
+from detection.windows import parse_duration
+
+_TOKEN = re.compile(r"\(|\)|[^\s()]+")
+_AGGREGATION = re.compile(
+    r"^\s*count\(\s*\)\s*(?:by\s+(?P<field>[\w.\-]+)\s*)?(?P<op>>=|<=|==|!=|=|>|<)\s*(?P<value>\d+)\s*$"
+)
+_OPS = {
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    "=": lambda a, b: a == b,
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+_STRING_MODIFIERS = ("contains", "startswith", "endswith")
+_KNOWN_MODIFIERS = set(_STRING_MODIFIERS) | {"re", "cidr", "all"}
+_RESERVED_KEYS = {"condition", "timeframe"}
+
+# Distinct (mode, value set) automata kept for sharing; live rules hold their own references
+_AUTOMATA_CACHE_SIZE = 4096
+
+
+class SigmaCompileError(ValueError):
+    pass
+
+
+def _norm(value):
+    """Event fields are strings; compare rule scalars in string form."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return value
+
+
+def _field_text(event, field):
+    value = event.get(field)
+    if value is None:
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def shared_automaton(mode, values):
+    """One case-insensitive regex matching any of `values` for a string modifier."""
+    return _automaton(mode, tuple(sorted({str(v) for v in values})))
+
+
+@lru_cache(maxsize=_AUTOMATA_CACHE_SIZE)
+def _automaton(mode, values):
+    alternation = "|".join(re.escape(v) for v in sorted(values, key=len, reverse=True))
+    pattern = {
+        "contains": f"(?:{alternation})",
+        "startswith": f"^(?:{alternation})",
+        "endswith": f"(?:{alternation})\\Z",
+    }[mode]
+    return re.compile(pattern, re.IGNORECASE | re.DOTALL)
+
+
+@lru_cache(maxsize=65536)
+def _parse_ip(text):
+    try:
+        return ipaddress.ip_address(text)
+    except ValueError:
+        return None
+
+
+def _compile_field(spec, values):
+    """Return (predicate, equality_values_or_None) for one `field|mods: values` entry."""
+    field, *modifiers = str(spec).split("|")
+    unknown = set(modifiers) - _KNOWN_MODIFIERS
+    if unknown:
+        raise SigmaCompileError(f"Unsupported modifier(s) {sorted(unknown)} on '{field}'")
+    match_all = "all" in modifiers
+    modifiers = [m for m in modifiers if m != "all"]
+    if len(modifiers) > 1:
+        raise SigmaCompileError(f"Chained modifiers {modifiers} on '{field}' are not supported")
+    mode = modifiers[0] if modifiers else None
+    values = values if isinstance(values, list) else [values]
+
+    if not mode:
+        if any(v is None for v in values):
+            if len(values) > 1:
+                raise SigmaCompileError(f"Mixed null/value list on '{field}'")
+            return (lambda event: event.get(field) is None), None
+        wanted = frozenset(_norm(v) for v in values)
+        if match_all and len(wanted) > 1:
+            return (lambda event: False), None
+        if len(wanted) == 1:
+            (only,) = wanted
+            return (lambda event: _field_text(event, field) == only), wanted
+        return (lambda event: _field_text(event, field) in wanted), wanted
+
+    if mode in _STRING_MODIFIERS:
+        if match_all and len(values) > 1:
+            regexes = [shared_automaton(mode, [v]) for v in values]
+
+            def check_all(event):
+                text = _field_text(event, field)
+                return text is not None and all(r.search(text) for r in regexes)
+            return check_all, None
+        regex = shared_automaton(mode, values)
+        search = regex.search
+
+        def check_any(event):
+            text = _field_text(event, field)
+            return text is not None and search(text) is not None
+        return check_any, None
+
+    if mode == "re":
+        regexes = [re.compile(str(v)) for v in values]
+        combine = all if match_all else any
+
+        def check_re(event):
+            text = _field_text(event, field)
+            return text is not None and combine(r.search(text) for r in regexes)
+        return check_re, None
+
+    networks = [ipaddress.ip_network(str(v), strict=False) for v in values]
+
+    def check_cidr(event):
+        text = _field_text(event, field)
+        ip = _parse_ip(text) if text is not None else None
+        return ip is not None and any(ip.version == n.version and ip in n for n in networks)
+    return check_cidr, None
+
+
+def _compile_map(mapping):
+    """AND of field predicates. Returns (predicate, {field: values} equality constraints)."""
+    checks = []
+    constraints = {}
+    for spec, values in mapping.items():
+        check, equality = _compile_field(spec, values)
+        checks.append(check)
+        if equality is not None:
+            constraints[str(spec).split("|")[0]] = equality
+    if len(checks) == 1:
+        return checks[0], constraints
+
+    def check(event):
+        for c in checks:
+            if not c(event):
+                return False
+        return True
+    return check, constraints
+
+
+def _compile_search(name, definition):
+    """Compile one search identifier. Returns (predicate, constraints)."""
+    if isinstance(definition, dict):
+        return _compile_map(definition)
+    if isinstance(definition, list) and definition and all(isinstance(d, dict) for d in definition):
+        parts = [_compile_map(d) for d in definition]
+        checks = [p[0] for p in parts]
+        return (lambda event: any(c(event) for c in checks)), _or_constraints([p[1] for p in parts])
+    if isinstance(definition, (list, str, int)) and definition != []:
+        keywords = definition if isinstance(definition, list) else [definition]
+        search = shared_automaton("contains", keywords).search
+
+        def check_keywords(event):
+            raw = event.get("raw")
+            return raw is not None and search(raw) is not None
+        return check_keywords, {}
+    raise SigmaCompileError(f"Unsupported definition for search '{name}'")
+
+
+def _and_constraints(parts):
+    merged = {}
+    for constraints in parts:
+        for field, values in constraints.items():
+            merged[field] = merged[field] & values if field in merged else values
+    return merged
+
+
+def _or_constraints(parts):
+    if not parts:
+        return {}
+    common = set(parts[0])
+    for constraints in parts[1:]:
+        common &= set(constraints)
+    merged = {}
+    for field in common:
+        values = frozenset()
+        for constraints in parts:
+            values |= constraints[field]
+        merged[field] = values
+    return merged
+
+
+class _ConditionParser:
+    """Recursive-descent parser producing (predicate, constraints) pairs."""
+
+    def __init__(self, text, searches):
+        self.tokens = _TOKEN.findall(text)
+        self.pos = 0
+        self.searches = searches
+
+    def peek(self):
+        return self.tokens[self.pos].lower() if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise SigmaCompileError(f"Unexpected token '{self.tokens[self.pos]}' in condition")
+        return node
+
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.peek() == "or":
+            self.take()
+            parts.append(self.parse_and())
+        if len(parts) == 1:
+            return parts[0]
+        checks = [p[0] for p in parts]
+        return (lambda event: any(c(event) for c in checks)), _or_constraints([p[1] for p in parts])
+
+    def parse_and(self):
+        parts = [self.parse_not()]
+        while self.peek() == "and":
+            self.take()
+            parts.append(self.parse_not())
+        if len(parts) == 1:
+            return parts[0]
+        checks = [p[0] for p in parts]
+        return (lambda event: all(c(event) for c in checks)), _and_constraints([p[1] for p in parts])
+
+    def parse_not(self):
+        if self.peek() == "not":
+            self.take()
+            inner = self.parse_not()[0]
+            return (lambda event: not inner(event)), {}
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.peek()
+        if token is None:
+            raise SigmaCompileError("Unexpected end of condition")
+        if token == "(":
+            self.take()
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise SigmaCompileError("Missing ')' in condition")
+            self.take()
+            return node
+        if token in ("1", "any", "all") and self.pos + 1 < len(self.tokens) \
+                and self.tokens[self.pos + 1].lower() == "of":
+            self.take()
+            self.take()
+            if self.peek() is None:
+                raise SigmaCompileError("Missing target after 'of'")
+            target = self.take()
+            names = list(self.searches) if target.lower() == "them" else fnmatch.filter(self.searches, target)
+            if not names:
+                raise SigmaCompileError(f"'{target}' matches no search identifier")
+            parts = [self.searches[n] for n in names]
+            checks = [p[0] for p in parts]
+            if token == "all":
+                return (lambda event: all(c(event) for c in checks)), _and_constraints([p[1] for p in parts])
+            return (lambda event: any(c(event) for c in checks)), _or_constraints([p[1] for p in parts])
+        name = self.take()
+        if name not in self.searches:
+            raise SigmaCompileError(f"Unknown search identifier '{name}'")
+        return self.searches[name]
+
+
+class Aggregation:
+    """`count() by <group_by> <op> <threshold>` over a sliding window."""
+
+    __slots__ = ("group_by", "op", "threshold", "window", "_compare")
+
+    def __init__(self, group_by, op, threshold, window):
+        self.group_by = group_by
+        self.op = op
+        self.threshold = threshold
+        self.window = window
+        self._compare = _OPS[op]
+
+    def triggered(self, count):
+        return self._compare(count, self.threshold)
+
+
+class CompiledRule:
+    """A Sigma rule with its condition compiled to a closure."""
+
+    __slots__ = ("rule", "id", "title", "level", "description", "source",
+                 "match", "aggregation", "constraints")
+
+    def __init__(self, rule, match, aggregation, constraints, source=None):
+        self.rule = rule
+        self.id = rule.get("id")
+        self.title = rule.get("title")
+        self.level = rule.get("level", "medium")
+        self.description = rule.get("description", "")
+        self.source = source
+        self.match = match
+        self.aggregation = aggregation
+        self.constraints = constraints
+
+    def get(self, key, default=None):
+        return self.rule.get(key, default)
+
+    def __getitem__(self, key):
+        return self.rule[key]
+
+
+def _split_condition(condition):
+    if isinstance(condition, list):
+        if len(condition) == 1:
+            return _split_condition(condition[0])
+        if any("|" in str(c) for c in condition):
+            raise SigmaCompileError("Aggregations are not supported in condition lists")
+        return " or ".join(f"({c})" for c in condition), None
+    text = str(condition)
+    if "|" in text:
+        head, tail = text.split("|", 1)
+        return head.strip(), tail.strip()
+    return text.strip(), None
+
+
+def compile_rule(rule, source=None):
+    """Compile a parsed Sigma rule dict. Raises SigmaCompileError if unsupported."""
+    if not isinstance(rule, dict):
+        raise SigmaCompileError("Rule is not a mapping")
+    detection = rule.get("detection")
+    if not isinstance(detection, dict):
+        raise SigmaCompileError("Rule has no detection section")
+
+    searches = {
+        name: _compile_search(name, definition)
+        for name, definition in detection.items() if name not in _RESERVED_KEYS
+    }
+    if not searches:
+        raise SigmaCompileError("Rule defines no search identifiers")
+
+    condition, aggregation_text = _split_condition(detection.get("condition", " or ".join(searches)))
+    match, constraints = _ConditionParser(condition, searches).parse()
+
+    freq = rule.get("frequency") or {}
+    timeframe = detection.get("timeframe") or rule.get("timeframe") or freq.get("time_window")
+    aggregation = None
+    if aggregation_text:
+        agg = _AGGREGATION.match(aggregation_text)
+        if not agg:
+            raise SigmaCompileError(f"Unsupported aggregation '{aggregation_text}'")
+        aggregation = Aggregation(agg.group("field"), agg.group("op"), int(agg.group("value")),
+                                  parse_duration(timeframe, default=60))
+    elif freq:
+        # Legacy frequency block: count() by ip >= threshold
+        aggregation = Aggregation("ip", ">=", int(freq.get("threshold", 3)),
+                                  parse_duration(timeframe, default=60))
+
+    return CompiledRule(rule, match, aggregation, constraints, source)
@@ -2,22 +2,49 @@
 import os
 import yaml
 import logging
+import threading
+import time
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 
-from automation.shuffle_client import trigger_shuffle_playbook
-from automation.containment import block_ip
+from collections import deque
+from collectors.dir_watcher import DirectoryWatcher, file_signature, scan_directory
+from automation.responder import Responder
 from ai_learning.rule_updater import RuleUpdater
+from detection.rule_index import RuleIndex
+from detection.sigma_compiler import CompiledRule, SigmaCompileError, compile_rule
+from detection.windows import WindowCounter
+from monitoring.metrics import counter
+from storage.event_store import record_alert
 
 logger = logging.getLogger(__name__)
 
+RULE_EVALUATIONS = counter("sigma_rule_evaluations_total", "Sigma rule conditions evaluated (after index pruning)")
+RULE_MATCHES = counter("sigma_rule_matches_total", "Alerts raised per Sigma rule", ("rule_id",))
+
+RULE_SUFFIXES = (".yml", ".yaml")
+
 class SigmaEngine:
-    def __init__(self, rules_dir="detection/rules/sigma/"):
+    def __init__(self, rules_dir="detection/rules/sigma/", response_enabled=True, use_index=True,
+                 max_window_keys=100000, responder=None, max_alerts=10000, record_alerts="live"):
         self.rules_dir = Path(rules_dir)
         self.rules = []
-        self.alerts = []
-        self.event_history = []  # In-memory buffer for frequency-based detection
-        self.rule_updater = RuleUpdater()
+        self.rule_index = None
+        self.use_index = use_index  # False evaluates every rule per event (benchmark baseline)
+        self.alerts = deque(maxlen=max_alerts)  # Most recent alerts only
+        self.windows = {}  # rule id -> WindowCounter for frequency-based detection
+        self.max_window_keys = max_window_keys  # Cap on tracked group keys per rule
+        self.response_enabled = response_enabled  # False for replays: alert without blocking/SOAR
+        self.record_alerts = record_alerts  # live | replay (stored, tagged, not streamed) | off
+        self._lock = threading.Lock()  # Guards windows/alerts across detect workers
+        self.responder = None
+        if response_enabled:
+            # Correlates alerts into incidents so side effects fire once per incident
+            self.responder = responder or Responder(rule_updater=RuleUpdater())
+        self._files = {}  # path -> (stat signature, CompiledRule) for incremental reloads
+        self._failed = {}  # path -> stat signature of a version that did not compile
+        self._reload_lock = threading.Lock()  # Serializes reloads; evaluation never waits on it
+        self.watcher = None
         self.load_rules()
 
     def load_rules(self):
@@ -26,99 +53,192 @@ class SigmaEngine:
             logger.error(f"[SIGMA] Rules directory not found: {self.rules_dir}")
             return
 
-        loaded_count = 0
-        for file_path in self.rules_dir.glob("*.yml"):
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    rule = yaml.safe_load(f)
-                    self.rules.append(rule)
-                    logger.info(f"[SIGMA] Loaded rule: {rule.get('title')} (ID: {rule.get('id')})")
-                    loaded_count += 1
-            except Exception as e:
-                logger.error(f"[SIGMA] Failed to load {file_path}: {e}")
+        with self._reload_lock:
+            self._files, self._failed = {}, {}
+            for path, signature in scan_directory(self.rules_dir, RULE_SUFFIXES).items():
+                compiled = self._compile_file(path)
+                if compiled is None:
+                    self._failed[path] = signature
+                    continue
+                self._files[path] = (signature, compiled)
+                logger.info(f"[SIGMA] Loaded rule: {compiled.title} (ID: {compiled.id})")
+
+            logger.info(f"[SIGMA] Total Sigma rules loaded: {len(self._files)}")
+            self.set_rules(self._ordered_rules())
+
+    def _compile_file(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rule = yaml.safe_load(f)
+            return compile_rule(rule, source=path)
+        except SigmaCompileError as e:
+            logger.error(f"[SIGMA] Unsupported rule in {path}: {e}")
+        except Exception as e:
+            logger.error(f"[SIGMA] Failed to load {path}: {e}")
+        return None
+
+    def _ordered_rules(self):
+        return [self._files[path][1] for path in sorted(self._files)]
 
-        logger.info(f"[SIGMA] Total Sigma rules loaded: {loaded_count}")
+    def reload(self, changed=None, removed=()):
+        """
+        Recompile only the given rule files (or, with no arguments, every
+        file whose stat signature differs from the loaded one) and swap the
+        new rule set in. A file that fails to compile keeps its previous
+        version active. Returns (added_or_updated, removed) counts.
+        """
+        with self._reload_lock:
+            if changed is None:
+                current = scan_directory(self.rules_dir, RULE_SUFFIXES)
+                changed = {p for p, sig in current.items()
+                           if self._files.get(p, (None,))[0] != sig and self._failed.get(p) != sig}
+                removed = set(self._files) - set(current)
+
+            updated = 0
+            for path in changed:
+                try:
+                    signature = file_signature(os.stat(path))
+                except FileNotFoundError:
+                    removed = set(removed) | {path}
+                    continue
+                compiled = self._compile_file(path)
+                if compiled is None:
+                    self._failed[path] = signature
+                    continue
+                self._failed.pop(path, None)
+                self._files[path] = (signature, compiled)
+                updated += 1
+                logger.info(f"[SIGMA] Reloaded rule: {compiled.title} (ID: {compiled.id})")
+
+            dropped = 0
+            for path in removed:
+                self._failed.pop(path, None)
+                entry = self._files.pop(path, None)
+                if entry is not None:
+                    dropped += 1
+                    logger.info(f"[SIGMA] Removed rule: {entry[1].title} (ID: {entry[1].id})")
+
+            if updated or dropped:
+                self.set_rules(self._ordered_rules())
+                logger.info(f"[SIGMA] Hot reload: {updated} added/updated, {dropped} removed, "
+                            f"{len(self._files)} active.")
+            return updated, dropped
+
+    def watch_rules(self, mode="auto", debounce=1.0, poll_interval=2.0):
+        """Hot-reload rules as files in the rules directory are added, changed or removed."""
+        if self.watcher is not None:
+            return
+        self.watcher = DirectoryWatcher(
+            self.rules_dir, self.reload, suffixes=RULE_SUFFIXES, mode=mode,
+            debounce=debounce, poll_interval=poll_interval, name="sigma-rule-watcher",
+        )
+        with self._reload_lock:
+            known = {path: signature for path, (signature, _) in self._files.items()}
+        self.watcher.start(known)
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    def close(self):
+        """Stop the rule watcher and flush learned rules."""
+        self.stop_watching()
+        if self.responder is not None:
+            self.responder.close()
+
+    def set_rules(self, rules):
+        """Replace the active rule set (raw dicts or compiled) and rebuild the dispatch index."""
+        compiled = []
+        for rule in rules:
+            if isinstance(rule, CompiledRule):
+                compiled.append(rule)
+                continue
+            try:
+                compiled.append(compile_rule(rule))
+            except SigmaCompileError as e:
+                logger.error(f"[SIGMA] Unsupported rule {rule.get('id')}: {e}")
+        index = RuleIndex(compiled)
+        live_ids = {rule.id for rule in compiled}
+        with self._lock:
+            self.rules = compiled
+            self.rule_index = index
+            for rule_id in [r for r in self.windows if r not in live_ids]:
+                del self.windows[rule_id]
 
     def check_event(self, event):
         """
         Check if the given event matches any Sigma rule.
         Handles both direct matches and frequency-based conditions.
         """
-        # Add event to history for temporal analysis
-        self.event_history.append({
-            "timestamp": datetime.utcnow(),
-            "event_type": event.get("event_type"),
-            "ip": event.get("ip"),
-            "user": event.get("user"),
-            "severity": event.get("severity")
-        })
-
-        # Clean up old events (> 10 minutes)
-        cutoff = datetime.utcnow() - timedelta(minutes=10)
-        self.event_history = [e for e in self.event_history if e["timestamp"] > cutoff]
-
-        for rule in self.rules:
-            try:
-                if self._matches_rule(event, rule):
-                    alert = {
-                        "rule_id": rule["id"],
-                        "rule_title": rule["title"],
-                        "severity": rule["level"],
-                        "match": event,
-                        "timestamp": datetime.utcnow().isoformat() + "Z",
-                        "description": rule["description"]
-                    }
-                    self.alerts.append(alert)
-
-                    ip = event.get("ip", "unknown")
-                    user = event.get("user", "unknown")
-                    rule_title = rule["title"]
-
-                    # Log alert
-                    logger.warning(f"[ALERT] {rule['level'].upper()} - {rule_title} | IP: {ip} | User: {user}")
-
-                    # Auto-contain threat
-                    if rule["level"] in ["high", "critical"]:
-                        block_ip(ip, rule_title)
-
-                    # Trigger SOAR playbook
-                    trigger_shuffle_playbook(
-                        alert_type="sigma_alert",
-                        ip=ip,
-                        details=f"{rule_title}: {event.get('raw', 'No raw log')}"
-                    )
-
-                    # Feed into learning module
-                    self.rule_updater.generate_sigma_rule_from_event(event, name_prefix="learned")
-
-                    return alert
-            except Exception as e:
-                logger.error(f"[SIGMA] Error evaluating rule {rule.get('id')}: {e}")
-        return None
-
-    def _matches_rule(self, event, rule):
+        with self._lock:
+            # Windows are measured in event time; events without a parsed
+            # timestamp fall back to the wall clock.
+            event_time = event.get("ts") or time.time()
+
+            if self.use_index and self.rule_index is not None:
+                candidates = self.rule_index.candidates(event)
+            else:
+                candidates = self.rules
+
+            matched_rule = None
+            evaluated = 0
+            for rule in candidates:
+                # After the first match, only aggregation rules still need the event counted
+                if matched_rule is not None and rule.aggregation is None:
+                    continue
+                evaluated += 1
+                try:
+                    if self._matches_rule(event, rule, event_time) and matched_rule is None:
+                        matched_rule = rule
+                except Exception as e:
+                    logger.error(f"[SIGMA] Error evaluating rule {rule.id}: {e}")
+            RULE_EVALUATIONS.inc(evaluated)
+
+            if matched_rule is None:
+                return None
+
+            rule = matched_rule
+            alert = {
+                "rule_id": rule["id"],
+                "rule_title": rule["title"],
+                "severity": rule["level"],
+                "match": event,
+                "timestamp": datetime.fromtimestamp(event_time, timezone.utc).isoformat().replace("+00:00", "Z"),
+                "description": rule["description"]
+            }
+            self.alerts.append(alert)
+            RULE_MATCHES.labels(rule.id).inc()
+
+        if not self.response_enabled:
+            logger.warning(f"[ALERT] {rule['level'].upper()} - {rule['title']} | IP: {event.get('ip', 'unknown')} "
+                           f"| User: {event.get('user', 'unknown')} (response disabled)")
+        else:
+            # Side effects run outside the lock so slow responders don't serialize workers
+            self.responder.handle(alert, event)
+        record_alert(alert, event, self.record_alerts)
+        return alert
+
+    def _matches_rule(self, event, rule, event_time):
         """
-        Check if the event matches the rule's selection criteria.
-        Supports frequency-based conditions.
+        Evaluate a compiled rule's condition against the event.
+        Aggregations (count() by <field>) are windowed on event time.
         """
-        selection = rule.get("detection", {}).get("selection", {})
-
-        # Field matching
-        for key, value in selection.items():
-            if event.get(key) != value:
-                return False
-
-        # Frequency-based detection (e.g., count() by ip > 3 in 60s)
-        freq = rule.get("frequency")
-        if freq:
-            window_sec = int(freq.get("time_window", "60s").replace("s", ""))
-            threshold = freq.get("threshold", 3)
-            start_time = datetime.utcnow() - timedelta(seconds=window_sec)
-
-            matching_events = [
-                e for e in self.event_history
-                if e["ip"] == event["ip"] and e["timestamp"] >= start_time
-            ]
-            return len(matching_events) >= threshold
-
-        return True  # Simple field match
\ No newline at end of file
+        if not rule.match(event):
+            return False
+
+        agg = rule.aggregation
+        if agg is None:
+            return True  # Plain condition match
+
+        group = event.get(agg.group_by) if agg.group_by else None
+        count = self._window_for(rule).add(group, event_time)
+        return agg.triggered(count)
+
+    def _window_for(self, rule):
+        """Sliding-window counter for an aggregation rule, sized from its timeframe."""
+        counter = self.windows.get(rule.id)
+        if counter is None or counter.window != rule.aggregation.window:
+            counter = WindowCounter(rule.aggregation.window, max_keys=self.max_window_keys)
+            self.windows[rule.id] = counter
+        return counter
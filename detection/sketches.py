@@ -0,0 +1,153 @@
+# detection/sketches.py
+import numpy as np
+
+_MASK64 = (1 << 64) - 1
+
+
+def hash_keys(keys):
+    """64-bit hashes for a sequence of hashable keys (None -> 0)."""
+    return np.fromiter(((hash(k) & _MASK64) if k is not None else 0 for k in keys),
+                       dtype=np.uint64, count=len(keys))
+
+
+def _mix(h, salt):
+    """splitmix64 finaliser; decorrelates the per-row hash functions."""
+    z = h + np.uint64(salt)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class _TimeBuckets:
+    """Maps timestamps onto a ring of buckets spanning `window` seconds."""
+
+    def __init__(self, window, buckets):
+        self.window = float(window)
+        self.buckets = buckets
+        self.width = self.window / buckets
+        self.head = None  # Absolute index of the newest bucket
+
+    def advance(self, ts, clear):
+        """Move the ring forward to cover `ts`, calling clear(slot) on reused buckets."""
+        newest = int(np.max(ts) // self.width)
+        if self.head is None:
+            self.head = newest
+        elif newest > self.head:
+            for absolute in range(max(self.head + 1, newest - self.buckets + 1), newest + 1):
+                clear(absolute % self.buckets)
+            self.head = newest
+
+    def slots(self, ts):
+        """Ring slot per timestamp and a mask of those still inside the window."""
+        absolute = (np.asarray(ts) // self.width).astype(np.int64)
+        live = absolute > self.head - self.buckets
+        return absolute % self.buckets, live
+
+
+class WindowedCountMin:
+    """
+    Count-min sketch over a sliding time window: a ring of `buckets`
+    sketches, each `depth` x `width` counters. Counts older than `window`
+    seconds fall off as buckets are reused. Memory is fixed regardless of
+    key cardinality; estimates never undercount.
+    """
+
+    def __init__(self, width=2048, depth=4, window=300, buckets=5):
+        self.width = width
+        self.depth = depth
+        self.time = _TimeBuckets(window, buckets)
+        self.table = np.zeros((buckets, depth, width), dtype=np.uint32)
+        self._rows = np.arange(depth)
+
+    def _columns(self, hashes):
+        return np.stack([(_mix(hashes, row + 1) % np.uint64(self.width)).astype(np.int64)
+                         for row in range(self.depth)])  # (depth, n)
+
+    def _clear(self, slot):
+        self.table[slot] = 0
+
+    def add(self, hashes, ts, mask=None):
+        """Count one occurrence per key hash at its timestamp (rows where mask is False are skipped)."""
+        if mask is not None:
+            hashes, ts = hashes[mask], np.asarray(ts)[mask]
+        if len(hashes) == 0:
+            return
+        self.time.advance(ts, self._clear)
+        slots, live = self.time.slots(ts)
+        columns = self._columns(hashes[live])
+        slots = slots[live]
+        for row in range(self.depth):
+            np.add.at(self.table, (slots, row, columns[row]), 1)
+
+    def query(self, hashes):
+        """Windowed count estimate per key hash."""
+        if len(hashes) == 0:
+            return np.zeros(0)
+        columns = self._columns(hashes)
+        counts = self.table[:, self._rows[:, None], columns].sum(axis=0)  # (depth, n)
+        return counts.min(axis=0).astype(float)
+
+
+class WindowedHyperLogLog:
+    """
+    Distinct-value counts per key in fixed memory: `slots` HyperLogLog
+    sketches of `registers` registers, keys hashed onto a slot in each of
+    `depth` rows (the smallest estimate wins, as in count-min), over a
+    ring of time buckets so old values expire.
+    """
+
+    def __init__(self, slots=4096, registers=64, depth=2, window=300, buckets=5):
+        if registers & (registers - 1):
+            raise ValueError("registers must be a power of two")
+        self.slots = slots
+        self.registers = registers
+        self.depth = depth
+        self.register_bits = registers.bit_length() - 1
+        self.time = _TimeBuckets(window, buckets)
+        self.table = np.zeros((buckets, depth, slots, registers), dtype=np.uint8)
+        self._alpha = 0.7213 / (1 + 1.079 / registers)
+
+    def _clear(self, slot):
+        self.table[slot] = 0
+
+    def _slot_columns(self, key_hashes):
+        return np.stack([(_mix(key_hashes, 101 + row) % np.uint64(self.slots)).astype(np.int64)
+                         for row in range(self.depth)])
+
+    def add(self, key_hashes, value_hashes, ts, mask=None):
+        if mask is not None:
+            key_hashes, value_hashes, ts = key_hashes[mask], value_hashes[mask], np.asarray(ts)[mask]
+        if len(key_hashes) == 0:
+            return
+        self.time.advance(ts, self._clear)
+        buckets, live = self.time.slots(ts)
+        key_hashes, value_hashes, buckets = key_hashes[live], value_hashes[live], buckets[live]
+
+        mixed = _mix(value_hashes, 7)
+        register = (mixed & np.uint64(self.registers - 1)).astype(np.int64)
+        rest = mixed >> np.uint64(self.register_bits)
+        # Rank = position of the lowest set bit in the remaining bits (1-based)
+        lowest = rest & (~rest + np.uint64(1))
+        with np.errstate(divide="ignore"):
+            rank = np.log2(lowest.astype(float)) + 1
+        rank = np.where(rest == 0, 64 - self.register_bits + 1, rank).astype(np.uint8)
+        columns = self._slot_columns(key_hashes)
+        for row in range(self.depth):
+            np.maximum.at(self.table, (buckets, row, columns[row], register), rank)
+
+    def query(self, key_hashes):
+        """Estimated distinct values per key over the window."""
+        if len(key_hashes) == 0:
+            return np.zeros(0)
+        columns = self._slot_columns(key_hashes)
+        estimates = []
+        m = self.registers
+        for row in range(self.depth):
+            regs = self.table[:, row, columns[row]].max(axis=0).astype(float)  # (n, registers)
+            raw = self._alpha * m * m / np.power(2.0, -regs).sum(axis=1)
+            zeros = (regs == 0).sum(axis=1)
+            # Linear counting for small cardinalities
+            small = (raw <= 2.5 * m) & (zeros > 0)
+            linear = m * np.log(m / np.maximum(zeros, 1))
+            estimates.append(np.where(small, linear, raw))
+        return np.min(estimates, axis=0)
@@ -0,0 +1,151 @@
+# detection/streaming.py
+import numpy as np
+
+
+class HalfSpaceTrees:
+    """
+    Streaming anomaly detector (Tan, Ting & Liu, 2011) over fixed-range features.
+
+    Each tree splits a randomly perturbed copy of the feature space in half
+    along random dimensions. Mass profiles are counted over a window of
+    `window` events; the last complete window is the reference used for
+    scoring, so the model tracks drift with O(depth * trees) work per event.
+    Trees are stored as flat arrays and whole batches are routed with NumPy.
+    Scores are larger for more anomalous rows.
+    """
+
+    def __init__(self, mins, maxs, n_trees=25, depth=10, window=256, size_limit=None, seed=None):
+        self.mins = np.asarray(mins, dtype=float)
+        self.maxs = np.asarray(maxs, dtype=float)
+        self.n_features = len(self.mins)
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window = window
+        self.size_limit = window / 20.0 if size_limit is None else size_limit
+        self.rng = np.random.default_rng(seed)
+
+        n_nodes = 2 ** (depth + 1) - 1
+        self.split_feature = np.zeros((n_trees, n_nodes), dtype=np.int32)
+        self.split_value = np.zeros((n_trees, n_nodes), dtype=float)
+        self.reference = np.zeros((n_trees, n_nodes), dtype=np.float64)
+        self.latest = np.zeros((n_trees, n_nodes), dtype=np.float64)
+        self.seen_in_window = 0
+        self.windows_completed = 0
+        self._level_weight = 2.0 ** np.arange(depth + 1)
+        for t in range(n_trees):
+            self._build_tree(t)
+
+    def _build_tree(self, t):
+        # Random workspace around the unit cube so splits are not all at 0.5
+        s = self.rng.random(self.n_features)
+        span = 2 * np.maximum(s, 1 - s)
+        lows, highs = s - span, s + span
+        stack = [(0, 0, lows, highs)]
+        while stack:
+            node, level, lo, hi = stack.pop()
+            if level == self.depth:
+                continue
+            q = int(self.rng.integers(self.n_features))
+            mid = (lo[q] + hi[q]) / 2.0
+            self.split_feature[t, node] = q
+            self.split_value[t, node] = mid
+            left_hi = hi.copy()
+            left_hi[q] = mid
+            right_lo = lo.copy()
+            right_lo[q] = mid
+            stack.append((2 * node + 1, level + 1, lo, left_hi))
+            stack.append((2 * node + 2, level + 1, right_lo, hi))
+
+    def _normalize(self, X):
+        span = np.where(self.maxs > self.mins, self.maxs - self.mins, 1.0)
+        return np.clip((np.asarray(X, dtype=float) - self.mins) / span, 0.0, 1.0)
+
+    def _paths(self, X):
+        """Node index visited at each level, shape (depth + 1, n_rows, n_trees)."""
+        X = self._normalize(X)
+        n = X.shape[0]
+        trees = np.arange(self.n_trees)
+        rows = np.arange(n)[:, None]
+        node = np.zeros((n, self.n_trees), dtype=np.int64)
+        paths = np.empty((self.depth + 1, n, self.n_trees), dtype=np.int64)
+        paths[0] = node
+        for level in range(self.depth):
+            feature = self.split_feature[trees, node]
+            go_right = X[rows, feature] > self.split_value[trees, node]
+            node = 2 * node + 1 + go_right
+            paths[level + 1] = node
+        return paths
+
+    @property
+    def ready(self):
+        return self.windows_completed > 0
+
+    def score(self, X, paths=None):
+        """Anomaly scores for a batch (negated reference mass, summed over trees)."""
+        if paths is None:
+            paths = self._paths(X)
+        trees = np.arange(self.n_trees)
+        mass = self.reference[trees, paths]  # (levels, rows, trees)
+        # Stop at the first node whose reference mass is below size_limit
+        below = mass < self.size_limit
+        below[-1] = True
+        stop = below.argmax(axis=0)  # (rows, trees)
+        stopped_mass = np.take_along_axis(mass, stop[None], axis=0)[0]
+        return -(stopped_mass * self._level_weight[stop]).sum(axis=1)
+
+    def learn(self, X, paths=None):
+        """Count a batch into the latest window, rotating windows when full."""
+        if paths is None:
+            paths = self._paths(X)
+        n = paths.shape[1]
+        n_nodes = self.latest.shape[1]
+        tree_offset = np.arange(self.n_trees) * n_nodes
+        offset = 0
+        while offset < n:
+            take = min(n - offset, self.window - self.seen_in_window)
+            chunk = paths[:, offset:offset + take] + tree_offset
+            self.latest += np.bincount(chunk.ravel(), minlength=self.latest.size).reshape(self.latest.shape)
+            self.seen_in_window += take
+            offset += take
+            if self.seen_in_window >= self.window:
+                self.reference, self.latest = self.latest, self.reference
+                self.latest.fill(0)
+                self.seen_in_window = 0
+                self.windows_completed += 1
+
+    def score_learn(self, X):
+        """Score a batch against the reference window, then learn from it."""
+        paths = self._paths(X)
+        scores = self.score(None, paths)
+        self.learn(None, paths)
+        return scores
+
+
+class Reservoir:
+    """Uniform fixed-size sample of a stream of feature rows (Algorithm R)."""
+
+    def __init__(self, capacity, n_features, seed=None):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, n_features), dtype=float)
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, X):
+        X = np.asarray(X, dtype=float)
+        n = len(X)
+        fill = max(0, min(n, self.capacity - self.seen))
+        self.data[self.seen:self.seen + fill] = X[:fill]
+        if fill < n:
+            # Row i of the batch replaces a random slot with probability capacity / (index + 1);
+            # on repeated slots the later row wins, as it would one row at a time
+            index = self.seen + np.arange(fill, n)
+            slots = self.rng.integers(0, index + 1)
+            keep = slots < self.capacity
+            self.data[slots[keep]] = X[fill:][keep]
+        self.seen += n
+
+    def sample(self):
+        return self.data[:min(self.seen, self.capacity)].copy()
+
+    def __len__(self):
+        return min(self.seen, self.capacity)
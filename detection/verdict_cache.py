@@ -0,0 +1,287 @@
+# detection/verdict_cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_BYTES = 64 * 1024  # Head and tail bytes hashed for the prefilter
+HASH_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    content_hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    partial_hash TEXT NOT NULL,
+    ruleset TEXT NOT NULL,
+    matches_json TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_verdicts_partial ON verdicts (size, partial_hash);
+CREATE INDEX IF NOT EXISTS idx_verdicts_last_used ON verdicts (last_used);
+CREATE TABLE IF NOT EXISTS rulesets (
+    ruleset TEXT PRIMARY KEY,
+    namespaces_json TEXT NOT NULL
+);
+"""
+
+_UPSERT = """
+INSERT INTO verdicts (content_hash, size, partial_hash, ruleset, matches_json, last_used)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(content_hash) DO UPDATE SET
+    ruleset = excluded.ruleset,
+    matches_json = excluded.matches_json,
+    last_used = MAX(verdicts.last_used, excluded.last_used)
+"""
+
+
+def ruleset_fingerprint(namespaces):
+    """Fingerprint of a whole rule set from its {namespace: source fingerprint} map."""
+    canonical = json.dumps(namespaces, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def partial_hash(f, size):
+    """Hash of the first and last PARTIAL_BYTES of an open binary file."""
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    f.seek(0)
+    digest.update(f.read(PARTIAL_BYTES))
+    if size > 2 * PARTIAL_BYTES:
+        f.seek(size - PARTIAL_BYTES)
+        digest.update(f.read(PARTIAL_BYTES))
+    elif size > PARTIAL_BYTES:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def content_hash(f):
+    """SHA-256 of an open binary file, streamed."""
+    digest = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileIdentity:
+    """What the cache knows about one file's content: size, prefilter hash and (if computed) SHA-256."""
+
+    __slots__ = ("size", "partial", "digest", "data")
+
+    def __init__(self, size, partial, digest=None, data=None):
+        self.size = size
+        self.partial = partial
+        self.digest = digest
+        self.data = data  # File bytes when they had to be read anyway
+
+
+class VerdictCache:
+    """
+    YARA verdicts keyed by file content, persisted in SQLite.
+
+    Files are identified cheaply first: a path whose (inode, size, mtime)
+    is unchanged reuses its last content hash, and a (size, head/tail hash)
+    pair that no stored verdict has means the content is new, so the file
+    is read once and hashed and scanned from memory. Each verdict records
+    the rule set it was produced with; the rule set's per-namespace
+    fingerprints let a rule update invalidate only the namespaces that
+    changed. Writes and LRU touches are batched by a background flusher,
+    and the least recently used verdicts are evicted past `max_entries`.
+    """
+
+    def __init__(self, path="detection/yara_verdicts.db", max_entries=200000, flush_interval=2.0,
+                 path_memo_size=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.path_memo_size = path_memo_size
+        self._paths = OrderedDict()  # path -> (signature, FileIdentity without data)
+        self._pending = {}  # content_hash -> row awaiting flush
+        self._touched = {}  # content_hash -> last_used awaiting flush
+        self._rulesets = {}  # ruleset fingerprint -> {namespace: fingerprint}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.stats = {"hits": 0, "partial_hits": 0, "misses": 0, "evicted": 0}
+        self.running = False
+        self.thread = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def register_ruleset(self, namespaces):
+        """Record a rule set's namespace fingerprints; returns its fingerprint."""
+        fingerprint = ruleset_fingerprint(namespaces)
+        with self._lock:
+            if fingerprint in self._rulesets:
+                return fingerprint
+            self._rulesets[fingerprint] = dict(namespaces)
+        with self._db_lock:
+            with self._db:
+                self._db.execute("INSERT OR IGNORE INTO rulesets (ruleset, namespaces_json) VALUES (?, ?)",
+                                 (fingerprint, json.dumps(namespaces, sort_keys=True)))
+        return fingerprint
+
+    def _ruleset(self, fingerprint):
+        with self._lock:
+            namespaces = self._rulesets.get(fingerprint)
+        if namespaces is None:
+            with self._db_lock:
+                row = self._db.execute("SELECT namespaces_json FROM rulesets WHERE ruleset = ?",
+                                       (fingerprint,)).fetchone()
+            namespaces = json.loads(row[0]) if row else {}
+            with self._lock:
+                self._rulesets[fingerprint] = namespaces
+        return namespaces
+
+    def _known_partial(self, size, partial):
+        with self._lock:
+            if any(row[1] == size and row[2] == partial for row in self._pending.values()):
+                return True
+        with self._db_lock:
+            return self._db.execute("SELECT 1 FROM verdicts WHERE size = ? AND partial_hash = ? LIMIT 1",
+                                    (size, partial)).fetchone() is not None
+
+    def identify(self, path, st, max_read=None):
+        """
+        Content identity of `path` (stat result `st`). Unseen content is
+        read into memory (up to `max_read` bytes) so it is hashed and
+        scanned from a single read.
+        """
+        signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            memo = self._paths.get(path)
+            if memo is not None and memo[0] == signature:
+                self._paths.move_to_end(path)
+                return memo[1]
+
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            partial = partial_hash(f, size)
+            if self._known_partial(size, partial) or (max_read and size > max_read):
+                identity = FileIdentity(size, partial, content_hash(f))
+            else:
+                f.seek(0)
+                data = f.read()
+                identity = FileIdentity(len(data), partial, hashlib.sha256(data).hexdigest(), data)
+        self.remember(path, signature, identity)
+        return identity
+
+    def remember(self, path, signature, identity):
+        with self._lock:
+            self._paths[path] = (signature, FileIdentity(identity.size, identity.partial, identity.digest))
+            self._paths.move_to_end(path)
+            while len(self._paths) > self.path_memo_size:
+                self._paths.popitem(last=False)
+
+    def forget(self, path):
+        with self._lock:
+            self._paths.pop(path, None)
+
+    def get(self, digest, namespaces):
+        """
+        Cached matches for content `digest` under the current rule set
+        `namespaces` ({namespace: fingerprint}). Returns (matches, stale):
+        matches still valid, and the namespaces that must be rescanned
+        (all of them for unseen content).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._pending.get(digest)
+        if row is None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT content_hash, size, partial_hash, ruleset, matches_json, last_used "
+                    "FROM verdicts WHERE content_hash = ?", (digest,)).fetchone()
+        if row is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return [], set(namespaces)
+
+        matches = json.loads(row[4])
+        current = ruleset_fingerprint(namespaces)
+        if row[3] == current:
+            stale = set()
+        else:
+            previous = self._ruleset(row[3])
+            stale = {ns for ns, fp in namespaces.items() if previous.get(ns) != fp}
+            matches = [m for m in matches if m.get("namespace") in namespaces and m.get("namespace") not in stale]
+        with self._lock:
+            self._touched[digest] = now
+            self.stats["hits" if not stale else "partial_hits"] += 1
+        return matches, stale
+
+    def put(self, identity, matches, namespaces):
+        """Store the complete verdict for `identity` under the current rule set."""
+        row = (identity.digest, identity.size, identity.partial, ruleset_fingerprint(namespaces),
+               json.dumps(matches, default=str), time.time())
+        with self._lock:
+            self._pending[identity.digest] = row
+            self._touched.pop(identity.digest, None)
+
+    def __len__(self):
+        with self._db_lock:
+            stored = self._db.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        with self._lock:
+            return stored + len(self._pending)
+
+    def flush(self):
+        """Write pending verdicts and LRU touches in one transaction, then evict past max_entries."""
+        with self._lock:
+            if not self._pending and not self._touched:
+                return 0
+            rows, self._pending = list(self._pending.values()), {}
+            touched, self._touched = [(ts, digest) for digest, ts in self._touched.items()], {}
+        try:
+            with self._db_lock:
+                with self._db:
+                    self._db.executemany(_UPSERT, rows)
+                    self._db.executemany("UPDATE verdicts SET last_used = MAX(last_used, ?) WHERE content_hash = ?",
+                                         touched)
+                    if rows:
+                        self._evict()
+        except sqlite3.Error as e:
+            with self._lock:
+                for row in rows:
+                    self._pending.setdefault(row[0], row)
+            logger.error(f"[YARA] Failed to flush verdict cache to {self.path}: {e}")
+            return 0
+        return len(rows)
+
+    def _evict(self):
+        excess = self._db.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0] - self.max_entries
+        if excess <= 0:
+            return
+        # Evict a little extra so the next few flushes don't each pay for a delete
+        excess += self.max_entries // 20
+        self._db.execute("DELETE FROM verdicts WHERE content_hash IN "
+                         "(SELECT content_hash FROM verdicts ORDER BY last_used LIMIT ?)", (excess,))
+        self.stats["evicted"] += excess
+        logger.debug("[YARA] Evicted %d least recently used verdict(s)", excess)
+
+    def _run(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="yara-verdict-flush", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval + 1)
+            self.thread = None
+        self.flush()
+        with self._db_lock:
+            self._db.close()
@@ -0,0 +1,81 @@
+# detection/windows.py
+import re
+from collections import OrderedDict
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+_UNIT_SECONDS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value, default=60):
+    """Parse Sigma-style durations ('60s', '5m', '1h', 30) into seconds."""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _DURATION.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid duration: {value!r}")
+    return float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+
+class WindowCounter:
+    """
+    Sliding-window event counts per group key.
+
+    Each key owns a ring of `buckets` counters spanning `window` seconds;
+    inserting advances the ring and expires old buckets in amortized O(1).
+    At most `max_keys` keys are tracked; the least recently updated key is
+    evicted first.
+    """
+
+    __slots__ = ("window", "buckets", "width", "max_keys", "_keys", "evicted")
+
+    def __init__(self, window, buckets=60, max_keys=100000):
+        self.window = float(window)
+        self.buckets = max(1, min(int(buckets), int(self.window) or 1))
+        self.width = self.window / self.buckets
+        self.max_keys = max_keys
+        self._keys = OrderedDict()  # key -> [ring, head_bucket, total]
+        self.evicted = 0
+
+    def add(self, key, ts, n=1):
+        """Count `n` events for `key` at time `ts`; return the key's windowed total."""
+        bucket = int(ts // self.width)
+        state = self._keys.get(key)
+        if state is None:
+            state = [[0] * self.buckets, bucket, 0]
+            self._keys[key] = state
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._keys.move_to_end(key)
+
+        ring, head, total = state
+        if bucket > head:
+            if bucket - head >= self.buckets:
+                for i in range(self.buckets):
+                    ring[i] = 0
+                total = 0
+            else:
+                for b in range(head + 1, bucket + 1):
+                    slot = b % self.buckets
+                    total -= ring[slot]
+                    ring[slot] = 0
+            head = bucket
+        elif bucket <= head - self.buckets:
+            # Older than the whole window: too late to count
+            return total
+
+        ring[bucket % self.buckets] += n
+        total += n
+        state[1] = head
+        state[2] = total
+        return total
+
+    def count(self, key):
+        state = self._keys.get(key)
+        return state[2] if state else 0
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,183 @@
+# detection/yara_rules.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import yara
+
+from collectors.dir_watcher import scan_directory
+from detection.verdict_cache import ruleset_fingerprint
+
+logger = logging.getLogger(__name__)
+
+RULE_SUFFIXES = (".yar", ".yara")
+
+
+class RuleSet:
+    """A compiled YARA rule set plus the namespace -> source mapping it was built from."""
+
+    def __init__(self, rules, namespaces, sources, fingerprint):
+        self.rules = rules
+        self.namespaces = namespaces  # namespace -> fingerprint of its source
+        self.sources = sources  # namespace -> rule file
+        self.fingerprint = fingerprint  # of every source file, including any that failed to compile
+        self._subsets = {}
+        self._lock = threading.Lock()
+
+    def subset(self, namespaces):
+        """Compiled rules covering just `namespaces` (the full set when that is all of them)."""
+        if set(namespaces) >= set(self.namespaces):
+            return self.rules
+        key = frozenset(namespaces)
+        with self._lock:
+            rules = self._subsets.get(key)
+        if rules is None:
+            rules = yara.compile(filepaths={ns: self.sources[ns] for ns in key})
+            with self._lock:
+                self._subsets[key] = rules
+        return rules
+
+
+class RuleCompiler:
+    """
+    Compile every rule file under `rules_dir` into one rule set, one
+    namespace per file (its path relative to the directory, without the
+    suffix). Compiled sets are saved in `cache_dir` under the fingerprint
+    of all sources, so a restart with unchanged sources loads the binary
+    with yara.load instead of recompiling. Files that fail to compile are
+    logged and left out rather than failing the whole set.
+    """
+
+    def __init__(self, rules_dir, cache_dir="detection/yara_compiled", keep=2):
+        self.rules_dir = os.path.abspath(rules_dir)
+        self.cache_dir = cache_dir
+        self.keep = keep
+
+    def sources(self):
+        """{namespace: (path, fingerprint)} for every rule file under rules_dir."""
+        found = {}
+        for path in sorted(scan_directory(self.rules_dir, RULE_SUFFIXES, recursive=True)):
+            namespace = os.path.splitext(os.path.relpath(path, self.rules_dir))[0].replace(os.sep, "/")
+            try:
+                with open(path, "rb") as f:
+                    found[namespace] = (path, hashlib.sha256(f.read()).hexdigest()[:16])
+            except FileNotFoundError:
+                continue
+        return found
+
+    def _cache_path(self, fingerprint, suffix):
+        return os.path.join(self.cache_dir, f"rules-{fingerprint}{suffix}")
+
+    def _load_cached(self, fingerprint):
+        meta_path = self._cache_path(fingerprint, ".json")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        rules = yara.load(self._cache_path(fingerprint, ".yarc"))
+        os.utime(meta_path)  # Most recently used sets survive pruning
+        return RuleSet(rules, meta["namespaces"], meta["sources"], fingerprint)
+
+    def load(self):
+        """
+        Fast startup path. Returns (rule set, up_to_date): the cached set
+        for the current sources if there is one, otherwise the most recent
+        cached set (stale, to be replaced by a background compile), or
+        (None, False) when nothing is cached. With no rule files at all it
+        is (None, True): there is nothing to scan with.
+        """
+        sources = self.sources()
+        if not sources:
+            logger.warning(f"[YARA] No rule files found under {self.rules_dir}")
+            return None, True
+        fingerprint = ruleset_fingerprint({ns: fp for ns, (_, fp) in sources.items()})
+        try:
+            return self._load_cached(fingerprint), True
+        except (OSError, ValueError, KeyError, yara.Error):
+            pass
+        for candidate in self._cached_fingerprints():
+            try:
+                ruleset = self._load_cached(candidate)
+            except (OSError, ValueError, KeyError, yara.Error):
+                continue
+            logger.info(f"[YARA] Rule sources changed; using cached set {candidate} until recompiled.")
+            return ruleset, False
+        return None, False
+
+    def _cached_fingerprints(self):
+        """Cached set fingerprints, most recently used first."""
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if n.startswith("rules-") and n.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        names.sort(key=lambda n: os.path.getmtime(os.path.join(self.cache_dir, n)), reverse=True)
+        return [n[len("rules-"):-len(".json")] for n in names]
+
+    def _compile_checked(self, sources):
+        """
+        Compile all sources, dropping files that fail. The failing file is
+        usually named in yara's error, so it is removed and the rest retried;
+        otherwise each file is compiled alone to find the bad ones.
+        """
+        remaining = dict(sources)
+        while remaining:
+            try:
+                return yara.compile(filepaths={ns: path for ns, (path, _) in remaining.items()}), remaining
+            except yara.Error as e:
+                culprit = next((ns for ns, (path, _) in remaining.items() if str(e).startswith(f"{path}(")), None)
+                if culprit is None:
+                    break
+                logger.error(f"[YARA] Skipping rule file {remaining.pop(culprit)[0]}: {e}")
+        good = {}
+        for ns, (path, fp) in remaining.items():
+            try:
+                yara.compile(filepaths={ns: path})
+                good[ns] = (path, fp)
+            except yara.Error as e:
+                logger.error(f"[YARA] Skipping rule file {path}: {e}")
+        if not good:
+            return None, good
+        return yara.compile(filepaths={ns: path for ns, (path, _) in good.items()}), good
+
+    def compile(self):
+        """
+        Compile the current sources and cache the result. Returns the
+        RuleSet, or None if there are no rule files; raises yara.Error if
+        none of them compile.
+        """
+        started = time.perf_counter()
+        sources = self.sources()
+        if not sources:
+            logger.warning(f"[YARA] No rule files found under {self.rules_dir}")
+            return None
+        fingerprint = ruleset_fingerprint({ns: fp for ns, (_, fp) in sources.items()})
+        rules, compiled = self._compile_checked(sources)
+        if rules is None:
+            raise yara.Error(f"none of the {len(sources)} rule file(s) under {self.rules_dir} compiled")
+        ruleset = RuleSet(rules, {ns: fp for ns, (_, fp) in compiled.items()},
+                          {ns: path for ns, (path, _) in compiled.items()}, fingerprint)
+        elapsed = time.perf_counter() - started
+        logger.info(f"[YARA] Compiled {len(compiled)} rule file(s) in {elapsed:.2f}s.")
+        try:
+            self._save(ruleset)
+        except OSError as e:
+            logger.error(f"[YARA] Could not cache compiled rules in {self.cache_dir}: {e}")
+        return ruleset
+
+    def _save(self, ruleset):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        binary = self._cache_path(ruleset.fingerprint, ".yarc")
+        meta = self._cache_path(ruleset.fingerprint, ".json")
+        ruleset.rules.save(f"{binary}.tmp")
+        os.replace(f"{binary}.tmp", binary)
+        with open(f"{meta}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"namespaces": ruleset.namespaces, "sources": ruleset.sources,
+                       "compiled_at": time.time()}, f)
+        os.replace(f"{meta}.tmp", meta)  # Written last: a set only counts as cached once complete
+        for stale in self._cached_fingerprints()[self.keep:]:
+            for suffix in (".json", ".yarc"):
+                try:
+                    os.remove(self._cache_path(stale, suffix))
+                except FileNotFoundError:
+                    pass
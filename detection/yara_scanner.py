@@ -1,83 +1,402 @@
 # detection/yara_scanner.py
 import yara
+import bisect
 import logging
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime ,time
+from datetime import datetime
+
+from collectors.dir_watcher import DirectoryWatcher, scan_directory
+from detection.yara_rules import RULE_SUFFIXES, RuleCompiler
+from parser.event import Event
+from storage.event_store import record_alert
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_EXTENSIONS = ('.py', '.js', '.exe', '.dll', '.sh', '.bat', '.ps1')
+
 class YARAScanner:
-    def __init__(self, rules_dir="detection/rules/yara/"):
+    """
+    YARA file scanning. `watch` follows a directory tree with inotify (or
+    stat polling), debounces bursts of writes and scans changed files on a
+    thread pool; yara-python releases the GIL while matching, so scans run
+    in parallel. Files above `max_file_size` are skipped and each match is
+    bounded by `timeout` seconds. Matches go to the Responder as alerts,
+    the same path Sigma alerts take. With a VerdictCache, content already
+    scanned under the same rules is not scanned again. `scan_lines` checks
+    log lines in memory, a buffer of `content_batch_bytes` per match call.
+    Every rule file under `rules_dir` is compiled into its own namespace;
+    the compiled set is cached on disk and swapped atomically when a
+    background recompile finishes.
+    """
+
+    def __init__(self, rules_dir="detection/rules/yara/", responder=None, workers=4,
+                 max_file_size=32 * 1024 * 1024, timeout=30, verdicts=None, content_batch_bytes=256 * 1024,
+                 compiled_cache_dir="detection/yara_compiled", line_timeout=1):
         self.rules_dir = Path(rules_dir)
-        self.compiled_rule = None
+        self.compiler = RuleCompiler(rules_dir, compiled_cache_dir)
+        self.ruleset = None  # Current RuleSet; replaced wholesale, never mutated
+        self.responder = responder
+        self.verdicts = verdicts
+        self.content_batch_bytes = content_batch_bytes
+        self.workers = workers
+        self.max_file_size = max_file_size
+        self.timeout = timeout
+        self.line_timeout = line_timeout  # Whole seconds (yara's unit); line scans run on a parse worker
+        self.stats = {"scanned": 0, "matched": 0, "skipped": 0, "cached": 0, "timeouts": 0, "errors": 0,
+                      "lines_scanned": 0, "lines_matched": 0}
+        self._executor = None
+        self._pending = set()  # Paths queued but not yet started; repeat changes collapse into one scan
+        self._lock = threading.Lock()
+        self._watchers = []
+        self._rules_watcher = None
+        self._compiling = False
+        self._recompile_again = False
         self._load_rules()
 
+    @property
+    def compiled_rule(self):
+        ruleset = self.ruleset
+        return ruleset.rules if ruleset is not None else None
+
+    @property
+    def namespaces(self):
+        ruleset = self.ruleset
+        return ruleset.namespaces if ruleset is not None else {}
+
     def _load_rules(self):
-        """Compile YARA rules at startup"""
-        rule_file = self.rules_dir / "malware.yar"
-        if not rule_file.exists():
-            logger.warning(f"[YARA] Rule file not found: {rule_file}")
+        """Load the cached rule set at startup; compile only if sources changed"""
+        started = time.perf_counter()
+        try:
+            ruleset, up_to_date = self.compiler.load()
+        except Exception as e:
+            logger.error(f"[YARA] Failed to load cached rules: {e}")
+            ruleset, up_to_date = None, False
+        if ruleset is not None:
+            self._install(ruleset)
+            logger.info(f"[YARA] Loaded {len(ruleset.namespaces)} cached rule file(s) from {self.rules_dir} "
+                        f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        if up_to_date:
             return
+        if ruleset is None:
+            # Nothing cached yet: compile now so scanning starts with rules
+            self._compile()
+        else:
+            self.recompile()
+
+    def _install(self, ruleset):
+        if self.verdicts is not None:
+            self.verdicts.register_ruleset(ruleset.namespaces)
+        self.ruleset = ruleset
 
+    def _compile(self):
+        """Install a fresh compile; a failed one keeps the current set, an empty rules dir clears it."""
         try:
-            self.compiled_rule = yara.compile(str(rule_file))
-            logger.info(f"[YARA] Loaded rules from {rule_file}")
+            ruleset = self.compiler.compile()
         except Exception as e:
             logger.error(f"[YARA] Failed to compile rules: {e}")
+            return
+        if ruleset is None:
+            if self.ruleset is not None:
+                self.ruleset = None
+                logger.warning(f"[YARA] All rule files removed from {self.rules_dir}; YARA scanning is off")
+            return
+        self._install(ruleset)
+        logger.info(f"[YARA] Loaded {len(ruleset.namespaces)} rule file(s) from {self.rules_dir}")
+
+    def recompile(self):
+        """Recompile in a background thread; changes arriving meanwhile trigger one more pass."""
+        with self._lock:
+            if self._compiling:
+                self._recompile_again = True
+                return
+            self._compiling = True
+        threading.Thread(target=self._recompile_loop, name="yara-compile", daemon=True).start()
+
+    def _recompile_loop(self):
+        while True:
+            self._compile()
+            with self._lock:
+                if not self._recompile_again:
+                    self._compiling = False
+                    return
+                self._recompile_again = False
+
+    def watch_rules(self, mode="auto", debounce=1.0, poll_interval=2.0):
+        """Recompile in the background whenever a rule file is added, changed or removed."""
+        if self._rules_watcher is not None:
+            return
+        self._rules_watcher = DirectoryWatcher(self.rules_dir, lambda changed, removed: self.recompile(),
+                                               suffixes=RULE_SUFFIXES, mode=mode, debounce=debounce,
+                                               poll_interval=poll_interval, name="yara-rule-watcher",
+                                               recursive=True)
+        self._rules_watcher.start()
+
+    @staticmethod
+    def _format_matches(matches):
+        result = []
+        for m in matches:
+            strings = []
+            for s in m.strings:
+                if isinstance(s, tuple):  # yara-python < 4.3: (offset, identifier, data)
+                    strings.append([s[0], s[1], s[2].decode(errors='replace')])
+                else:
+                    strings.extend([i.offset, s.identifier, i.matched_data.decode(errors='replace')]
+                                   for i in s.instances)
+            result.append({"rule": m.rule, "namespace": m.namespace, "tags": m.tags, "meta": m.meta,
+                           "matched_strings": strings})
+        return result
+
+    @staticmethod
+    def _match_offsets(match):
+        for s in match.strings:
+            if isinstance(s, tuple):  # yara-python < 4.3
+                yield s[0]
+            else:
+                for instance in s.instances:
+                    yield instance.offset
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="yara-scan")
+            return self._executor
 
     def scan_file(self, file_path):
         """Scan a single file and return matches"""
-        if not self.compiled_rule:
+        ruleset = self.ruleset
+        if ruleset is None:
             return None
 
         try:
-            matches = self.compiled_rule.match(file_path)
-            if matches:
-                result = [{
-                    "rule": m.rule,
-                    "tags": m.tags,
-                    "matched_strings": [[s[0], s[1], s[2].decode(errors='replace')] for s in m.strings]
-                } for m in matches]
+            st = os.stat(file_path)
+            if self.max_file_size and st.st_size > self.max_file_size:
+                logger.debug("[YARA] Skipping %s: larger than %d bytes", file_path, self.max_file_size)
+                self._count("skipped")
+                return None
+            if self.verdicts is None:
+                result = self._format_matches(ruleset.rules.match(file_path, timeout=self.timeout))
+                self._count("scanned")
+            else:
+                result = self._scan_cached(ruleset, file_path, st)
+            if result:
+                self._count("matched")
                 logger.warning(f"[YARA] Malicious file detected: {file_path} | Matches: {result}")
                 return result
             return None
+        except yara.TimeoutError:
+            self._count("timeouts")
+            logger.warning(f"[YARA] Scan of {file_path} timed out after {self.timeout}s")
+            return None
+        except FileNotFoundError:
+            return None  # Removed before its scan ran
         except Exception as e:
+            self._count("errors")
             logger.error(f"[YARA] Error scanning {file_path}: {e}")
             return None
 
-    def scan_directory(self, target_dir, extensions=None):
-        """Continuously scan a directory for new/modified files"""
+    def _scan_cached(self, ruleset, file_path, st):
+        """Reuse the verdict for this content, rescanning only namespaces whose rules changed."""
+        namespaces = ruleset.namespaces
+        identity = self.verdicts.identify(file_path, st, max_read=self.max_file_size)
+        cached, stale = self.verdicts.get(identity.digest, namespaces)
+        if not stale:
+            self._count("cached")
+            return cached
+        rules = ruleset.subset(stale)
+        if identity.data is not None:
+            matches = rules.match(data=identity.data, timeout=self.timeout)
+        else:
+            matches = rules.match(file_path, timeout=self.timeout)
+        self._count("scanned")
+        result = cached + self._format_matches(matches)
+        self.verdicts.put(identity, result, namespaces)
+        return result
+
+    def watch(self, target_dir, extensions=None, recursive=True, mode="auto", debounce=1.0,
+              scan_existing=True, callback=None):
+        """
+        Scan new and modified files under `target_dir` as they are written.
+        Each matching file is passed to `callback(path, matches)` (by
+        default, raised as alerts). Returns the DirectoryWatcher.
+        """
         target = Path(target_dir)
         if not target.exists():
             logger.error(f"[YARA] Target directory does not exist: {target}")
-            return
+            return None
 
-        # Track file modification times
-        file_mtime = {}
+        suffixes = tuple(ext.lower() for ext in (extensions or DEFAULT_EXTENSIONS))
+        callback = callback or self._raise_alerts
+        watcher = DirectoryWatcher(target, lambda changed, removed: self._on_change(changed, removed, callback),
+                                   suffixes=suffixes, mode=mode, debounce=debounce,
+                                   name="yara-watcher", recursive=recursive)
+        existing = scan_directory(watcher.directory, suffixes, recursive)
+        watcher.start(known=existing)
+        self._watchers.append(watcher)
+        if scan_existing:
+            self._submit(existing, callback)
+        logger.info(f"[YARA] Watching {target} ({len(existing)} existing file(s), {self.workers} scan worker(s))")
+        return watcher
 
-        logger.info(f"[YARA] Starting auto-scan on directory: {target}")
-        while True:
+    def _on_change(self, changed, removed, callback):
+        if self.verdicts is not None:
+            for path in removed:
+                self.verdicts.forget(path)
+        self._submit(changed, callback)
+
+    def _submit(self, paths, callback):
+        executor = self._pool()
+        with self._lock:
+            fresh = [path for path in paths if path not in self._pending]
+            self._pending.update(fresh)
+        for path in fresh:
+            executor.submit(self._scan_job, path, callback)
+
+    def _scan_job(self, path, callback):
+        with self._lock:
+            self._pending.discard(path)
+        matches = self.scan_file(path)
+        if matches:
             try:
-                for file_path in target.rglob("*"):
-                    if file_path.is_file() and self._is_target_file(file_path, extensions):
-                        mtime = file_path.stat().st_mtime
-                        if file_path not in file_mtime or file_mtime[file_path] < mtime:
-                            logger.info(f"[YARA] Scanning new/modified file: {file_path}")
-                            match = self.scan_file(str(file_path))
-                            if match:
-                                yield str(file_path), match
-                            file_mtime[file_path] = mtime
-                # Wait before next scan
-                time.sleep(3)
-            except KeyboardInterrupt:
-                logger.info("[YARA] File monitoring stopped.")
-                break
+                callback(path, matches)
             except Exception as e:
-                logger.error(f"[YARA] Error during directory scan: {e}")
-                time.sleep(5)
+                logger.error(f"[YARA] Match handler failed for {path}: {e}")
+
+    def scan_lines(self, lines):
+        """
+        Scan log lines in memory. Lines are joined into buffers of about
+        `content_batch_bytes`, each matched once in the calling thread, so
+        line scans never queue behind file scans on the worker pool; each
+        match is capped at `line_timeout` seconds rather than the per-file
+        timeout. String hits are mapped back to their lines by offset, and
+        those lines are matched alone to confirm, so a rule only fires on a
+        line that satisfies it by itself; rules that match without any
+        string hit cannot be tied to a line and are not reported. Returns
+        {line index: matches}.
+        """
+        ruleset = self.ruleset
+        if ruleset is None or not lines:
+            return {}
+        rules = ruleset.rules
+        encoded = [line.encode("utf-8", errors="replace") for line in lines]
+        buffers = []
+        first, size = 0, 0
+        for index, data in enumerate(encoded):
+            size += len(data) + 1
+            if size >= self.content_batch_bytes:
+                buffers.append((first, index + 1))
+                first, size = index + 1, 0
+        if first < len(encoded):
+            buffers.append((first, len(encoded)))
+
+        hits = {}
+        for start, end in buffers:
+            hits.update(self._scan_buffer(rules, encoded, start, end))
+        self._count("lines_scanned", len(encoded))
+        if hits:
+            self._count("lines_matched", len(hits))
+        return hits
+
+    def _scan_buffer(self, rules, encoded, start, end):
+        starts = []
+        offset = 0
+        for data in encoded[start:end]:
+            starts.append(offset)
+            offset += len(data) + 1
+        try:
+            matches = rules.match(data=b"\n".join(encoded[start:end]), timeout=self.line_timeout)
+            candidates = {start + bisect.bisect_right(starts, hit) - 1
+                          for m in matches for hit in self._match_offsets(m)}
+            hits = {}
+            for index in sorted(candidates):
+                line_matches = rules.match(data=encoded[index], timeout=self.line_timeout)
+                if line_matches:
+                    hits[index] = self._format_matches(line_matches)
+            return hits
+        except yara.TimeoutError:
+            self._count("timeouts")
+            logger.warning(f"[YARA] Scan of {end - start} log line(s) timed out after {self.line_timeout}s")
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"[YARA] Error scanning log lines: {e}")
+        return {}
+
+    def raise_line_alerts(self, line, event, matches):
+        """Alert on a log line whose content matched; `event` is its parsed form, if any."""
+        if event is None:
+            event = Event(line, "log_content", "info")
+        event["yara_matches"] = matches
+        self._deliver(event, matches, group_by=None)
+
+    def _raise_alerts(self, path, matches):
+        """One alert per matched rule, grouped into incidents per file."""
+        event = {
+            "ts": time.time(),
+            "event_type": "malicious_file",
+            "file": path,
+            "raw": f"{path}: {', '.join(m['rule'] for m in matches)}",
+            "yara_matches": matches,
+        }
+        self._deliver(event, matches, group_by=("file",))
+
+    def _deliver(self, event, matches, group_by):
+        for m in matches:
+            meta = m["meta"]
+            alert = {
+                "rule_id": f"yara:{m['rule']}",
+                "rule_title": f"YARA {m['rule']}",
+                "severity": str(meta.get("severity") or meta.get("level") or "high").lower(),
+                "match": event,
+                "timestamp": datetime.utcnow().isoformat() + "Z",
+                "description": meta.get("description", ""),
+                "source": "yara",
+            }
+            if group_by:
+                alert["group_by"] = group_by
+            if self.responder is not None:
+                self.responder.handle(alert, event)
+            else:
+                logger.warning(f"[ALERT] {alert['severity'].upper()} - {alert['rule_title']} "
+                               f"| {event.get('file') or event.get('raw')}")
+            record_alert(alert, event)
+
+    def scan_directory(self, target_dir, extensions=None):
+        """Yield (path, matches) for new/modified files until interrupted"""
+        results = queue.Queue()
+        watcher = self.watch(target_dir, extensions, callback=lambda path, matches: results.put((path, matches)))
+        if watcher is None:
+            return
+        try:
+            while True:
+                try:
+                    yield results.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+        except KeyboardInterrupt:
+            logger.info("[YARA] File monitoring stopped.")
+        finally:
+            watcher.stop()
+            self._watchers.remove(watcher)
 
-    def _is_target_file(self, file_path, extensions=None):
-        """Check if file should be scanned based on extension"""
-        exts = extensions or ['.py', '.js', '.exe', '.dll', '.sh', '.bat', '.ps1']
-        return file_path.suffix.lower() in exts
\ No newline at end of file
+    def close(self):
+        """Stop watchers, drop queued scans and wait for running ones."""
+        if self._rules_watcher is not None:
+            self._rules_watcher.stop()
+            self._rules_watcher = None
+        for watcher in self._watchers:
+            watcher.stop()
+        self._watchers = []
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if self.verdicts is not None:
+            self.verdicts.close()
@@ -0,0 +1,303 @@
+# monitoring/metrics.py
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans a single regex match up to a slow webhook
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """
+    Per-thread cells of `size` numbers. Each thread only ever writes its
+    own cell, so updates need no lock; readers sum across cells. Cells of
+    threads that exit are kept so their counts are not lost.
+    """
+
+    __slots__ = ("_local", "_cells", "_lock", "_size")
+
+    def __init__(self, size):
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+        self._size = size
+
+    def _cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = [0] * self._size
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+    def totals(self):
+        with self._lock:
+            cells = list(self._cells)
+        return [sum(column) for column in zip(*cells)] if cells else [0] * self._size
+
+
+class CounterChild(_Sharded):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        self._cell()[0] += amount
+
+    @property
+    def value(self):
+        return self.totals()[0]
+
+
+class HistogramChild(_Sharded):
+    """Fixed buckets; the cell holds one count per bucket (plus +Inf) and the running sum."""
+
+    __slots__ = ("bounds",)
+
+    def __init__(self, bounds):
+        super().__init__(len(bounds) + 2)
+        self.bounds = bounds
+
+    def observe(self, value):
+        cell = self._cell()
+        cell[bisect.bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self):
+        """(cumulative bucket counts including +Inf, count, sum)."""
+        totals = self.totals()
+        cumulative, running = [], 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, totals[-1]
+
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child for one combination of label values (created on first use, then cached)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _render_children(self, lines):
+        raise NotImplementedError
+
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        self._render_children(lines)
+
+
+class Counter(_Metric):
+    """Monotonic count; unlabelled counters take inc() directly."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_children(self, lines):
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}")
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def _render_children(self, lines):
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}")
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _render_children(self, lines):
+        edges = [_number(b) for b in self.bounds] + ["+Inf"]
+        for values, child in list(self._children.items()):
+            cumulative, count, total = child.snapshot()
+            for edge, bucket_count in zip(edges, cumulative):
+                bucket_labels = _labels(self.labelnames, values, 'le="%s"' % edge)
+                lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(float(total))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {count}")
+
+
+class Registry:
+    """
+    Named metrics plus collector callbacks. Collectors run only at scrape
+    time and turn state the components already keep (queue sizes, stats
+    dicts, per-pattern hit counts) into samples, so those cost nothing on
+    the hot path. A collector returns [(name, kind, help, [(labels, value)])].
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labelnames, **options):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **options)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels")
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._get(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def register(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def unregister(self, collector):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            metric.render(lines)
+        families = {}
+        for collector in collectors:
+            try:
+                for name, kind, help_text, samples in collector():
+                    families.setdefault(name, (kind, help_text, []))[2].extend(samples)
+            except Exception as e:
+                logger.error(f"[METRICS] Collector {getattr(collector, '__qualname__', collector)} failed: {e}")
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, labelnames=()):
+    return REGISTRY.counter(name, help_text, labelnames)
+
+
+def gauge(name, help_text, labelnames=()):
+    return REGISTRY.gauge(name, help_text, labelnames)
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.histogram(name, help_text, labelnames, buckets)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("[METRICS] %s - %s", self.address_string(), format % args)
+
+
+def start_http_server(host="127.0.0.1", port=9108, registry=REGISTRY):
+    """Serve `registry` at http://host:port/metrics from a daemon thread. Returns the server."""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"[METRICS] Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,147 @@
+# parser/event.py
+import calendar
+import time
+from datetime import datetime, timezone
+
+# Values that repeat across many events (IPs, users, hosts) share one string object
+_INTERN_LIMIT = 100000
+_interned = {}
+
+# Midnight epoch per 'YYYY-MM-DD' prefix, so timestamps only parse the date once
+_DAY_CACHE_LIMIT = 4096
+_day_cache = {}
+
+
+def intern_value(value):
+    """Return a shared instance of a repeated field value (bounded table)."""
+    if value is None:
+        return None
+    shared = _interned.get(value)
+    if shared is None:
+        if len(_interned) >= _INTERN_LIMIT:
+            _interned.clear()
+        _interned[value] = value
+        shared = value
+    return shared
+
+
+def _utc_tail(tail):
+    """True if what follows the seconds is nothing, 'Z', or a fraction optionally ending in 'Z'."""
+    if tail.endswith("Z"):
+        tail = tail[:-1]
+    return not tail or (tail[0] in ".," and tail[1:].isdigit())
+
+
+def parse_timestamp(value):
+    """
+    Convert a log timestamp ('YYYY-MM-DD HH:MM:SS[...]', space or 'T'
+    separated) into integer epoch seconds. Naive timestamps are read as UTC.
+    Returns None if the value cannot be parsed.
+
+    Naive or 'Z' timestamps, with at most a fraction after the seconds,
+    take a fast path with the date parsed once per day; anything carrying
+    a UTC offset goes through fromisoformat so the offset is applied.
+    """
+    if not value:
+        return None
+    try:
+        if len(value) >= 19 and value[4] == "-" and value[7] == "-" and value[10] in " T" \
+                and value[13] == ":" and value[16] == ":" and _utc_tail(value[19:]):
+            hours, minutes, seconds = int(value[11:13]), int(value[14:16]), int(value[17:19])
+            if hours > 23 or minutes > 59 or seconds > 59:
+                return None
+            date_part = value[:10]
+            day = _day_cache.get(date_part)
+            if day is None:
+                day = calendar.timegm(datetime(int(value[0:4]), int(value[5:7]), int(value[8:10])).timetuple())
+                if len(_day_cache) >= _DAY_CACHE_LIMIT:
+                    _day_cache.clear()
+                _day_cache[date_part] = day
+            return day + hours * 3600 + minutes * 60 + seconds
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+class Event:
+    """
+    Compact parsed log record.
+
+    Common fields live in slots, with timestamps parsed once into epoch
+    seconds (`ts`) and repeated values interned; pattern-specific groups go
+    in `extra`. Supports the dict-style access (`get`, `[]`, `in`, `keys`)
+    that detection rules use. Fields set to None count as absent.
+    """
+
+    __slots__ = ("timestamp", "ts", "host", "user", "ip", "event_type",
+                 "severity", "raw", "parsed_at", "extra")
+
+    FIELDS = frozenset(__slots__) - {"extra"}
+
+    def __init__(self, raw, event_type, severity, fields=None):
+        self.raw = raw
+        self.event_type = event_type
+        self.severity = severity
+        self.parsed_at = time.time()
+        self.timestamp = None
+        self.ts = None
+        self.host = None
+        self.user = None
+        self.ip = None
+        self.extra = None
+        if fields:
+            self.timestamp = fields.pop("timestamp", None)
+            self.ts = parse_timestamp(self.timestamp)
+            self.host = intern_value(fields.pop("host", None))
+            self.user = intern_value(fields.pop("user", None))
+            self.ip = intern_value(fields.pop("ip", None))
+            fields = {k: v for k, v in fields.items() if v is not None}
+            if fields:
+                self.extra = fields
+
+    def get(self, key, default=None):
+        if key in Event.FIELDS:
+            value = getattr(self, key)
+        elif self.extra is not None:
+            value = self.extra.get(key)
+        else:
+            value = None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in Event.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def keys(self):
+        keys = [k for k in Event.__slots__ if k != "extra" and getattr(self, k) is not None]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def items(self):
+        return [(k, self.get(k)) for k in self.keys()]
+
+    def to_dict(self):
+        """Plain-dict view for JSON export; `parsed_at` rendered as ISO-8601."""
+        data = dict(self.items())
+        data["parsed_at"] = datetime.fromtimestamp(self.parsed_at, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        return data
+
+    def __repr__(self):
+        return repr(dict(self.items()))
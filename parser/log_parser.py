@@ -2,16 +2,26 @@
 import re
 import logging
 import yaml
-from datetime import datetime
+import threading
 from config import load_config
+from parser.event import Event
+from parser.prefilter import KeywordPrefilter, choose_anchors, extract_literals
+from monitoring.metrics import counter
 
 logger = logging.getLogger(__name__)
 
+UNMATCHED = counter("parser_unmatched_lines_total", "Lines no pattern matched (kept as event_type unknown)")
+
 class LogParser:
-    def __init__(self, patterns_file="parser/patterns.yaml"):
+    def __init__(self, patterns_file="parser/patterns.yaml", prefilter=True, reorder_interval=10000):
         self.config = load_config()
         self.patterns = []
+        self.use_prefilter = prefilter
+        self.reorder_interval = reorder_interval
+        self._parse_count = 0
+        self._reorder_lock = threading.Lock()
         self.load_patterns(patterns_file)
+        self._build_dispatch()
         logger.info(f"[PARSER] Successfully loaded {len(self.patterns)} log parsing patterns.")
 
     def load_patterns(self, filepath):
@@ -25,38 +35,93 @@ class LogParser:
                         "name": item["name"],
                         "regex": compiled_regex,
                         "event_type": item["event_type"],
-                        "severity": item["severity"]
+                        "severity": item["severity"],
+                        "fallback": bool(item.get("fallback", False)),
+                        "anchor": item.get("anchor"),
+                        "literals": extract_literals(item["regex"], compiled_regex.flags),
+                        "index": len(self.patterns),
+                        "hits": 0
                     })
         except Exception as e:
             logger.error(f"[PARSER] Failed to load patterns from {filepath}: {e}")
             raise
 
+    def _build_dispatch(self):
+        """
+        Split patterns into anchored (selected by the keyword prefilter),
+        unanchored (always tried) and fallback (tried last, in file order).
+        """
+        self._by_anchor = {}
+        self._unanchored = []
+        self._fallbacks = []
+        chosen = choose_anchors([p["literals"] for p in self.patterns])
+        for pattern, anchor in zip(self.patterns, chosen):
+            pattern["anchor"] = pattern["anchor"] or anchor
+        for pattern in self.patterns:
+            if pattern["fallback"]:
+                self._fallbacks.append(pattern)
+            elif pattern["anchor"]:
+                self._by_anchor.setdefault(pattern["anchor"], []).append(pattern)
+            else:
+                self._unanchored.append(pattern)
+        self._prefilter = KeywordPrefilter(self._by_anchor)
+        self._rank = {p["index"]: p["index"] for p in self.patterns}
+        self._candidate_cache = {}
+        anchored = sum(len(v) for v in self._by_anchor.values())
+        logger.info(f"[PARSER] Prefilter: {anchored} anchored, {len(self._unanchored)} unanchored, "
+                    f"{len(self._fallbacks)} fallback pattern(s).")
+
+    def collect_metrics(self):
+        """Per-pattern hit counts, from the counters kept for reordering."""
+        return [("parser_pattern_hits_total", "counter", "Lines parsed by each pattern",
+                 [({"pattern": p["name"]}, p["hits"]) for p in self.patterns])]
+
+    def _reorder(self):
+        """Rank specific patterns by hit count so the hottest are tried first."""
+        specific = [p for p in self.patterns if not p["fallback"]]
+        specific.sort(key=lambda p: (-p["hits"], p["index"]))
+        self._rank = {p["index"]: rank for rank, p in enumerate(specific)}
+        self._candidate_cache = {}
+
+    def _candidates(self, raw_log):
+        """Return the patterns worth trying for a line, best-ranked first."""
+        if not self.use_prefilter:
+            return self.patterns
+        found = frozenset(self._prefilter.search(raw_log))
+        candidates = self._candidate_cache.get(found)
+        if candidates is None:
+            candidates = list(self._unanchored)
+            for anchor in found:
+                candidates.extend(self._by_anchor[anchor])
+            rank = self._rank
+            candidates.sort(key=lambda p: rank[p["index"]])
+            candidates.extend(self._fallbacks)
+            if len(self._candidate_cache) >= 4096:
+                self._candidate_cache = {}
+            self._candidate_cache[found] = candidates
+        return candidates
+
     def parse(self, raw_log: str):
         """
-        Parse a raw log line into structured JSON format.
-        Returns a dictionary with extracted fields or None if no match.
+        Parse a raw log line into a structured Event.
+        Returns an Event with extracted fields or None for blank lines.
         """
         if not raw_log or not raw_log.strip():
             return None
 
         raw_log = raw_log.strip()
-        for pattern in self.patterns:
+        self._parse_count += 1
+        if self.reorder_interval and self._parse_count % self.reorder_interval == 0:
+            with self._reorder_lock:
+                self._reorder()
+
+        for pattern in self._candidates(raw_log):
             match = pattern["regex"].match(raw_log)
             if match:
-                event = match.groupdict()
-                event.update({
-                    "event_type": pattern["event_type"],
-                    "severity": pattern["severity"],
-                    "raw": raw_log,
-                    "parsed_at": datetime.utcnow().isoformat() + "Z"
-                })
-                return event
+                pattern["hits"] += 1
+                return Event(raw_log, pattern["event_type"], pattern["severity"], match.groupdict())
 
         # Fallback for unmatched logs
-        logger.warning(f"[PARSER] No pattern matched for log entry: {raw_log}")
-        return {
-            "raw": raw_log,
-            "event_type": "unknown",
-            "severity": "unknown",
-            "parsed_at": datetime.utcnow().isoformat() + "Z"
-        }
\ No newline at end of file
+        UNMATCHED.inc()
+        logger.warning("[PARSER] No pattern matched for log entry: %s", raw_log)
+        return Event(raw_log, "unknown", "unknown")
\ No newline at end of file
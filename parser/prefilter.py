@@ -0,0 +1,118 @@
+# parser/prefilter.py
+import re
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+MIN_ANCHOR_LENGTH = 3
+
+
+def _literal_runs(subpattern, runs):
+    """Collect runs of consecutive required literal characters."""
+    current = []
+    for op, av in subpattern:
+        if op is sre_constants.LITERAL:
+            current.append(chr(av))
+            continue
+        if current:
+            runs.append("".join(current))
+            current = []
+        if op is sre_constants.SUBPATTERN:
+            _literal_runs(av[-1], runs)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            _literal_runs(av[2], runs)
+    if current:
+        runs.append("".join(current))
+
+
+def extract_literals(regex, flags=0):
+    """
+    Return the literal substrings (at least MIN_ANCHOR_LENGTH long) that
+    every match of `regex` must contain. Case-insensitive patterns yield
+    none, since a literal scan could not select them reliably.
+    """
+    if flags & re.IGNORECASE:
+        return []
+    try:
+        parsed = sre_parse.parse(regex, flags)
+    except re.error:
+        return []
+    if parsed.state.flags & re.IGNORECASE:
+        return []
+    runs = []
+    _literal_runs(parsed, runs)
+    return [r for r in runs if len(r) >= MIN_ANCHOR_LENGTH]
+
+
+def choose_anchors(literal_sets):
+    """
+    Pick one anchor per pattern from its required literals, preferring the
+    literal shared by the fewest other patterns (most selective), then the
+    longest. Patterns with no literals get None.
+    """
+    shared = {}
+    for literals in literal_sets:
+        for lit in set(literals):
+            shared[lit] = shared.get(lit, 0) + 1
+    return [
+        min(literals, key=lambda lit: (shared[lit], -len(lit))) if literals else None
+        for literals in literal_sets
+    ]
+
+
+def _trie_regex(keywords):
+    """Build a regex matching any keyword, factored on shared prefixes."""
+    trie = {}
+    for word in keywords:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return _trie_node_regex(trie)
+
+
+def _trie_node_regex(node):
+    terminal = "" in node
+    branches = [re.escape(ch) + _trie_node_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if terminal:
+        # Greedy optional: prefer the longest keyword at this position
+        return f"(?:{body})?"
+    return body
+
+
+class KeywordPrefilter:
+    """
+    Multi-keyword matcher that reports which keywords occur in a line.
+
+    All keywords are folded into a single prefix-trie regex, so the C regex
+    engine walks them like an Aho-Corasick automaton in one pass instead of
+    trying every keyword at every position. A lookahead keeps overlapping
+    occurrences, and keywords contained in a longer hit are implied by it.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted(set(keywords), key=len, reverse=True)
+        self._implied = {
+            k: frozenset(j for j in self.keywords if j in k) for k in self.keywords
+        }
+        if self.keywords:
+            self._regex = re.compile(f"(?=({_trie_regex(self.keywords)}))")
+        else:
+            self._regex = None
+
+    def search(self, text):
+        """Return the set of keywords present in `text`."""
+        if self._regex is None:
+            return set()
+        found = set()
+        implied = self._implied
+        for hit in set(self._regex.findall(text)):
+            found |= implied[hit]
+        return found
@@ -1,89 +1,156 @@
 # run.py
 import sys
 import io
+import argparse
 import logging
 from config import load_config
+from config.logging_setup import setup_logging
 from collectors.log_collector import LogCollector
-from automation.containment import block_ip
-from parser.log_parser import LogParser
-from detection.sigma_engine import SigmaEngine
-from detection.yara_scanner import YARAScanner
-from detection.shuffle_client import trigger_shuffle_playbook
-
-# Force UTF-8 encoding for Windows compatibility
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
-
-# Load config
-config = load_config()
-
-# Setup logging
-logging.basicConfig(
-    level=config['logging']['level'],
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(config['logging']['file'], encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-
-logger = logging.getLogger(__name__)
-
-
-def main():
-    logger.info("[START] Starting Free AI-Powered Security MVP")
-
-    # Initialize components
-    parser = LogParser()
-    sigma_engine = SigmaEngine()
-
-    # Start log collector and pass parser/engine to it
-    collector = LogCollector(parser, sigma_engine)
-    collector.start()
-
-    try:
-        while True:
-            input("Press Enter to exit...\n")
-    except KeyboardInterrupt:
-        logger.info("[STOP] Shutting down MVP...")
-        collector.stop()
-
-
-if __name__ == "__main__":
-    main()# run.py
-import sys
-import io
-import logging
-from config import load_config
-from collectors.log_collector import LogCollector
+from collectors.backfill import Backfill
 from parser.log_parser import LogParser
 from detection.sigma_engine import SigmaEngine
 from detection.anomaly_detector import AnomalyDetector
+from detection.features import BehaviourFeatures
 from detection.yara_scanner import YARAScanner
+from detection.verdict_cache import VerdictCache
+from automation.incident_journal import IncidentJournal
+from automation.responder import IncidentCorrelator, Responder
+from ai_learning.model_trainer import ModelTrainer
+from ai_learning.rule_updater import RuleUpdater
+from monitoring.metrics import start_http_server
+from storage.alert_bus import get_alert_bus
 
 # UTF-8 fix for Windows
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 config = load_config()
-logging.basicConfig(
-    level=config['logging']['level'],
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(config['logging']['file'], encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+setup_logging(config['logging'])
 logger = logging.getLogger(__name__)
 
-def main():
+def build_responder():
+    incident_config = config['automation'].get('incidents', {})
+    correlator = IncidentCorrelator(
+        group_by=incident_config.get('group_by', ['ip']),
+        suppression_window=incident_config.get('suppression_window', 300),
+        update_interval=incident_config.get('update_interval', 60),
+        max_incidents=incident_config.get('max_incidents', 10000),
+        rule_group_by=incident_config.get('rule_group_by'),
+    )
+    journal = None
+    if incident_config.get('journal_file'):
+        journal = IncidentJournal(incident_config['journal_file'],
+                                  compact_after=incident_config.get('compact_after', 10000))
+    return Responder(correlator, rule_updater=RuleUpdater(), journal=journal)
+
+def build_anomaly_detector(load_model=True, record_alerts="live"):
+    anomaly_config = config.get('anomaly', {})
+    sketch_config = anomaly_config.get('sketch', {})
+    behaviour = BehaviourFeatures(
+        window=sketch_config.get('window', 300),
+        buckets=sketch_config.get('buckets', 5),
+        width=sketch_config.get('width', 2048),
+        depth=sketch_config.get('depth', 4),
+        hll_slots=sketch_config.get('hll_slots', 4096),
+        hll_registers=sketch_config.get('hll_registers', 64),
+    )
+    detector = AnomalyDetector(
+        contamination=anomaly_config.get('contamination', 0.1),
+        n_neighbors=anomaly_config.get('n_neighbors', 5),
+        mode=anomaly_config.get('mode', 'streaming'),
+        window=anomaly_config.get('window', 256),
+        n_trees=anomaly_config.get('n_trees', 25),
+        depth=anomaly_config.get('depth', 10),
+        reservoir_size=anomaly_config.get('reservoir_size', 5000),
+        retrain_every=anomaly_config.get('retrain_every', 2000),
+        behaviour=behaviour,
+        record_alerts=record_alerts,
+    )
+    if load_model:
+        detector.load_model(anomaly_config.get('model_file'))
+    return detector
+
+def build_yara_scanner(responder):
+    yara_config = config['detection'].get('yara', {})
+    cache_config = yara_config.get('verdict_cache', {})
+    verdicts = None
+    if cache_config.get('enabled', True):
+        verdicts = VerdictCache(
+            cache_config.get('path', 'detection/yara_verdicts.db'),
+            max_entries=cache_config.get('max_entries', 200000),
+            flush_interval=cache_config.get('flush_interval', 2.0),
+        )
+        verdicts.start()
+    return YARAScanner(
+        config['detection'].get('yara_rules_dir', 'detection/rules/yara/'),
+        responder=responder,
+        workers=yara_config.get('workers', 4),
+        max_file_size=int(yara_config.get('max_file_size_mb', 32) * 1024 * 1024),
+        timeout=yara_config.get('scan_timeout', 30),
+        verdicts=verdicts,
+        content_batch_bytes=int(yara_config.get('content_batch_kb', 256) * 1024),
+        line_timeout=yara_config.get('line_scan_timeout', 1),
+        compiled_cache_dir=yara_config.get('compiled_cache_dir', 'detection/yara_compiled'),
+    )
+
+def serve_dashboard():
+    """Serve the dashboard API in-process so its live stream reads the engines' alert bus directly."""
+    dashboard_config = config.get('dashboard', {}) or {}
+    if not dashboard_config.get('serve', False):
+        return None
+    from dashboard.app import serve
+    host, port = dashboard_config.get('host', '127.0.0.1'), dashboard_config.get('port', 5000)
+    server = serve(get_alert_bus(), host, port)
+    logger.info(f"[START] Dashboard API listening on http://{host}:{port}")
+    return server
+
+def serve_metrics():
+    metrics_config = config.get('metrics', {}) or {}
+    if not metrics_config.get('enabled', True) or not metrics_config.get('port'):
+        return None
+    try:
+        return start_http_server(metrics_config.get('host', '127.0.0.1'), metrics_config['port'])
+    except OSError as e:
+        logger.error(f"[METRICS] Could not listen on port {metrics_config['port']}: {e}")
+        return None
+
+def run_live(args):
     logger.info("[START] Security MVP is starting...")
 
     # Initialize components
     parser = LogParser()
-    sigma_engine = SigmaEngine()
-    anomaly_detector = AnomalyDetector()
-    yara_scanner = YARAScanner()
+    responder = build_responder()  # Shared so Sigma and YARA alerts correlate into one incident stream
+    sigma_engine = SigmaEngine(
+        max_window_keys=config['detection'].get('window_max_keys', 100000),
+        responder=responder,
+    )
+    anomaly_detector = build_anomaly_detector()
+    yara_scanner = build_yara_scanner(responder)
+
+    # Pick up new, edited and removed Sigma and YARA rules without a restart
+    if config['detection'].get('hot_reload', True):
+        sigma_engine.watch_rules(
+            mode=config['collector'].get('tail_mode', 'auto'),
+            debounce=config['detection'].get('reload_debounce', 1.0),
+        )
+        yara_scanner.watch_rules(
+            mode=config['collector'].get('tail_mode', 'auto'),
+            debounce=config['detection'].get('reload_debounce', 1.0),
+        )
+
+    # Scan files dropped into watched directories as they are written
+    yara_config = config['detection'].get('yara', {})
+    for watch_dir in yara_config.get('watch_dirs') or []:
+        yara_scanner.watch(
+            watch_dir,
+            extensions=yara_config.get('extensions'),
+            mode=config['collector'].get('tail_mode', 'auto'),
+            debounce=yara_config.get('debounce', 1.0),
+            scan_existing=yara_config.get('scan_existing', True),
+        )
+
+    dashboard = serve_dashboard()
+    metrics_server = serve_metrics()
 
     # Start collector
     collector = LogCollector(parser, sigma_engine, anomaly_detector, yara_scanner)
@@ -92,8 +159,78 @@ def main():
     try:
         input("Press Enter to exit...\n")
     except KeyboardInterrupt:
-        logger.info("[STOP] Shutting down...")
-        collector.stop()
+        pass
+    logger.info("[STOP] Shutting down...")
+    collector.stop()
+    yara_scanner.close()
+    sigma_engine.close()
+    if dashboard is not None:
+        dashboard.shutdown()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+
+def run_backfill(args):
+    logger.info("[START] Backfilling historical logs...")
+    backfill_config = config.get('backfill', {})
+    record_alerts = args.record_alerts or backfill_config.get('record_alerts', 'replay')
+
+    sigma_engine = SigmaEngine(
+        response_enabled=args.respond,
+        max_window_keys=config['detection'].get('window_max_keys', 100000),
+        responder=build_responder() if args.respond else None,
+        record_alerts=record_alerts,
+    )
+    anomaly_detector = None if args.skip_anomaly else build_anomaly_detector(record_alerts=record_alerts)
+
+    backfill = Backfill(
+        sigma_engine,
+        anomaly_detector,
+        workers=args.workers or backfill_config.get('workers', 0),
+        chunk_size=int((args.chunk_mb or backfill_config.get('chunk_mb', 8)) * 1024 * 1024),
+    )
+    backfill.run(args.files)
+    sigma_engine.close()
+
+def run_train(args):
+    logger.info("[START] Training anomaly model from historical logs...")
+    backfill_config = config.get('backfill', {})
+    model_path = args.output or config.get('anomaly', {}).get('model_file', 'ai_learning/models/anomaly_model.npz')
+
+    ModelTrainer(
+        build_anomaly_detector(load_model=False),
+        workers=args.workers or backfill_config.get('workers', 0),
+        chunk_size=int((args.chunk_mb or backfill_config.get('chunk_mb', 8)) * 1024 * 1024),
+    ).train(args.files, model_path)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Free AI-Powered Security MVP")
+    subcommands = arg_parser.add_subparsers(dest="command")
+
+    subcommands.add_parser("live", help="Tail configured log files (default)")
+
+    backfill = subcommands.add_parser("backfill", help="Replay historical logs (plain or .gz) at full speed")
+    backfill.add_argument("files", nargs="+", help="Log files to ingest; processed oldest first")
+    backfill.add_argument("--workers", type=int, default=0, help="Parser processes (default: CPU count)")
+    backfill.add_argument("--chunk-mb", type=float, default=None, help="Chunk size per parse task in MiB")
+    backfill.add_argument("--respond", action="store_true", help="Run containment/SOAR/learning on alerts")
+    backfill.add_argument("--skip-anomaly", action="store_true", help="Skip the anomaly detector")
+    backfill.add_argument("--record-alerts", choices=("live", "replay", "off"), default=None,
+                          help="Alerts to the live stream and store (live), store only, tagged (replay), "
+                               "or neither (default: backfill.record_alerts)")
+
+    train = subcommands.add_parser("train", help="Fit and save the anomaly model from historical logs")
+    train.add_argument("files", nargs="+", help="Log files (plain or .gz) to train on; processed oldest first")
+    train.add_argument("--output", default=None, help="Model file (default: anomaly.model_file)")
+    train.add_argument("--workers", type=int, default=0, help="Parser processes (default: CPU count)")
+    train.add_argument("--chunk-mb", type=float, default=None, help="Chunk size per parse task in MiB")
+
+    args = arg_parser.parse_args()
+    if args.command == "backfill":
+        run_backfill(args)
+    elif args.command == "train":
+        run_train(args)
+    else:
+        run_live(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,263 @@
+# storage/alert_bus.py
+import logging
+import threading
+import time
+
+from monitoring.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_ORDER = {"informational": 0, "info": 0, "low": 1, "medium": 2, "high": 3, "critical": 4}
+
+# Fields a subscriber may filter on; comma-separated values match any of them
+FILTER_FIELDS = ("source", "rule_id", "severity", "ip", "user", "incident_id")
+
+
+def alert_filter(min_severity=None, **fields):
+    """
+    Predicate over alert records: every given field must equal one of its
+    comma-separated values, and severity must be at least `min_severity`.
+    Returns None when nothing is filtered.
+    """
+    wanted = {}
+    for field, value in fields.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter alerts on {field!r}")
+        if value:
+            wanted[field] = frozenset(v.strip() for v in str(value).split(",") if v.strip())
+    floor = SEVERITY_ORDER.get(str(min_severity).lower()) if min_severity else None
+    if min_severity and floor is None:
+        raise ValueError(f"Unknown severity {min_severity!r}")
+    if not wanted and floor is None:
+        return None
+
+    def matches(record):
+        if floor is not None and SEVERITY_ORDER.get(record.get("severity"), 0) < floor:
+            return False
+        return all(record.get(field) in values for field, values in wanted.items())
+    return matches
+
+
+class Subscription:
+    """One reader's position in the bus; `read` never blocks the publisher."""
+
+    def __init__(self, bus, cursor, predicate=None, max_batch=500):
+        self.bus = bus
+        self.cursor = cursor
+        self.predicate = predicate
+        self.max_batch = max_batch
+        self.missed = 0
+
+    def read(self, timeout=15.0):
+        """
+        Wait up to `timeout` for records past the cursor. Returns
+        (records, missed): matching (seq, record) pairs, and how many were
+        lost since the last read because this reader fell more than the
+        ring size behind (or resumed from a sequence no longer held).
+        """
+        entries, missed = self.bus.read_after(self.cursor, self.max_batch, timeout)
+        if entries:
+            self.cursor = entries[-1][0]
+        self.missed += missed
+        predicate = self.predicate
+        if predicate is not None:
+            entries = [(seq, record) for seq, record in entries if predicate(record)]
+        return entries, missed
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class AlertBus:
+    """
+    In-process publish/subscribe for alerts, sized so that viewers cost
+    the detection path nothing.
+
+    Publishing stores the record in a fixed-size ring under the next
+    sequence number and sets one flag; it never touches subscribers. A
+    notifier thread wakes waiting readers, and each reader copies what it
+    has not seen yet from the ring and applies its own filters. A reader's
+    backlog is therefore bounded by the ring: one that falls more than
+    `ring_size` records behind skips ahead and is told how many it missed.
+    Sequence numbers let a reconnecting client resume where it left off
+    (SSE Last-Event-ID) as long as the ring still holds that point.
+    """
+
+    def __init__(self, ring_size=10000, max_subscribers=500):
+        self.ring_size = ring_size
+        self.max_subscribers = max_subscribers
+        self._ring = [None] * ring_size  # slot -> (seq, record)
+        self.last_seq = 0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._subscribers = set()
+        self.published = 0
+        self.running = False
+        self.thread = None
+
+    def publish(self, record, seq=None):
+        """Append `record`; `seq` overrides the numbering (it must keep increasing). Returns the sequence number."""
+        with self._lock:
+            seq = self.last_seq + 1 if seq is None else seq
+            if seq <= self.last_seq:
+                return None
+            self._ring[seq % self.ring_size] = (seq, record)
+            self.last_seq = seq
+            self.published += 1
+        self._wake.set()
+        return seq
+
+    @property
+    def oldest_seq(self):
+        with self._lock:
+            return max(1, self.last_seq - self.ring_size + 1) if self.last_seq else 0
+
+    def read_after(self, cursor, limit, timeout):
+        """(entries after `cursor`, count missed) — waits up to `timeout` if there are none yet."""
+        if self.last_seq <= cursor:
+            with self._cond:
+                self._cond.wait_for(lambda: self.last_seq > cursor or not self.running, timeout)
+        with self._lock:
+            last = self.last_seq
+            first = max(cursor + 1, last - self.ring_size + 1, 1)
+            end = min(last, first + limit - 1)
+            entries = []
+            for seq in range(first, end + 1):
+                entry = self._ring[seq % self.ring_size]
+                if entry is not None and entry[0] == seq:
+                    entries.append(entry)
+        missed = max(0, first - cursor - 1) if last > cursor else 0
+        return entries, missed
+
+    def subscribe(self, last_seq=None, predicate=None, max_batch=500):
+        """
+        New subscription starting after `last_seq` (resume), or at the
+        current end of the stream. Raises RuntimeError when full.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise RuntimeError(f"alert stream is at its limit of {self.max_subscribers} subscribers")
+            cursor = self.last_seq if last_seq is None else min(last_seq, self.last_seq)
+            subscription = Subscription(self, cursor, predicate, max_batch)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def collect_metrics(self):
+        return [
+            ("alert_stream_published_total", "counter", "Alerts published to the live stream", [({}, self.published)]),
+            ("alert_stream_subscribers", "gauge", "Open live alert stream connections", [({}, self.subscribers)]),
+        ]
+
+    def _notify(self):
+        while self.running:
+            self._wake.wait()
+            self._wake.clear()
+            with self._cond:
+                self._cond.notify_all()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._notify, name="alert-bus-notify", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        self._wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+            self.thread = None
+        with self._cond:
+            self._cond.notify_all()
+
+
+class StoreFeed:
+    """
+    Feeds a bus from the event store's alerts table, for a dashboard
+    running in a different process from the detection engines. Alert row
+    ids are used as sequence numbers, so they stay valid across restarts.
+    """
+
+    def __init__(self, store, bus, poll_interval=0.5, batch=1000):
+        self.store = store
+        self.bus = bus
+        self.poll_interval = poll_interval
+        self.batch = batch
+        self.running = False
+        self.thread = None
+
+    def _backfill(self):
+        rows, _ = self.store.query("alerts", limit=self.bus.ring_size)
+        for row in reversed(rows):
+            self.bus.publish(row, seq=row["id"])
+
+    def poll(self):
+        """Publish alerts stored since the last poll. Returns how many."""
+        published = 0
+        while True:
+            rows, _ = self.store.query("alerts", limit=self.batch, after=self.bus.last_seq)
+            for row in rows:
+                self.bus.publish(row, seq=row["id"])
+            published += len(rows)
+            if len(rows) < self.batch:
+                return published
+
+    def _run(self):
+        while self.running:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"[STREAM] Reading new alerts from the store failed: {e}")
+            time.sleep(self.poll_interval)
+
+    def start(self):
+        if self.running:
+            return
+        self._backfill()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="alert-store-feed", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=self.poll_interval + 1)
+            self.thread = None
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_alert_bus():
+    """Process-wide alert bus the detection engines publish to."""
+    global _bus
+    if _bus is not None:
+        return _bus
+    with _bus_lock:
+        if _bus is None:
+            try:
+                from config import load_config
+                settings = (load_config().get("dashboard", {}) or {}).get("stream", {}) or {}
+            except Exception as e:
+                logger.warning(f"[STREAM] Using defaults; could not read config: {e}")
+                settings = {}
+            bus = AlertBus(
+                ring_size=settings.get("ring_size", 10000),
+                max_subscribers=settings.get("max_subscribers", 500),
+            )
+            bus.start()
+            REGISTRY.register(bus.collect_metrics)
+            _bus = bus
+        return _bus
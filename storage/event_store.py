@@ -0,0 +1,382 @@
+# storage/event_store.py
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from monitoring.metrics import REGISTRY
+from storage.alert_bus import get_alert_bus
+
+logger = logging.getLogger(__name__)
+
+STORE_FILE = "logs/events.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    event_ts REAL,
+    source TEXT NOT NULL,
+    rule_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    ip TEXT,
+    user TEXT,
+    incident_id TEXT,
+    raw TEXT,
+    details_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts (ts);
+CREATE INDEX IF NOT EXISTS idx_alerts_ip ON alerts (ip);
+CREATE INDEX IF NOT EXISTS idx_alerts_rule ON alerts (rule_id);
+CREATE INDEX IF NOT EXISTS idx_alerts_severity ON alerts (severity);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    host TEXT,
+    ip TEXT,
+    user TEXT,
+    event_type TEXT,
+    severity TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_ip ON events (ip);
+
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    action TEXT NOT NULL,
+    target TEXT NOT NULL,
+    reason TEXT,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS idx_blocks_ts ON blocks (ts);
+CREATE INDEX IF NOT EXISTS idx_blocks_target ON blocks (target);
+
+-- Currently active blocks, kept in step with the blocks history
+CREATE TABLE IF NOT EXISTS blocked (
+    target TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    reason TEXT,
+    expires REAL
+);
+"""
+
+_INSERT = {
+    "alerts": "INSERT INTO alerts (ts, event_ts, source, rule_id, title, severity, ip, user, incident_id, raw, "
+              "details_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+    "events": "INSERT INTO events (ts, host, ip, user, event_type, severity, raw) VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "blocks": "INSERT INTO blocks (ts, action, target, reason, expires) VALUES (?, ?, ?, ?, ?)",
+}
+
+# Columns a query may filter on with equality, per table
+FILTERS = {
+    "alerts": ("source", "rule_id", "severity", "ip", "user", "incident_id"),
+    "events": ("host", "ip", "user", "event_type", "severity"),
+    "blocks": ("action", "target"),
+    "blocked": ("target",),
+}
+
+COLUMNS = {
+    "alerts": ("id", "ts", "event_ts", "source", "rule_id", "title", "severity", "ip", "user", "incident_id",
+               "raw", "details_json"),
+    "events": ("id", "ts", "host", "ip", "user", "event_type", "severity", "raw"),
+    "blocks": ("id", "ts", "action", "target", "reason", "expires"),
+    "blocked": ("rowid", "target", "ts", "reason", "expires"),
+}
+
+
+def alert_record(alert, event=None, now=None):
+    """Flatten a Sigma, YARA or anomaly alert into a dict with the alerts-table columns (except id)."""
+    if "anomaly_type" in alert:
+        source, rule_id = "anomaly", f"anomaly:{alert['anomaly_type']}"
+        title, severity = "Behavioral outlier", alert.get("severity", "medium")
+    else:
+        source, rule_id = alert.get("source", "sigma"), alert["rule_id"]
+        title, severity = alert["rule_title"], alert["severity"]
+    if event is None:
+        event = alert.get("match") or alert.get("event") or {}
+    details = {k: v for k, v in alert.items() if k not in ("match", "event")}
+    return {
+        "ts": now or time.time(),
+        "event_ts": event.get("ts"),
+        "source": source,
+        "rule_id": rule_id,
+        "title": title,
+        "severity": severity,
+        "ip": event.get("ip"),
+        "user": event.get("user"),
+        "incident_id": alert.get("incident_id"),
+        "raw": event.get("raw") or event.get("file"),
+        "details_json": json.dumps(details, default=str),
+    }
+
+
+class EventStore:
+    """
+    Alerts, block actions and a sample of parsed events in SQLite (WAL),
+    indexed by time, IP, rule and severity for the dashboard.
+
+    Recording only appends to in-memory buffers; a background thread
+    writes them with one executemany per table per flush, so detection
+    never waits on disk. Buffers are bounded: past `max_pending` rows the
+    oldest unflushed events are dropped first, then alerts. Queries page
+    backwards by row id (keyset pagination), so each page costs the same
+    however large the store grows. Rows older than `retention_days` are
+    pruned periodically.
+    """
+
+    def __init__(self, path=STORE_FILE, flush_interval=1.0, batch_size=1000, max_pending=100000,
+                 event_sample_rate=10, retention_days=30):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.event_sample_rate = max(0, int(event_sample_rate or 0))
+        self.retention = retention_days * 86400 if retention_days else None
+        self._pending = {"alerts": [], "events": [], "blocks": []}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._events_seen = 0
+        self._last_prune = 0.0
+        self.dropped = 0
+        self.running = False
+        self.thread = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def _append(self, table, rows):
+        with self._lock:
+            self._pending[table].extend(rows)
+            pending = sum(len(buffered) for buffered in self._pending.values())
+            overflow = pending - self.max_pending
+            for victim in ("events", "blocks", "alerts"):
+                if overflow <= 0:
+                    break
+                cut = min(overflow, len(self._pending[victim]))
+                del self._pending[victim][:cut]
+                self.dropped += cut
+                overflow -= cut
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def record_alert(self, record):
+        """Buffer an alert_record() dict."""
+        self._append("alerts", [tuple(record[column] for column in COLUMNS["alerts"][1:])])
+
+    def record_events(self, events):
+        """Store every `event_sample_rate`-th parsed event (none when the rate is 0)."""
+        rate = self.event_sample_rate
+        if not rate:
+            return
+        with self._lock:
+            start = (-self._events_seen) % rate
+            self._events_seen += len(events)
+        now = time.time()
+        rows = [(event.get("ts") or event.get("parsed_at") or now, event.get("host"), event.get("ip"), event.get("user"),
+                 event.get("event_type"), event.get("severity"), event.get("raw"))
+                for event in events[start::rate]]
+        if rows:
+            self._append("events", rows)
+
+    def record_block(self, action, target, reason, expires=None, now=None):
+        """Record a BLOCKED / RELEASED / EXPIRED action for an IP or CIDR."""
+        self._append("blocks", [(now or time.time(), action, str(target), reason, expires)])
+
+    def sync_blocked(self, entries):
+        """Replace the active-block table with `entries` [(target, ts, reason, expires)], e.g. at startup."""
+        with self._db_lock:
+            with self._db:
+                self._db.execute("DELETE FROM blocked")
+                self._db.executemany("INSERT OR REPLACE INTO blocked (target, ts, reason, expires) "
+                                     "VALUES (?, ?, ?, ?)", entries)
+
+    def flush(self):
+        """Write all buffered rows, one transaction for every table."""
+        with self._lock:
+            batches, self._pending = self._pending, {"alerts": [], "events": [], "blocks": []}
+        if not any(batches.values()):
+            return 0
+        try:
+            with self._db_lock:
+                with self._db:
+                    for table, rows in batches.items():
+                        if rows:
+                            self._db.executemany(_INSERT[table], rows)
+                    for ts, action, target, reason, expires in batches["blocks"]:
+                        if action == "BLOCKED":
+                            self._db.execute("INSERT OR REPLACE INTO blocked (target, ts, reason, expires) "
+                                             "VALUES (?, ?, ?, ?)", (target, ts, reason, expires))
+                        else:
+                            self._db.execute("DELETE FROM blocked WHERE target = ?", (target,))
+        except sqlite3.Error as e:
+            with self._lock:
+                for table, rows in batches.items():
+                    self._pending[table][:0] = rows
+            logger.error(f"[STORE] Failed to write to {self.path}: {e}")
+            return 0
+        return sum(len(rows) for rows in batches.values())
+
+    def prune(self, now=None):
+        """Delete alerts, events and block history older than the retention period."""
+        if self.retention is None:
+            return 0
+        cutoff = (now or time.time()) - self.retention
+        deleted = 0
+        with self._db_lock:
+            with self._db:
+                for table in ("alerts", "events", "blocks"):
+                    deleted += self._db.execute(f"DELETE FROM {table} WHERE ts < ?", (cutoff,)).rowcount
+        if deleted:
+            logger.info(f"[STORE] Pruned {deleted} row(s) older than the retention period.")
+        return deleted
+
+    def query(self, table, limit=100, cursor=None, since=None, until=None, after=None, **filters):
+        """
+        Newest-first page of `table` rows as dicts, filtered by equality on
+        FILTERS[table] columns and by a [since, until) time range. `cursor`
+        is the id returned with the previous page. Returns (rows, next_cursor).
+        With `after`, returns the oldest rows with a greater id instead
+        (for following the table as it grows).
+        """
+        key = "rowid" if table == "blocked" else "id"
+        columns = COLUMNS[table]
+        where, params = [], []
+        for column, value in filters.items():
+            if column not in FILTERS[table]:
+                raise ValueError(f"Cannot filter {table} on {column!r}")
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            params.append(until)
+        if cursor is not None:
+            where.append(f"{key} < ?")
+            params.append(cursor)
+        if after is not None:
+            where.append(f"{key} > ?")
+            params.append(after)
+        if table == "blocked":
+            where.append("(expires IS NULL OR expires > ?)")
+            params.append(time.time())
+        sql = f"SELECT {', '.join(columns)} FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {key} {'ASC' if after is not None else 'DESC'} LIMIT ?"
+        params.append(limit + 1)
+        with self._db_lock:
+            fetched = self._db.execute(sql, params).fetchall()
+        rows = [dict(zip(columns, row)) for row in fetched[:limit]]
+        next_cursor = rows[-1][key] if len(fetched) > limit else None
+        return rows, next_cursor
+
+    def collect_metrics(self):
+        with self._lock:
+            pending = [({"table": table}, len(rows)) for table, rows in self._pending.items()]
+        return [
+            ("event_store_pending_rows", "gauge", "Rows buffered for the next batched insert", pending),
+            ("event_store_dropped_rows_total", "counter", "Rows dropped while the writer was behind",
+             [({}, self.dropped)]),
+        ]
+
+    def _run(self):
+        while self.running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            now = time.time()
+            if self.retention is not None and now - self._last_prune >= 3600:
+                self._last_prune = now
+                try:
+                    self.prune(now)
+                except sqlite3.Error as e:
+                    logger.error(f"[STORE] Pruning {self.path} failed: {e}")
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="event-store-flush", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        self._wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval + 1)
+            self.thread = None
+        self.flush()
+        if self.dropped:
+            logger.warning(f"[STORE] Dropped {self.dropped} row(s) while the writer was behind.")
+        with self._db_lock:
+            self._db.close()
+
+
+_store = None
+_store_configured = False
+_store_lock = threading.Lock()
+
+
+def get_event_store():
+    """Process-wide event store configured from `storage` in config.yaml, or None if disabled."""
+    global _store, _store_configured
+    if _store_configured:
+        return _store
+    with _store_lock:
+        if not _store_configured:
+            try:
+                from config import load_config
+                settings = load_config().get("storage", {}) or {}
+            except Exception as e:
+                logger.warning(f"[STORE] Using defaults; could not read config: {e}")
+                settings = {}
+            if not settings.get("enabled", True):
+                _store_configured = True
+                return None
+            _store = EventStore(
+                path=settings.get("path", STORE_FILE),
+                flush_interval=settings.get("flush_interval", 1.0),
+                batch_size=settings.get("batch_size", 1000),
+                max_pending=settings.get("max_pending", 100000),
+                event_sample_rate=settings.get("event_sample_rate", 10),
+                retention_days=settings.get("retention_days", 30),
+            )
+            _store.start()
+            REGISTRY.register(_store.collect_metrics)
+            atexit.register(_store.close)
+            _store_configured = True
+        return _store
+
+
+def record_alert(alert, event=None, mode="live"):
+    """
+    Store an alert (if the event store is enabled) and publish it to the
+    live alert stream; never raises into the detection path. mode="replay"
+    (backfills) stores it tagged `"replay": true` without streaming it, and
+    mode="off" records nothing.
+    """
+    if mode == "off":
+        return
+    try:
+        record = alert_record(dict(alert, replay=True) if mode == "replay" else alert, event)
+        store = get_event_store()
+        if store is not None:
+            store.record_alert(record)
+        if mode != "replay":
+            get_alert_bus().publish(record)
+    except Exception as e:
+        logger.error(f"[STORE] Could not record alert: {e}")
@@ -0,0 +1,204 @@
+# tests/test_dispatcher.py
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from automation.dispatcher import Dispatcher  # noqa: E402
+from automation.exporter import build_misp_event  # noqa: E402
+
+
+class StubServer:
+    """Local HTTP endpoint answering each POST with the next scripted status (then `default`)."""
+
+    def __init__(self, statuses=(), default=200):
+        self.statuses = list(statuses)
+        self.default = default
+        self.requests = []  # (monotonic time, status, body)
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with stub.lock:
+                    status = stub.statuses.pop(0) if stub.statuses else stub.default
+                    stub.requests.append((time.monotonic(), status, body))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def delivered(self):
+        with self.lock:
+            return [body for _, status, body in self.requests if status == 200]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def spooled(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+class DispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.spool = os.path.join(self.workdir, "spool.jsonl")
+        self.servers = []
+        self.dispatchers = []
+
+    def tearDown(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.stop(timeout=2)
+        for server in self.servers:
+            server.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def server(self, *args, **kwargs):
+        server = StubServer(*args, **kwargs)
+        self.servers.append(server)
+        return server
+
+    def dispatcher(self, **options):
+        options.setdefault("workers", 2)
+        options.setdefault("backoff_base", 0.05)
+        options.setdefault("backoff_max", 1.0)
+        options.setdefault("spool_replay_interval", 3600)
+        dispatcher = Dispatcher(spool_path=self.spool, **options)
+        self.dispatchers.append(dispatcher)
+        return dispatcher
+
+    def test_retries_with_exponential_backoff(self):
+        server = self.server(statuses=[503, 503])
+        dispatcher = self.dispatcher(max_retries=5, open_after=10)
+        dispatcher.register("shuffle", server.url, timeout=2)
+        dispatcher.start()
+        # Always draw the top of the jitter range so the backoff is deterministic
+        with mock.patch("automation.dispatcher.random.uniform", side_effect=lambda low, high: high):
+            dispatcher.submit("shuffle", {"n": 1})
+            self.assertTrue(wait_for(lambda: server.delivered()))
+        times = [t for t, _, _ in server.requests]
+        self.assertEqual([status for _, status, _ in server.requests], [503, 503, 200])
+        self.assertGreaterEqual(times[1] - times[0], 0.1)  # backoff_base * 2 ** 1
+        self.assertGreaterEqual(times[2] - times[1], 0.2)  # backoff_base * 2 ** 2
+        self.assertEqual(dispatcher.stats["retried"], 2)
+        self.assertEqual(dispatcher.stats["sent"], 1)
+        self.assertEqual(dispatcher.targets["shuffle"].failures, 0)
+
+    def test_permanent_rejection_is_not_retried(self):
+        server = self.server(default=400)
+        dispatcher = self.dispatcher()
+        dispatcher.register("shuffle", server.url, timeout=2)
+        dispatcher.start()
+        dispatcher.submit("shuffle", {"n": 1})
+        self.assertTrue(wait_for(lambda: dispatcher.stats["failed"] == 1))
+        time.sleep(0.2)
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(spooled(self.spool), [])
+
+    def test_circuit_opens_and_spools_without_sending(self):
+        server = self.server(default=503)
+        dispatcher = self.dispatcher(max_retries=100, open_after=3, backoff_max=60)
+        dispatcher.register("shuffle", server.url, timeout=2)
+        dispatcher.start()
+        dispatcher.submit("shuffle", {"n": 1})
+        target = dispatcher.targets["shuffle"]
+        self.assertTrue(wait_for(lambda: target.down_until > time.monotonic()))
+        self.assertGreaterEqual(target.failures, 3)
+        sent = len(server.requests)
+        for n in range(5):
+            dispatcher.submit("shuffle", {"n": n})
+        self.assertEqual(len(spooled(self.spool)), 5)
+        self.assertEqual(len(server.requests), sent)
+
+    def test_outage_is_spooled_and_replayed_on_next_start(self):
+        server = self.server(default=503)
+        dispatcher = self.dispatcher(max_retries=0, open_after=100)
+        dispatcher.register("shuffle", server.url, timeout=2)
+        dispatcher.start()
+        for n in range(3):
+            dispatcher.submit("shuffle", {"n": n})
+        self.assertTrue(wait_for(lambda: len(spooled(self.spool)) == 3))
+        dispatcher.stop(timeout=2)
+
+        server.default = 200
+        restarted = self.dispatcher()
+        restarted.register("shuffle", server.url, timeout=2)
+        restarted.start()
+        self.assertTrue(wait_for(lambda: len(server.delivered()) == 3))
+        self.assertEqual(sorted(body["n"] for body in server.delivered()), [0, 1, 2])
+        self.assertEqual(restarted.stats["replayed"], 3)
+        self.assertEqual(spooled(self.spool), [])
+
+    def test_spool_keeps_deliveries_for_unregistered_targets(self):
+        with open(self.spool, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"target": "misp", "payload": {"n": 1}, "attempts": 2}) + "\n")
+        dispatcher = self.dispatcher()
+        dispatcher.start()
+        self.assertEqual(len(spooled(self.spool)), 1)
+
+    def test_misp_attributes_are_batched_into_events(self):
+        server = self.server()
+        dispatcher = self.dispatcher()
+        dispatcher.register("misp", server.url, timeout=2, batch_size=5, batch_interval=0.2,
+                            build_batch=build_misp_event)
+        dispatcher.start()
+        for n in range(12):
+            dispatcher.submit("misp", {"type": "ip-src", "value": f"10.0.0.{n}",
+                                       "_event_type": "brute_force" if n % 2 else "port_scan"})
+        self.assertTrue(wait_for(lambda: sum(len(body["Event"]["Attribute"])
+                                             for body in server.delivered()) == 12))
+        sizes = sorted(len(body["Event"]["Attribute"]) for body in server.delivered())
+        self.assertEqual(sizes, [2, 5, 5])
+        event = server.delivered()[0]["Event"]
+        self.assertEqual(event["info"], "Security MVP Alert: brute_force, port_scan")
+        self.assertTrue(all("_event_type" not in a for a in event["Attribute"]))
+
+    def test_concurrent_start_runs_one_set_of_workers(self):
+        dispatcher = self.dispatcher(workers=3)
+        barrier = threading.Barrier(8)
+
+        def start():
+            barrier.wait()
+            dispatcher.start()
+
+        threads = [threading.Thread(target=start) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(dispatcher._threads), 4)  # 3 workers + scheduler
+
+
+if __name__ == "__main__":
+    unittest.main()